@@ -1,14 +1,12 @@
 """Account Management Forms."""
 
-import json
-
 import httpx
 from django import forms
 
 from apps.accounts.models import Account
-from apps.libs import BLUESKY, Logger
+from apps.libs import BLUESKY, get_logger
 
-logger = Logger(__name__)
+logger = get_logger(__name__)
 
 
 class CustomUserCreationForm(forms.Form):
@@ -43,17 +41,19 @@ class CustomUserCreationForm(forms.Form):
                 handle=resp.handle,
                 email=resp.email,
                 defaults={
+                    "did": resp.did,
+                    "pds_endpoint": resp.didDoc.pds_endpoint or "",
                     "access_token": resp.accessJwt,
                     "refresh_token": resp.refreshJwt,
                 },
             )
 
             if created:
-                logger.info(f"User created: {account.id}")
+                logger.info("User created: %s", account.id)
             else:
-                logger.info(f"User already exists: {account.id}")
+                logger.info("User already exists: %s", account.id)
         except httpx.HTTPStatusError as exc:
             data = exc.response.json()
             if isinstance(data, dict):
-                logger.error(f"Error creating user: {json.dumps(data, indent=2)}")
+                logger.error("Error creating user: %s", data)
             raise forms.ValidationError(data) from exc
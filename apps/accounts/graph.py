@@ -0,0 +1,275 @@
+"""Follow graph snapshots.
+
+Packs, lists and feed filtering keep asking whether an account follows some
+DID. Rather than keeping pages of ``getFollows`` profiles around, each
+account's follows (or followers) are a ``frozenset`` of their DIDs, swapped
+for a new one when edges are added or removed, so readers never see a set
+being changed. Nothing outlives the snapshots: they are dropped with their
+DIDs when evicted.
+
+Snapshots are refreshed incrementally. ``getFollows`` and ``getFollowers``
+list the newest edges first, so a refresh pages until it reaches DIDs it
+already has. Removed edges only show up on a full fetch, done every
+``full_refresh_after`` seconds. Snapshots are persisted in ``FollowGraph``
+rows so a restarted worker starts from there.
+"""
+
+import datetime
+import typing
+import zlib
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.accounts.models import Account, FollowGraph
+from apps.libs import BLUESKY, TTLCache, get_logger, tokens
+from apps.libs import lexicons as bsky
+
+if typing.TYPE_CHECKING:
+    import uuid
+
+logger = get_logger(__name__)
+
+Direction = FollowGraph.Direction
+
+PAGE_SIZE = 100
+
+# Method and parameters model listing each side of the graph.
+ENDPOINTS = {
+    Direction.FOLLOWS: (bsky.GET_FOLLOWS, bsky.GetFollowsParams),
+    Direction.FOLLOWERS: (bsky.GET_FOLLOWERS, bsky.GetFollowersParams),
+}
+
+
+class Snapshot:
+    """One side of an account's follow graph, as a frozen set of DIDs."""
+
+    __slots__ = ("dids", "fetched_at", "refreshed_at")
+
+    def __init__(
+        self,
+        dids: typing.Iterable[str] = (),
+        fetched_at: datetime.datetime | None = None,
+        refreshed_at: datetime.datetime | None = None,
+    ) -> None:
+        """Create a snapshot of ``dids``.
+
+        Args:
+            dids: DIDs in the graph, in any order.
+            fetched_at: When the graph was last fetched in full.
+            refreshed_at: When it was last refreshed, ``fetched_at`` if unset.
+        """
+        self.dids = frozenset(dids)
+        self.fetched_at = fetched_at or timezone.now()
+        self.refreshed_at = refreshed_at or self.fetched_at
+
+    def __contains__(self, did: object) -> bool:
+        """Whether ``did`` is in the graph."""
+        return did in self.dids
+
+    def __iter__(self) -> typing.Iterator[str]:
+        """DIDs in the graph."""
+        return iter(self.dids)
+
+    def __len__(self) -> int:
+        """Number of DIDs in the graph."""
+        return len(self.dids)
+
+    def add(self, dids: typing.Iterable[str]) -> int:
+        """Add ``dids`` and return how many were new."""
+        new = self.dids.union(dids)
+        added = len(new) - len(self.dids)
+        if added:
+            self.dids = new
+
+        return added
+
+    def discard(self, dids: typing.Iterable[str]) -> None:
+        """Remove ``dids`` from the graph."""
+        self.dids = self.dids.difference(dids)
+
+    def encode(self) -> bytes:
+        """Sorted DIDs, one per line, zlib-compressed."""
+        return zlib.compress("\n".join(sorted(self.dids)).encode())
+
+    @classmethod
+    def decode(
+        cls,
+        data: bytes,
+        fetched_at: datetime.datetime,
+        refreshed_at: datetime.datetime,
+    ) -> "Snapshot":
+        """Snapshot of DIDs encoded by ``encode``."""
+        text = zlib.decompress(data).decode()
+        return cls(text.split("\n") if text else (), fetched_at, refreshed_at)
+
+
+class FollowGraphCache:
+    """Follows and followers of accounts, cached in process and in the DB."""
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        refresh_after: float = 300.0,
+        full_refresh_after: float = 86400.0,
+    ) -> None:
+        """Create the cache.
+
+        Args:
+            maxsize: Snapshots kept in process.
+            refresh_after: Seconds before a snapshot is refreshed incrementally.
+            full_refresh_after: Seconds before a snapshot is fetched again in
+                full, dropping edges removed since.
+        """
+        self.refresh_after = datetime.timedelta(seconds=refresh_after)
+        self.full_refresh_after = datetime.timedelta(seconds=full_refresh_after)
+        self.snapshots: TTLCache[tuple[uuid.UUID, str], Snapshot] = TTLCache(
+            maxsize=maxsize, ttl=full_refresh_after
+        )
+        self.flights = tokens.SingleFlight()
+
+    def get(self, account: Account, direction: str = Direction.FOLLOWS) -> Snapshot:
+        """Snapshot of one side of the account's graph, refreshed if stale.
+
+        Concurrent calls for the same account and direction share one fetch.
+        """
+        key = (account.pk, direction)
+        snapshot = self.snapshots.get(key)
+        if snapshot is not None and not self.stale(snapshot):
+            return snapshot
+
+        return self.flights.do(key, lambda: self.update(account, direction))
+
+    def follows(self, account: Account) -> Snapshot:
+        """DIDs the account follows."""
+        return self.get(account, Direction.FOLLOWS)
+
+    def followers(self, account: Account) -> Snapshot:
+        """DIDs following the account."""
+        return self.get(account, Direction.FOLLOWERS)
+
+    def is_following(self, account: Account, did: str) -> bool:
+        """Whether the account follows ``did``."""
+        return did in self.follows(account)
+
+    def stale(self, snapshot: Snapshot) -> bool:
+        """Whether ``snapshot`` is due for a refresh."""
+        return timezone.now() - snapshot.refreshed_at >= self.refresh_after
+
+    def update(self, account: Account, direction: str) -> Snapshot:
+        """Load, refresh or fetch a snapshot, then cache and persist it."""
+        key = (account.pk, direction)
+        snapshot = self.snapshots.get(key)
+        if snapshot is None:
+            snapshot = self.load(account, direction)
+
+        if snapshot is None or (
+            timezone.now() - snapshot.fetched_at >= self.full_refresh_after
+        ):
+            snapshot = self.fetch(account, direction)
+            self.save(account, direction, snapshot)
+        elif self.stale(snapshot):
+            self.refresh(account, direction, snapshot)
+            self.save(account, direction, snapshot)
+
+        self.snapshots.set(key, snapshot)
+        return snapshot
+
+    def fetch(self, account: Account, direction: str) -> Snapshot:
+        """Page through one side of the account's graph."""
+        snapshot = Snapshot(
+            did for page in self.pages(account, direction) for did in page
+        )
+        logger.info("Fetched %d %s of %s", len(snapshot), direction, account)
+        return snapshot
+
+    def refresh(self, account: Account, direction: str, snapshot: Snapshot) -> int:
+        """Add the edges created since ``snapshot`` and return how many.
+
+        Pages are requested until one holds a DID the snapshot already has.
+        """
+        added = 0
+        for page in self.pages(account, direction):
+            new = snapshot.add(page)
+            added += new
+            if new < len(page):
+                break
+
+        snapshot.refreshed_at = timezone.now()
+        logger.info("Refreshed %s of %s: %d new", direction, account, added)
+        return added
+
+    def pages(self, account: Account, direction: str) -> typing.Iterator[list[str]]:
+        """DIDs of the account's follows or followers, newest first, by page.
+
+        Accounts without a DID have no graph to list, so nothing is fetched.
+        """
+        if not account.did:
+            return
+
+        method, params = ENDPOINTS[direction]
+        cursor = None
+        while True:
+            response = BLUESKY.call(
+                method,
+                params=params(actor=account.did, limit=PAGE_SIZE, cursor=cursor),
+                token=account.fresh_access_token(),
+                base_url=account.pds_endpoint,
+            )
+            profiles = getattr(response, direction)
+            yield [profile.did for profile in profiles]
+
+            cursor = response.cursor
+            if not cursor or not profiles:
+                return
+
+    def add(
+        self,
+        account: Account,
+        dids: typing.Iterable[str],
+        direction: str = Direction.FOLLOWS,
+    ) -> None:
+        """Record edges created by this app, such as follows it just wrote."""
+        snapshot = self.snapshots.get((account.pk, direction))
+        if snapshot is not None and snapshot.add(dids):
+            self.save(account, direction, snapshot)
+
+    def discard(
+        self,
+        account: Account,
+        dids: typing.Iterable[str],
+        direction: str = Direction.FOLLOWS,
+    ) -> None:
+        """Record edges removed by this app."""
+        snapshot = self.snapshots.get((account.pk, direction))
+        if snapshot is not None:
+            snapshot.discard(dids)
+            self.save(account, direction, snapshot)
+
+    def load(self, account: Account, direction: str) -> Snapshot | None:
+        """Snapshot persisted for the account, if any."""
+        row = FollowGraph.objects.filter(account=account, direction=direction).first()
+        if row is None:
+            return None
+
+        return Snapshot.decode(bytes(row.dids), row.fetched_at, row.refreshed_at)
+
+    def save(self, account: Account, direction: str, snapshot: Snapshot) -> None:
+        """Persist ``snapshot``."""
+        FollowGraph.objects.update_or_create(
+            account=account,
+            direction=direction,
+            defaults={
+                "dids": snapshot.encode(),
+                "count": len(snapshot),
+                "fetched_at": snapshot.fetched_at,
+                "refreshed_at": snapshot.refreshed_at,
+            },
+        )
+
+    def clear(self) -> None:
+        """Drop the in-process snapshots."""
+        self.snapshots.clear()
+
+
+FOLLOW_GRAPH = FollowGraphCache(**getattr(settings, "FOLLOW_GRAPH", {}))
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:31
+
+import django.contrib.auth.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_rename_token_account_access_token_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='account',
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='account',
+            name='access_token',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+    ]
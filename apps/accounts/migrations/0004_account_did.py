@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_account_access_token_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='did',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_account_did'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='pds_endpoint',
+            field=models.URLField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0005_account_pds_endpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FollowGraph",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "direction",
+                    models.CharField(
+                        choices=[("follows", "Follows"), ("followers", "Followers")],
+                        max_length=16,
+                    ),
+                ),
+                ("dids", models.BinaryField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("fetched_at", models.DateTimeField()),
+                ("refreshed_at", models.DateTimeField()),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="follow_graphs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("account", "direction"), name="follow_graph_direction"
+                    )
+                ],
+            },
+        ),
+    ]
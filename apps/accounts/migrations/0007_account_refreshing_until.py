@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_follow_graph'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='refreshing_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
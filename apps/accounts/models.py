@@ -1,5 +1,7 @@
 """Custom user model."""
 
+import datetime
+import time
 import uuid
 
 from django.contrib.auth.models import (
@@ -8,9 +10,32 @@ from django.contrib.auth.models import (
     PermissionsMixin,
     UserManager,
 )
-from django.db import models
+from django.db import connections, models, transaction
+from django.utils import timezone
 from django_stubs_ext.db.models import TypedModelMeta
 
+from apps.libs import BLUESKY, TOKEN_CACHE, get_logger, tokens
+
+logger = get_logger(__name__)
+
+# Concurrent refreshes for the same account share one refreshSession call.
+REFRESHES = tokens.SingleFlight()
+
+# How long a worker refreshing an account's tokens keeps others off it. It
+# outlasts refreshSession, retries and scheduler waits included.
+REFRESH_CLAIM = 30.0
+# How often workers wait for another's refresh to land.
+REFRESH_POLL = 0.1
+
+
+def invalidate_cached_tokens(pk: uuid.UUID) -> None:
+    """Drop the account's cached tokens once the current transaction commits.
+
+    Until then other connections still read the old tokens, and a request
+    authenticating with one of them would cache it again for the whole TTL.
+    """
+    transaction.on_commit(lambda: TOKEN_CACHE.invalidate_account(pk))
+
 
 class UUIDModel(models.Model):
     """UUID model mixin."""
@@ -36,13 +61,120 @@ class AccountManager(BaseUserManager["Account"]):
         email: str,
         access: str,
         refresh: str,
+        did: str = "",
+        pds: str = "",
+    ) -> "Account":
+        """Retrieve and update tokens.
+
+        On PostgreSQL this is a single ``UPDATE ... RETURNING`` statement.
+        Other databases look the account up and then write only the token
+        columns.
+        """
+        values = {
+            "access_token": access,
+            "refresh_token": refresh,
+            "last_login": timezone.now(),
+        }
+        if did:
+            values["did"] = did
+        if pds:
+            values["pds_endpoint"] = pds
+
+        if connections[self.db].vendor == "postgresql":
+            account = self._update_returning(email, values)
+        else:
+            account = self.get_by_email(email)
+            for name, value in values.items():
+                setattr(account, name, value)
+            account.save(update_fields=list(values))
+
+        invalidate_cached_tokens(account.pk)
+
+        return account
+
+    def _update_returning(self, email: str, values: dict) -> "Account":
+        opts = self.model._meta
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+
+        fields = opts.concrete_fields
+        assignments = ", ".join(
+            f"{qn(opts.get_field(name).column)} = %s" for name in values
+        )
+        table = qn(opts.db_table)
+        email_column = qn(opts.get_field("email").column)
+        returning = ", ".join(qn(field.column) for field in fields)
+
+        # Only quoted identifiers are interpolated, values go through params.
+        sql = (
+            f"UPDATE {table} SET {assignments} WHERE {email_column} = %s "  # noqa: S608
+            f"RETURNING {returning}"
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*values.values(), email])
+            row = cursor.fetchone()
+
+        if row is None:
+            raise self.model.DoesNotExist(f"Account with email {email} does not exist.")
+
+        return self.model.from_db(self.db, [field.attname for field in fields], row)
+
+    def claim_refresh(
+        self, pk: uuid.UUID, leeway: float = tokens.REFRESH_LEEWAY
+    ) -> tuple["Account", bool]:
+        """Account ``pk``, and whether this worker now has to refresh it.
+
+        Nobody has to when its access token is fresh. Otherwise the refresh is
+        claimed for ``REFRESH_CLAIM`` seconds, unless another worker holds it.
+        """
+        with transaction.atomic():
+            account = self.select_for_update().get(pk=pk)
+            if not tokens.expires_soon(account.access_token, leeway):
+                return account, False
+
+            now = timezone.now()
+            if account.refreshing_until and account.refreshing_until > now:
+                return account, False
+
+            account.refreshing_until = now + datetime.timedelta(seconds=REFRESH_CLAIM)
+            account.save(update_fields=["refreshing_until"])
+
+        return account, True
+
+    def refresh_tokens(
+        self, pk: uuid.UUID, leeway: float = tokens.REFRESH_LEEWAY
     ) -> "Account":
-        """Retrieve and update tokens."""
-        account = self.get_by_email(email)
-        account.access_token = access
-        account.refresh_token = refresh
-        account.save()
-        account.refresh_from_db()
+        """Exchange the stored refresh token for a fresh token pair.
+
+        The refresh is claimed under a short row lock, released before
+        calling the PDS, so workers in other processes that raced us wait for
+        the new tokens instead of spending the refresh token a second time.
+        """
+        account, claimed = self.claim_refresh(pk, leeway)
+        while not claimed:
+            if not tokens.expires_soon(account.access_token, leeway):
+                return account
+
+            time.sleep(REFRESH_POLL)
+            account, claimed = self.claim_refresh(pk, leeway)
+
+        logger.info("Refreshing tokens for %s", account.handle)
+        try:
+            response = BLUESKY.refresh_session(
+                account.refresh_token, base_url=account.pds_endpoint
+            )
+        except BaseException:
+            self.filter(pk=pk).update(refreshing_until=None)
+            raise
+
+        account.access_token = response.accessJwt
+        account.refresh_token = response.refreshJwt
+        account.refreshing_until = None
+        account.save(
+            update_fields=["access_token", "refresh_token", "refreshing_until"]
+        )
+        invalidate_cached_tokens(account.pk)
 
         return account
 
@@ -61,12 +193,20 @@ class AccountManager(BaseUserManager["Account"]):
         raise self.model.DoesNotExist(f"Account with email {email} does not exist.")
 
     def create_from_api(
-        self, email: str, handle: str, access: str, refresh: str
+        self,
+        email: str,
+        handle: str,
+        access: str,
+        refresh: str,
+        did: str = "",
+        pds: str = "",
     ) -> "Account":
         """Create account from API."""
         return self.create(
             email=email,
             handle=handle,
+            did=did,
+            pds_endpoint=pds,
             access_token=access,
             refresh_token=refresh,
         )
@@ -77,8 +217,14 @@ class Account(AbstractBaseUser, PermissionsMixin, UUIDModel):
 
     email = models.EmailField(unique=True)
     handle = models.CharField(max_length=40, unique=True)
-    access_token = models.CharField(max_length=255, blank=True)
+    did = models.CharField(max_length=255, blank=True, db_index=True)
+    # PDS hosting the account, from the session's DID document. XRPC calls
+    # made for the account go there; empty means the default entryway.
+    pds_endpoint = models.URLField(max_length=255, blank=True)
+    access_token = models.CharField(max_length=255, blank=True, db_index=True)
     refresh_token = models.CharField(max_length=255, blank=True)
+    # Set while a worker refreshes the tokens; see AccountManager.refresh_tokens.
+    refreshing_until = models.DateTimeField(null=True, blank=True)
 
     date_joined = models.DateTimeField(auto_now_add=True)
     last_login = models.DateTimeField(auto_now=True)
@@ -97,6 +243,53 @@ class Account(AbstractBaseUser, PermissionsMixin, UUIDModel):
         """Update access and refresh tokens."""
         self.access_token = access
         self.refresh_token = refresh
-        self.save()
+        self.save(update_fields=["access_token", "refresh_token"])
+        invalidate_cached_tokens(self.pk)
+
+    def fresh_access_token(self, leeway: float = tokens.REFRESH_LEEWAY) -> str:
+        """Access token, refreshed first if it is about to expire."""
+        if tokens.expires_soon(self.access_token, leeway):
+            account = REFRESHES.do(
+                self.pk, lambda: Account.auth.refresh_tokens(self.pk, leeway)
+            )
+            self.access_token = account.access_token
+            self.refresh_token = account.refresh_token
+
+        return self.access_token
+
+
+class FollowGraph(models.Model):
+    """Persisted follows, or followers, of an account.
+
+    See ``apps.accounts.graph``; this row lets a restarted worker refresh the
+    graph incrementally rather than page through it again.
+    """
+
+    class Direction(models.TextChoices):
+        """Which side of the graph."""
+
+        FOLLOWS = "follows", "Follows"
+        FOLLOWERS = "followers", "Followers"
+
+    account = models.ForeignKey(
+        Account, on_delete=models.CASCADE, related_name="follow_graphs"
+    )
+    direction = models.CharField(max_length=16, choices=Direction.choices)
+    # Sorted DIDs, one per line, zlib-compressed.
+    dids = models.BinaryField()
+    count = models.PositiveIntegerField(default=0)
+    fetched_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta(TypedModelMeta):
+        """Meta class for FollowGraph."""
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "direction"], name="follow_graph_direction"
+            ),
+        ]
 
-        self.refresh_from_db()
+    def __str__(self) -> str:
+        """Account, direction and size."""
+        return f"{self.account}: {self.count} {self.direction}"
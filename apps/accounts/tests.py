@@ -1,16 +1,28 @@
+import datetime
 import logging
+import time
 from http import HTTPStatus
 from unittest import mock
 
 import httpx
 from django import forms
+from django.db import connection
 from django.test import TestCase
 from django.urls import reverse_lazy
+from django.utils import timezone
 from faker import Faker
 
 from apps.accounts.forms import CustomUserCreationForm
-from apps.accounts.models import Account
-from apps.libs.services import BlueSkySessionResponseFactory
+from apps.accounts.graph import FollowGraphCache, Snapshot
+from apps.accounts.models import Account, FollowGraph
+from apps.libs import BLUESKY, tokens
+from apps.libs import lexicons as bsky
+from apps.libs.services import (
+    BlueSkyRefreshResponse,
+    BlueSkyRefreshResponseFactory,
+    BlueSkySessionResponseFactory,
+    ServiceFactory,
+)
 
 logging.disable(logging.CRITICAL)
 fake = Faker()
@@ -40,6 +52,31 @@ class AccountManagerTests(TestCase):
         self.assertEqual(account.access_token, access)
         self.assertEqual(account.refresh_token, refresh)
 
+        account.refresh_from_db()
+        self.assertEqual(account.access_token, access)
+        self.assertEqual(account.refresh_token, refresh)
+
+    def test_retrieve_and_update_tokens_query_count(self):
+        # One UPDATE ... RETURNING on PostgreSQL, SELECT + UPDATE elsewhere.
+        with self.assertNumQueries(
+            1 if connection.vendor == "postgresql" else 2
+        ) as queries:
+            Account.auth.retrieve_and_update_tokens(
+                email=self.account.email, access=fake.sha256(), refresh=fake.sha256()
+            )
+
+        update = queries.captured_queries[-1]["sql"]
+        self.assertNotIn("date_joined", update.split("WHERE")[0])
+
+    def test_retrieve_and_update_tokens_missing(self):
+        self.assertRaises(
+            Account.DoesNotExist,
+            Account.auth.retrieve_and_update_tokens,
+            email=fake.email(),
+            access=fake.sha256(),
+            refresh=fake.sha256(),
+        )
+
     def test_get_by_handle(self):
         account = Account.auth.get_by_handle(self.response.handle)
 
@@ -93,13 +130,101 @@ class AccountTests(TestCase):
         access = fake.sha256(raw_output=False)
         refresh = fake.sha256(raw_output=False)
 
-        self.account.update_tokens(access, refresh)
+        with self.assertNumQueries(1):
+            self.account.update_tokens(access, refresh)
+
         self.account.refresh_from_db()
 
         self.assertEqual(self.account.access_token, access)
         self.assertEqual(self.account.refresh_token, refresh)
 
 
+class TokenRefreshTests(TestCase):
+    def setUp(self):
+        self.response = BlueSkySessionResponseFactory.build()
+        self.account = Account.objects.create(
+            handle=self.response.handle,
+            email=self.response.email,
+            access_token=tokens.encode_claims({"exp": time.time() - 10}),
+            refresh_token=self.response.refreshJwt,
+        )
+
+    @mock.patch("apps.libs.BlueSkyService.refresh_session")
+    def test_fresh_access_token(self, mock_refresh: mock.MagicMock):
+        refreshed = BlueSkyRefreshResponseFactory.build(
+            accessJwt=tokens.encode_claims({"exp": time.time() + 3600})
+        )
+        mock_refresh.return_value = refreshed
+
+        token = self.account.fresh_access_token()
+
+        mock_refresh.assert_called_once_with(self.response.refreshJwt, base_url="")
+        self.assertEqual(token, refreshed.accessJwt)
+        self.assertEqual(self.account.refresh_token, refreshed.refreshJwt)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.access_token, refreshed.accessJwt)
+
+    @mock.patch("apps.libs.BlueSkyService.refresh_session")
+    def test_fresh_access_token_not_expiring(self, mock_refresh: mock.MagicMock):
+        access = tokens.encode_claims({"exp": time.time() + 3600})
+        self.account.update_tokens(access, self.response.refreshJwt)
+
+        self.assertEqual(self.account.fresh_access_token(), access)
+        mock_refresh.assert_not_called()
+
+    @mock.patch("apps.libs.BlueSkyService.refresh_session")
+    def test_refresh_tokens_already_refreshed(self, mock_refresh: mock.MagicMock):
+        stale = Account.objects.get(pk=self.account.pk)
+        access = tokens.encode_claims({"exp": time.time() + 3600})
+        self.account.update_tokens(access, fake.sha256())
+
+        self.assertEqual(stale.fresh_access_token(), access)
+        mock_refresh.assert_not_called()
+
+    def test_refresh_session_runs_outside_the_row_lock(self):
+        atomic_blocks = []
+
+        def refresh(*args, **kwargs) -> BlueSkyRefreshResponse:
+            atomic_blocks.append(len(connection.atomic_blocks))
+            return BlueSkyRefreshResponseFactory.build()
+
+        expected = len(connection.atomic_blocks)
+        with mock.patch.object(BLUESKY, "refresh_session", side_effect=refresh):
+            Account.auth.refresh_tokens(self.account.pk)
+
+        self.assertEqual(atomic_blocks, [expected])
+        self.account.refresh_from_db()
+        self.assertIsNone(self.account.refreshing_until)
+
+    @mock.patch("apps.libs.BlueSkyService.refresh_session")
+    def test_waits_for_another_workers_refresh(self, mock_refresh: mock.MagicMock):
+        Account.objects.filter(pk=self.account.pk).update(
+            refreshing_until=timezone.now() + datetime.timedelta(seconds=30)
+        )
+        access = tokens.encode_claims({"exp": time.time() + 3600})
+
+        def refreshed_elsewhere(seconds: float) -> None:
+            Account.objects.filter(pk=self.account.pk).update(
+                access_token=access, refreshing_until=None
+            )
+
+        with mock.patch("apps.accounts.models.time.sleep", refreshed_elsewhere):
+            account = Account.auth.refresh_tokens(self.account.pk)
+
+        self.assertEqual(account.access_token, access)
+        mock_refresh.assert_not_called()
+
+    @mock.patch("apps.libs.BlueSkyService.refresh_session")
+    def test_failed_refresh_releases_the_claim(self, mock_refresh: mock.MagicMock):
+        mock_refresh.side_effect = httpx.ConnectError("down")
+
+        with self.assertRaises(httpx.ConnectError):
+            Account.auth.refresh_tokens(self.account.pk)
+
+        self.account.refresh_from_db()
+        self.assertIsNone(self.account.refreshing_until)
+
+
 class LoginFormTests(TestCase):
     def setUp(self):
         self.response = BlueSkySessionResponseFactory.build()
@@ -122,6 +247,11 @@ class LoginFormTests(TestCase):
 
     @mock.patch("apps.libs.BlueSkyService.get_user_jwt")
     def test_save(self, mock_get_user_jwt: mock.MagicMock):
+        self.response.didDoc.service = [
+            ServiceFactory.build(
+                id="#atproto_pds", serviceEndpoint="https://pds.example.com/"
+            )
+        ]
         mock_get_user_jwt.return_value = self.response
         form = CustomUserCreationForm(
             data={
@@ -139,6 +269,7 @@ class LoginFormTests(TestCase):
         self.assertEqual(account.handle, self.handle)
         self.assertEqual(account.access_token, self.response.accessJwt)
         self.assertEqual(account.refresh_token, self.response.refreshJwt)
+        self.assertEqual(account.pds_endpoint, "https://pds.example.com")
 
     def test_save_invalid_form(self):
         form = CustomUserCreationForm(
@@ -150,7 +281,7 @@ class LoginFormTests(TestCase):
 
         self.assertRaises(forms.ValidationError, form.save)
 
-    @mock.patch("httpx.post")
+    @mock.patch("httpx.Client.send")
     def test_save_http_error(self, mock_post: mock.MagicMock):
         mock_post.return_value = httpx.Response(
             status_code=HTTPStatus.BAD_REQUEST,
@@ -229,3 +360,135 @@ class LoginViewTests(TestCase):
         )
         self.assertEqual(response.status_code, 302)
         self.assertRedirects(response, reverse_lazy("app"))
+
+
+class SnapshotTests(TestCase):
+    def test_membership(self):
+        snapshot = Snapshot(["did:plc:b", "did:plc:a", "did:plc:b"])
+
+        self.assertEqual(len(snapshot), 2)
+        self.assertIn("did:plc:a", snapshot)
+        self.assertNotIn("did:plc:c", snapshot)
+        self.assertNotIn(None, snapshot)
+
+        self.assertEqual(snapshot.add(["did:plc:c", "did:plc:a"]), 1)
+        snapshot.discard(["did:plc:b"])
+        self.assertEqual(sorted(snapshot), ["did:plc:a", "did:plc:c"])
+
+    def test_encode(self):
+        snapshot = Snapshot(f"did:plc:{i}" for i in range(100))
+
+        decoded = Snapshot.decode(
+            snapshot.encode(), snapshot.fetched_at, snapshot.refreshed_at
+        )
+
+        self.assertEqual(set(decoded), set(snapshot))
+        empty = Snapshot()
+        self.assertEqual(
+            list(Snapshot.decode(empty.encode(), empty.fetched_at, empty.fetched_at)),
+            [],
+        )
+
+
+class FollowGraphCacheTests(TestCase):
+    def setUp(self):
+        self.account = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(raw_output=False),
+            refresh=fake.sha256(raw_output=False),
+            did="did:plc:owner",
+        )
+        # Newest first, as the AppView lists them.
+        self.follows = [f"did:plc:{i}" for i in reversed(range(250))]
+        self.pages = 0
+        patcher = mock.patch.object(BLUESKY, "call", self.call)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.graph = FollowGraphCache(refresh_after=60, full_refresh_after=3600)
+
+    def call(
+        self, method, params=None, body=None, *, token=None, base_url=None
+    ) -> bsky.GetFollowsResponse | bsky.GetFollowersResponse:
+        self.pages += 1
+        start = int(params.cursor or 0)
+        end = start + params.limit
+        page = [
+            bsky.ProfileViewBasicFactory.build(did=did)
+            for did in self.follows[start:end]
+        ]
+        subject = bsky.ProfileViewBasicFactory.build(did=params.actor)
+        cursor = str(end) if end < len(self.follows) else None
+        if method is bsky.GET_FOLLOWERS:
+            return bsky.GetFollowersResponse(
+                subject=subject, cursor=cursor, followers=page
+            )
+        return bsky.GetFollowsResponse(subject=subject, cursor=cursor, follows=page)
+
+    def age(self, seconds: float) -> None:
+        """Make the cached snapshots ``seconds`` older."""
+        delta = datetime.timedelta(seconds=seconds)
+        for snapshot in self.graph.snapshots._data.values():
+            snapshot[1].fetched_at -= delta
+            snapshot[1].refreshed_at -= delta
+
+    def test_fetch_and_persist(self):
+        follows = self.graph.follows(self.account)
+
+        self.assertEqual(len(follows), 250)
+        self.assertTrue(self.graph.is_following(self.account, "did:plc:7"))
+        self.assertEqual(self.pages, 3)
+        row = FollowGraph.objects.get(account=self.account)
+        self.assertEqual((row.direction, row.count), ("follows", 250))
+
+    def test_restart_loads_the_persisted_snapshot(self):
+        self.graph.follows(self.account)
+        self.graph.clear()
+
+        self.assertEqual(len(self.graph.follows(self.account)), 250)
+        self.assertEqual(self.pages, 3)
+
+    def test_incremental_refresh(self):
+        self.graph.follows(self.account)
+        self.follows = ["did:plc:new", *self.follows]
+        self.age(120)
+
+        follows = self.graph.follows(self.account)
+
+        self.assertIn("did:plc:new", follows)
+        self.assertEqual(self.pages, 4)
+        self.assertEqual(FollowGraph.objects.get().count, 251)
+
+    def test_full_refresh_drops_removed_follows(self):
+        self.graph.follows(self.account)
+        self.follows.remove("did:plc:7")
+        self.age(7200)
+
+        follows = self.graph.follows(self.account)
+
+        self.assertNotIn("did:plc:7", follows)
+        self.assertLess(
+            timezone.now() - follows.fetched_at, datetime.timedelta(seconds=5)
+        )
+
+    def test_add_records_local_follows(self):
+        self.graph.follows(self.account)
+
+        self.graph.add(self.account, ["did:plc:mine"])
+
+        self.assertTrue(self.graph.is_following(self.account, "did:plc:mine"))
+        self.assertEqual(FollowGraph.objects.get().count, 251)
+
+    def test_account_without_did_is_not_fetched(self):
+        self.account.did = ""
+
+        follows = self.graph.follows(self.account)
+
+        self.assertEqual(len(follows), 0)
+        self.assertEqual(self.pages, 0)
+
+    def test_followers(self):
+        followers = self.graph.followers(self.account)
+
+        self.assertEqual(len(followers), 250)
+        self.assertEqual(FollowGraph.objects.get().direction, "followers")
@@ -8,9 +8,9 @@ from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
 
 from apps.accounts.forms import CustomUserCreationForm
-from apps.libs import Logger
+from apps.libs import get_logger
 
-logger = Logger(__name__)
+logger = get_logger(__name__)
 
 
 class LoginView(views.View):
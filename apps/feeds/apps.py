@@ -3,4 +3,4 @@ from django.apps import AppConfig
 
 class FeedsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "feeds"
+    name = "apps.feeds"
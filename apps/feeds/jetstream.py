@@ -0,0 +1,306 @@
+"""Jetstream ingestion.
+
+Jetstream re-publishes the AT Protocol firehose as JSON over a WebSocket.
+``JetstreamConsumer`` reads it and keeps posts by known accounts, and the
+accounts they follow, in the local post store.
+
+The socket reader and the database writer are decoupled by a bounded queue.
+When the writer falls behind, the reader blocks on the full queue and stops
+reading the socket, which pushes back on the server instead of buffering
+without limit. If the writer fails, the reader is cancelled and the error
+raised. Events are written in batches, one transaction each, together with
+the cursor of the last event read, matched or not, so a restarted worker
+resumes from there.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import json
+import time
+import typing
+import urllib.parse
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from websockets.asyncio.client import ClientConnection, connect
+
+from apps.accounts.models import Account
+from apps.feeds.models import JetstreamCursor
+from apps.libs import get_logger
+from apps.posts.models import Author, Post, TimelineEntry
+
+logger = get_logger(__name__)
+
+POST = "app.bsky.feed.post"
+FOLLOW = "app.bsky.graph.follow"
+
+# Resume slightly before the checkpoint; writes are idempotent upserts.
+REWIND_US = 5_000_000
+# Largest message accepted; events are far smaller.
+MAX_SIZE = 2**22
+# Seconds given to the server to acknowledge closing. After a failure, unread
+# messages keep the socket paused and the acknowledgement never arrives.
+CLOSE_TIMEOUT = 1.0
+
+Event = dict[str, typing.Any]
+
+
+@dataclasses.dataclass
+class IngestStats:
+    """Counters of one ``JetstreamConsumer.run``."""
+
+    received: int = 0
+    matched: int = 0
+    written: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def events_per_second(self) -> float:
+        """Events read off the socket per second."""
+        return self.received / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        """Counters plus throughput, for reports."""
+        return {
+            **dataclasses.asdict(self),
+            "events_per_second": round(self.events_per_second, 1),
+        }
+
+
+def watched_dids() -> tuple[set[str], set[str]]:
+    """DIDs of known accounts, and of the authors in their timelines."""
+    accounts = set(Account.objects.exclude(did="").values_list("did", flat=True))
+    followed = set(
+        TimelineEntry.objects.values_list("post__author_id", flat=True).distinct()
+    )
+    return accounts, followed
+
+
+def load_cursor(name: str) -> int | None:
+    """Checkpointed position of the worker called ``name``."""
+    return (
+        JetstreamCursor.objects.filter(name=name)
+        .values_list("time_us", flat=True)
+        .first()
+    )
+
+
+def post_uri(event: Event) -> str:
+    """AT URI of the record in a commit event."""
+    commit = event["commit"]
+    return f"at://{event['did']}/{commit['collection']}/{commit['rkey']}"
+
+
+def write_batch(events: list[Event], name: str, time_us: int) -> int:
+    """Apply ``events`` and checkpoint ``name`` at ``time_us`` in one transaction."""
+    posts: dict[str, Event] = {}
+    handles: dict[str, str] = {}
+    for event in events:
+        match event.get("kind"):
+            case "commit":
+                posts[post_uri(event)] = event
+            case "identity":
+                if handle := event["identity"].get("handle"):
+                    handles[event["did"]] = handle
+
+    deleted = [
+        uri for uri, event in posts.items() if event["commit"]["operation"] == "delete"
+    ]
+    created = [
+        Post(
+            uri=uri,
+            cid=event["commit"].get("cid", ""),
+            author_id=event["did"],
+            text=event["commit"]["record"].get("text", ""),
+            record=event["commit"]["record"],
+            indexed_at=datetime.datetime.fromtimestamp(
+                event["time_us"] / 1_000_000, datetime.UTC
+            ),
+        )
+        for uri, event in posts.items()
+        if event["commit"]["operation"] != "delete"
+    ]
+
+    with transaction.atomic():
+        Author.objects.bulk_create(
+            [Author(did=did, handle=handle) for did, handle in handles.items()],
+            update_conflicts=True,
+            unique_fields=["did"],
+            update_fields=["handle", "updated_at"],
+        )
+        # Placeholders until an identity event or a timeline sync fills them in.
+        Author.objects.bulk_create(
+            [Author(did=did, handle=did) for did in {p.author_id for p in created}],
+            ignore_conflicts=True,
+        )
+        Post.objects.bulk_create(
+            created,
+            update_conflicts=True,
+            unique_fields=["uri"],
+            update_fields=["cid", "text", "record"],
+        )
+        Post.objects.filter(uri__in=deleted).delete()
+        JetstreamCursor.objects.update_or_create(
+            name=name, defaults={"time_us": time_us}
+        )
+
+    return len(created) + len(deleted) + len(handles)
+
+
+class JetstreamConsumer:
+    """Consume a Jetstream subscription into the local post store."""
+
+    def __init__(
+        self,
+        url: str,
+        name: str = "default",
+        batch_size: int = 500,
+        queue_size: int = 10_000,
+        flush_interval: float = 1.0,
+        max_events: int | None = None,
+    ) -> None:
+        """Create a consumer.
+
+        Args:
+            url: Jetstream ``/subscribe`` endpoint.
+            name: Name the cursor is checkpointed under.
+            batch_size: Events written per transaction.
+            queue_size: Matched events buffered before the reader blocks.
+            flush_interval: Seconds a partial batch waits before being written.
+            max_events: Stop after reading this many events.
+        """
+        self.url = url
+        self.name = name
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.stats = IngestStats()
+        self.accounts: set[str] = set()
+        self.watched: set[str] = set()
+        # Time of the last event read, and of the last checkpoint written.
+        self.position: int | None = None
+        self.checkpoint: int | None = None
+
+    def subscribe_url(self, cursor: int | None) -> str:
+        """Subscription URL, resuming from ``cursor``."""
+        query = {"wantedCollections": [POST, FOLLOW]}
+        if cursor is not None:
+            query["cursor"] = [str(max(0, cursor - REWIND_US))]
+
+        return f"{self.url}?{urllib.parse.urlencode(query, doseq=True)}"
+
+    def matches(self, event: Event) -> bool:
+        """Whether ``event`` should be written.
+
+        Follows created by known accounts are not stored, but extend the set
+        of watched DIDs straight away.
+        """
+        if (did := event.get("did")) not in self.watched:
+            return False
+
+        commit = event.get("commit")
+        if commit and commit.get("collection") == FOLLOW:
+            if did in self.accounts and commit.get("operation") == "create":
+                self.watched.add(commit["record"]["subject"])
+            return False
+
+        return event.get("kind") in ("commit", "identity")
+
+    async def run(self) -> IngestStats:
+        """Consume until the stream ends or ``max_events`` were read."""
+        self.accounts, followed = await sync_to_async(watched_dids)()
+        self.watched = self.accounts | followed
+        cursor = self.checkpoint = await sync_to_async(load_cursor)(self.name)
+
+        queue: asyncio.Queue[Event | None] = asyncio.Queue(self.queue_size)
+        start = time.perf_counter()
+
+        async with connect(
+            self.subscribe_url(cursor), max_size=MAX_SIZE, close_timeout=CLOSE_TIMEOUT
+        ) as socket:
+            reader = asyncio.create_task(self.read(socket, queue))
+            writer = asyncio.create_task(self.write(queue))
+            try:
+                await asyncio.wait(
+                    {reader, writer}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not writer.done():
+                    # Flush what was read, even if the socket failed.
+                    end = asyncio.create_task(queue.put(None))
+                    await asyncio.wait(
+                        {end, writer}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    end.cancel()
+
+                # The writer only stops early by failing; its error comes first.
+                await writer
+                reader.result()
+            finally:
+                reader.cancel()
+                writer.cancel()
+                await asyncio.wait({reader, writer})
+
+        self.stats.elapsed = time.perf_counter() - start
+        logger.info("Jetstream ingestion: %s", self.stats.as_dict())
+        return self.stats
+
+    async def read(
+        self, socket: ClientConnection, queue: asyncio.Queue[Event | None]
+    ) -> None:
+        """Parse and filter events, blocking while the queue is full."""
+        async for message in socket:
+            self.stats.received += 1
+            event = json.loads(message)
+            self.position = event.get("time_us", self.position)
+            if self.matches(event):
+                self.stats.matched += 1
+                await queue.put(event)
+
+            if self.max_events and self.stats.received >= self.max_events:
+                break
+
+    async def write(self, queue: asyncio.Queue[Event | None]) -> None:
+        """Write queued events in batches until ``None`` is received.
+
+        Partial batches, or just the checkpoint when nothing matched, are
+        written every ``flush_interval``.
+        """
+        batch: list[Event] = []
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), self.flush_interval)
+            except TimeoutError:
+                await self.flush(batch, queue)
+                continue
+
+            if event is None:
+                await self.flush(batch, queue)
+                return
+
+            batch.append(event)
+            if len(batch) >= self.batch_size:
+                await self.flush(batch, queue)
+
+    async def flush(self, batch: list[Event], queue: asyncio.Queue) -> None:
+        """Write and empty ``batch``, checkpointing as far as is safe.
+
+        With the queue empty, every event read is written or in ``batch``, so
+        the checkpoint moves to the last event read. Otherwise it only moves
+        to the last event of ``batch``.
+        """
+        time_us = self.position if queue.empty() else None
+        if batch:
+            time_us = max(time_us or 0, batch[-1]["time_us"])
+        elif time_us is None or time_us == self.checkpoint:
+            return
+
+        self.stats.written += await sync_to_async(write_batch)(
+            batch, self.name, time_us
+        )
+        if batch:
+            self.stats.batches += 1
+        self.checkpoint = time_us
+        batch.clear()
@@ -0,0 +1,128 @@
+"""Live updates pushed over Server-Sent Events.
+
+Each connection subscribes to ``notifications:<account>`` and to one
+``author:<did>`` topic per author in the account's timeline. A single pump
+per worker checks the local store for everyone: one query for new posts and
+one cache read for unread counts per tick, whatever the number of clients.
+Each new post is rendered once and fanned out through ``HUB``.
+
+Posts are followed by ``created_at``, when they were stored here: the
+``indexed_at`` of posts brought in by timeline sync is the AppView's, always
+earlier than that.
+"""
+
+import asyncio
+import datetime
+import typing
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from apps.libs import get_logger
+from apps.libs.hub import Hub, sse
+from apps.notifications.services import cache, unread_key
+from apps.posts.models import Post, TimelineEntry
+
+if typing.TYPE_CHECKING:
+    from apps.accounts.models import Account
+
+logger = get_logger(__name__)
+
+OPTIONS = getattr(settings, "LIVE_UPDATES", {})
+
+HUB = Hub(maxsize=OPTIONS.get("buffer", 100))
+
+
+def followed_authors(account: "Account") -> set[str]:
+    """DIDs whose new posts are pushed to ``account``."""
+    authors = set(
+        TimelineEntry.objects.filter(account=account)
+        .values_list("post__author_id", flat=True)
+        .distinct()
+    )
+    if account.did:
+        authors.add(account.did)
+
+    return authors
+
+
+def topics(account: "Account", authors: typing.Iterable[str]) -> list[str]:
+    """Topics a connection of ``account`` subscribes to."""
+    return [f"notifications:{account.pk}", *(f"author:{did}" for did in authors)]
+
+
+def new_posts(since: datetime.datetime, limit: int = 500) -> list[Post]:
+    """Posts stored after ``since``, oldest first."""
+    return list(
+        Post.objects.filter(created_at__gt=since)
+        .select_related("author")
+        .order_by("created_at")[:limit]
+    )
+
+
+class LivePump:
+    """Polls the local store on behalf of every subscriber of a worker."""
+
+    def __init__(self, hub: Hub, interval: float = 2.0) -> None:
+        """Create a pump; it starts with the first subscriber."""
+        self.hub = hub
+        self.interval = interval
+        self.since = timezone.now()
+        self.counts: dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+
+    def ensure_running(self) -> None:
+        """Start the pump on the running loop unless it already runs."""
+        if self._task is None or self._task.done():
+            self.since = timezone.now()
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        """Tick until the last subscriber is gone."""
+        while len(self.hub):
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Live update tick failed: %s", exc)
+
+    def collect(self, subscribed: set[str]) -> list[tuple[str, bytes]]:
+        """Topics and rendered events of the posts stored since the last tick.
+
+        Runs in a thread: templates render synchronously.
+        """
+        events = []
+        for post in new_posts(self.since):
+            self.since = max(self.since, post.created_at)
+            topic = f"author:{post.author_id}"
+            if topic in subscribed:
+                html = render_to_string("partials/live_post.dj", {"post": post})
+                events.append((topic, sse(html, event="post", id=post.uri)))
+
+        return events
+
+    async def tick(self) -> None:
+        """Publish new posts and changed unread counts."""
+        subscribed = set(self.hub.topics())
+
+        for topic, event in await sync_to_async(self.collect)(subscribed):
+            self.hub.publish(topic, event)
+
+        keys = {
+            unread_key(topic.removeprefix("notifications:")): topic
+            for topic in subscribed
+            if topic.startswith("notifications:")
+        }
+        counts = {
+            keys[key]: count
+            for key, count in (await sync_to_async(cache().get_many)(keys)).items()
+        }
+        for topic, count in counts.items():
+            if self.counts.get(topic) != count:
+                self.hub.publish(topic, sse(str(count), event="notifications"))
+        self.counts = counts
+
+
+PUMP = LivePump(HUB, interval=OPTIONS.get("interval", 2.0))
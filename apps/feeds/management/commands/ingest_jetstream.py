@@ -0,0 +1,52 @@
+"""Ingest the Jetstream event stream into the local post store."""
+
+import json
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from apps.feeds.jetstream import JetstreamConsumer
+from apps.libs.standin import StandInJetstreamServer
+
+
+class Command(BaseCommand):
+    """Run a Jetstream ingestion worker, or replay a recorded stream."""
+
+    help = "Consume Jetstream into the local post store and report throughput."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        options = getattr(settings, "JETSTREAM", {})
+        parser.add_argument("--url", default=options.get("url"))
+        parser.add_argument("--name", default="default")
+        parser.add_argument(
+            "--batch-size", type=int, default=options.get("batch_size", 500)
+        )
+        parser.add_argument(
+            "--queue-size", type=int, default=options.get("queue_size", 10_000)
+        )
+        parser.add_argument("--max-events", type=int, default=None)
+        parser.add_argument(
+            "--replay",
+            metavar="FILE",
+            help="Replay recorded JSON lines through a local stand-in server.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Consume the stream, then print the ingestion stats as JSON."""
+        kwargs = {
+            "name": options["name"],
+            "batch_size": options["batch_size"],
+            "queue_size": options["queue_size"],
+            "max_events": options["max_events"],
+        }
+
+        # async_to_sync keeps the ORM calls on this thread and its connection.
+        if options["replay"]:
+            with StandInJetstreamServer.replay(options["replay"]) as server:
+                stats = async_to_sync(JetstreamConsumer(server.url, **kwargs).run)()
+        else:
+            stats = async_to_sync(JetstreamConsumer(options["url"], **kwargs).run)()
+
+        self.stdout.write(json.dumps(stats.as_dict(), indent=2))
@@ -1,3 +1,19 @@
+"""Feed ingestion state."""
+
 from django.db import models
 
-# Create your models here.
+
+class JetstreamCursor(models.Model):
+    """Last Jetstream event written by an ingestion worker.
+
+    Saved in the same transaction as the events it covers, so a restarted
+    worker resumes where the previous one stopped.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    time_us = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        """Worker name and position."""
+        return f"{self.name}@{self.time_us}"
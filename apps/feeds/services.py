@@ -0,0 +1,52 @@
+"""Timeline fetching.
+
+Pages of ``app.bsky.feed.getTimeline`` are cached per account and cursor for
+a short while, so the back button and repeated scrolls don't refetch them.
+The cache is bounded by the serialized size of the pages it holds, and its
+hits and misses are counted in ``hypersky_cache_lookups_total``.
+"""
+
+import typing
+
+from django.conf import settings
+
+from apps.libs import BLUESKY, TTLCache, metrics
+from apps.libs.lexicons import GET_TIMELINE, GetTimelineParams, GetTimelineResponse
+
+if typing.TYPE_CHECKING:
+    import uuid
+
+    from apps.accounts.models import Account
+
+PAGE_SIZE = 30
+
+PageKey = tuple["uuid.UUID", str, int]
+
+
+def page_size(page: GetTimelineResponse) -> int:
+    """Approximate memory taken by ``page``: its JSON size in bytes."""
+    return len(page.__pydantic_serializer__.to_json(page))
+
+
+PAGE_CACHE: TTLCache[PageKey, GetTimelineResponse] = TTLCache(
+    weigher=page_size, **getattr(settings, "TIMELINE_PAGE_CACHE", {})
+)
+
+
+def get_timeline(
+    account: "Account", cursor: str | None = None, limit: int = PAGE_SIZE
+) -> GetTimelineResponse:
+    """Page of ``account``'s home timeline starting at ``cursor``."""
+    key = (account.pk, cursor or "", limit)
+    page = PAGE_CACHE.get(key)
+    metrics.CACHE_LOOKUPS.inc("timeline_page", "miss" if page is None else "hit")
+    if page is None:
+        page = BLUESKY.call(
+            GET_TIMELINE,
+            params=GetTimelineParams(cursor=cursor, limit=limit),
+            token=account.fresh_access_token(),
+            base_url=account.pds_endpoint,
+        )
+        PAGE_CACHE.set(key, page)
+
+    return page
@@ -1,3 +1,380 @@
+import asyncio
+import datetime
+import json
+import logging
+import tempfile
+import time
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.template.loader import render_to_string
 from django.test import TestCase
+from django.urls import reverse_lazy
+from django.utils import timezone
+from faker import Faker
+
+from apps.accounts.models import Account
+from apps.feeds.jetstream import REWIND_US, JetstreamConsumer
+from apps.feeds.live import HUB, PUMP, LivePump
+from apps.feeds.models import JetstreamCursor
+from apps.feeds.services import PAGE_CACHE, get_timeline, page_size
+from apps.libs import BLUESKY, TTLCache, metrics
+from apps.libs.hub import sse
+from apps.libs.lexicons import (
+    GET_TIMELINE,
+    FeedViewPostFactory,
+    GetTimelineResponseFactory,
+    PostViewFactory,
+    ProfileViewBasicFactory,
+)
+from apps.libs.standin import StandInJetstreamServer
+from apps.notifications.services import set_unread_count
+from apps.posts.models import Author, Post, TimelineEntry
+from apps.posts.services import sync_timeline
+
+fake = Faker()
+
+logging.disable(logging.CRITICAL)
+
+
+class TimelineTestCase(TestCase):
+    def setUp(self):
+        PAGE_CACHE.clear()
+        self.account = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(raw_output=False),
+            refresh=fake.sha256(raw_output=False),
+        )
+        self.page = GetTimelineResponseFactory.build(
+            cursor="next-page", feed=FeedViewPostFactory.batch(3)
+        )
+        patcher = mock.patch.object(BLUESKY, "call", return_value=self.page)
+        self.call = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **kwargs):
+        return self.client.get(
+            reverse_lazy("timeline"),
+            headers={"Authorization": f"Bearer {self.account.access_token}"},
+            **kwargs,
+        )
+
+    def test_get_timeline(self):
+        page = get_timeline(self.account, cursor="abc")
+
+        self.assertEqual(page, self.page)
+        method, params = self.call.call_args.args[0], self.call.call_args.kwargs
+        self.assertIs(method, GET_TIMELINE)
+        self.assertEqual(params["params"].cursor, "abc")
+        self.assertEqual(params["token"], self.account.access_token)
+
+    def test_pages_are_cached_per_cursor(self):
+        get_timeline(self.account)
+        get_timeline(self.account)
+        get_timeline(self.account, cursor="next-page")
+
+        self.assertEqual(self.call.call_count, 2)
+        self.assertEqual(PAGE_CACHE.stats()["hits"], 1)
+        self.assertEqual(PAGE_CACHE.stats()["bytes"], 2 * page_size(self.page))
+
+    def test_lookups_are_counted(self):
+        before = metrics.CACHE_LOOKUPS.collect()
+
+        get_timeline(self.account)
+        get_timeline(self.account)
+
+        after = metrics.CACHE_LOOKUPS.collect()
+        for result in ("hit", "miss"):
+            key = ("timeline_page", result)
+            self.assertEqual(after[key] - before.get(key, 0), 1)
+        self.assertIn(
+            'hypersky_cache_lookups_total{cache="timeline_page",result="hit"}',
+            metrics.REGISTRY.render(),
+        )
+
+    def test_cache_is_bounded_by_page_size(self):
+        cache = TTLCache(maxbytes=page_size(self.page), weigher=page_size)
+        cache.set("first", self.page)
+        cache.set("second", self.page)
+
+        self.assertIsNone(cache.get("first"))
+        self.assertEqual(len(cache), 1)
+
+    def test_timeline_page(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "timeline.dj")
+        self.assertContains(response, self.page.feed[0].post.author.handle)
+        self.assertContains(response, "cursor=next-page")
+
+    def test_htmx_renders_partial(self):
+        response = self.get(data={"cursor": "next-page"}, HTTP_HX_REQUEST="true")
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "partials/timeline_page.dj")
+        self.assertTemplateNotUsed(response, "timeline.dj")
+        self.assertEqual(self.call.call_args.kwargs["params"].cursor, "next-page")
+
+    def test_last_page_has_no_trigger(self):
+        self.call.return_value = GetTimelineResponseFactory.build(cursor=None)
+
+        response = self.get(HTTP_HX_REQUEST="true")
+
+        self.assertNotContains(response, "hx-get")
+
+    def test_unauthenticated_redirects(self):
+        response = self.client.get(reverse_lazy("timeline"))
+
+        self.assertRedirects(response, reverse_lazy("login"))
+
+
+def jetstream_event(did: str, time_us: int, **commit) -> dict:
+    commit = {
+        "rev": fake.pystr(),
+        "operation": "create",
+        "collection": "app.bsky.feed.post",
+        "rkey": fake.pystr(),
+        "cid": fake.sha256(),
+        "record": {"$type": "app.bsky.feed.post", "text": fake.sentence()},
+        **commit,
+    }
+    return {"did": did, "time_us": time_us, "kind": "commit", "commit": commit}
+
+
+class JetstreamTestCase(TestCase):
+    def setUp(self):
+        self.account = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(raw_output=False),
+            refresh=fake.sha256(raw_output=False),
+            did="did:plc:alice",
+        )
+        self.post = jetstream_event("did:plc:alice", 1_000)
+        self.events = [
+            self.post,
+            jetstream_event("did:plc:stranger", 1_001),
+            jetstream_event(
+                "did:plc:alice",
+                1_002,
+                collection="app.bsky.graph.follow",
+                record={"subject": "did:plc:bob"},
+            ),
+            jetstream_event("did:plc:bob", 1_003),
+            {
+                "did": "did:plc:bob",
+                "time_us": 1_004,
+                "kind": "identity",
+                "identity": {"did": "did:plc:bob", "handle": "bob.test"},
+            },
+            jetstream_event(
+                "did:plc:alice",
+                1_005,
+                operation="delete",
+                rkey=self.post["commit"]["rkey"],
+            ),
+        ]
+
+    async def consume(self, server, **kwargs):
+        consumer = JetstreamConsumer(server.url, batch_size=2, **kwargs)
+        return await consumer.run()
+
+    async def test_ingests_watched_dids(self):
+        with StandInJetstreamServer(self.events) as server:
+            stats = await self.consume(server)
+
+        self.assertEqual((stats.received, stats.matched), (6, 4))
+        self.assertEqual(stats.batches, 2)
+        posts = [post async for post in Post.objects.select_related("author")]
+        self.assertEqual([post.author.handle for post in posts], ["bob.test"])
+        self.assertFalse(
+            await Post.objects.filter(author_id="did:plc:stranger").aexists()
+        )
+        cursor = await JetstreamCursor.objects.aget(name="default")
+        self.assertEqual(cursor.time_us, 1_005)
+
+    async def test_resumes_from_checkpoint(self):
+        await JetstreamCursor.objects.acreate(name="default", time_us=REWIND_US + 1_002)
+
+        with StandInJetstreamServer(self.events) as server:
+            await self.consume(server)
+
+        self.assertIn(f"cursor={1_002}", server.requests[0])
+
+    async def test_max_events(self):
+        with StandInJetstreamServer(self.events) as server:
+            stats = await self.consume(server, max_events=1)
+
+        self.assertEqual(stats.received, 1)
+        self.assertEqual(await Post.objects.acount(), 1)
+
+    async def test_backpressure(self):
+        events = [jetstream_event("did:plc:alice", i) for i in range(50)]
+        writes = []
+
+        def slow_write(batch: list, name: str, time_us: int) -> int:
+            writes.append(len(batch))
+            time.sleep(0.001)
+            return len(batch)
+
+        with (
+            mock.patch("apps.feeds.jetstream.write_batch", slow_write),
+            StandInJetstreamServer(events) as server,
+        ):
+            stats = await JetstreamConsumer(
+                server.url, batch_size=10, queue_size=5
+            ).run()
+
+        self.assertEqual(stats.matched, 50)
+        self.assertEqual(sum(writes), 50)
+        self.assertTrue(all(size <= 10 for size in writes))
+
+    async def test_checkpoints_unmatched_events(self):
+        events = [*self.events, jetstream_event("did:plc:stranger", 1_006)]
+
+        with StandInJetstreamServer(events) as server:
+            stats = await self.consume(server)
+
+        self.assertEqual(stats.matched, 4)
+        cursor = await JetstreamCursor.objects.aget(name="default")
+        self.assertEqual(cursor.time_us, 1_006)
+
+    async def test_writer_failure_stops_reader(self):
+        events = [jetstream_event("did:plc:alice", i) for i in range(50)]
+
+        with (
+            mock.patch(
+                "apps.feeds.jetstream.write_batch", side_effect=DatabaseError("down")
+            ),
+            StandInJetstreamServer(events) as server,
+            self.assertRaisesMessage(DatabaseError, "down"),
+        ):
+            await asyncio.wait_for(
+                JetstreamConsumer(server.url, batch_size=1, queue_size=1).run(),
+                timeout=5,
+            )
+
+    def test_replay_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as recording:
+            recording.write("\n".join(json.dumps(event) for event in self.events))
+            recording.flush()
+            out = StringIO()
+
+            call_command("ingest_jetstream", replay=recording.name, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["received"], 6)
+        self.assertGreater(report["events_per_second"], 0)
+
+
+class LiveEventsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.account = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(raw_output=False),
+            refresh=fake.sha256(raw_output=False),
+            did="did:plc:alice",
+        )
+        self.author = Author.objects.create(did="did:plc:bob", handle="bob.test")
+        post = Post.objects.create(
+            uri="at://did:plc:bob/app.bsky.feed.post/1",
+            cid=fake.sha256(),
+            author=self.author,
+            indexed_at=timezone.now() - datetime.timedelta(days=1),
+        )
+        TimelineEntry.objects.create(
+            account=self.account, post=post, indexed_at=post.indexed_at
+        )
+        patcher = mock.patch.object(PUMP, "ensure_running")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.close_subscriptions)
+
+    def close_subscriptions(self) -> None:
+        for subscription in list(HUB._subscriptions):
+            subscription.close()
+
+    async def open_stream(self):
+        response = await self.async_client.get(
+            reverse_lazy("live_events"),
+            headers={"Authorization": f"Bearer {self.account.access_token}"},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return response.streaming_content
+
+    async def test_stream_subscribes_and_sends_unread_count(self):
+        await sync_to_async(set_unread_count)(self.account.pk, 4)
+
+        stream = await self.open_stream()
+
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+        self.assertEqual(await anext(stream), sse("4", event="notifications"))
+        self.assertIn("author:did:plc:bob", HUB.topics())
+        self.assertIn("author:did:plc:alice", HUB.topics())
+
+    async def test_pump_renders_each_post_once(self):
+        streams = [await self.open_stream() for _ in range(3)]
+        for stream in streams:
+            await anext(stream)
+            await anext(stream)
+
+        pump = LivePump(HUB)
+        await Post.objects.acreate(
+            uri="at://did:plc:bob/app.bsky.feed.post/2",
+            cid=fake.sha256(),
+            author=self.author,
+            text="fresh post",
+            indexed_at=timezone.now(),
+        )
+        await sync_to_async(set_unread_count)(self.account.pk, 1)
+
+        with mock.patch(
+            "apps.feeds.live.render_to_string", wraps=render_to_string
+        ) as render:
+            await pump.tick()
+
+        self.assertEqual(render.call_count, 1)
+        for stream in streams:
+            post = await anext(stream)
+            self.assertIn(b"event: post", post)
+            self.assertIn(b"fresh post", post)
+            self.assertEqual(await anext(stream), sse("1", event="notifications"))
+            await stream.aclose()
+
+    async def test_pump_sends_synced_posts(self):
+        stream = await self.open_stream()
+        await anext(stream)
+        await anext(stream)
+
+        pump = LivePump(HUB)
+        item = FeedViewPostFactory.build(
+            post=PostViewFactory.build(
+                author=ProfileViewBasicFactory.build(did=self.author.did),
+                record={"text": "synced post"},
+                indexedAt=timezone.now() - datetime.timedelta(hours=1),
+            )
+        )
+        page = GetTimelineResponseFactory.build(feed=[item], cursor=None)
+        with mock.patch.object(BLUESKY, "call", return_value=page):
+            await sync_to_async(sync_timeline)(self.account)
+
+        await pump.tick()
+
+        post = await anext(stream)
+        self.assertIn(b"event: post", post)
+        self.assertIn(b"synced post", post)
+        await stream.aclose()
+
+    async def test_unauthenticated(self):
+        response = await self.async_client.get(reverse_lazy("live_events"))
 
-# Create your tests here.
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
@@ -0,0 +1,10 @@
+"""Feeds URL Configuration."""
+
+from django.urls import path
+
+from apps.feeds.views import LiveEventsView, TimelineView
+
+urlpatterns = [
+    path("timeline/", TimelineView.as_view(), name="timeline"),
+    path("live/", LiveEventsView.as_view(), name="live_events"),
+]
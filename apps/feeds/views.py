@@ -1,3 +1,68 @@
-from django.shortcuts import render
+"""Feed views."""
 
-# Create your views here.
+from http import HTTPStatus
+
+from asgiref.sync import sync_to_async
+from django import views
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+
+from apps.feeds.live import HUB, OPTIONS, PUMP, followed_authors, topics
+from apps.feeds.services import get_timeline
+from apps.libs.authentication import get_account
+from apps.libs.hub import event_stream, sse
+from apps.notifications.services import get_unread_count
+
+
+class TimelineView(views.View):
+    """Home timeline with HTMX infinite scroll.
+
+    The first request renders the whole page; HTMX requests for the next
+    cursor only render the posts and the trigger for the page after.
+    """
+
+    template_name = "timeline.dj"
+    partial_template_name = "partials/timeline_page.dj"
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Get request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        page = get_timeline(account, cursor=request.GET.get("cursor") or None)
+        template_name = (
+            self.partial_template_name if request.htmx else self.template_name
+        )
+
+        return render(request, template_name=template_name, context={"page": page})
+
+
+class LiveEventsView(views.View):
+    """Server-Sent Events stream of new posts and unread notification counts.
+
+    Must be served through ``hypersky.asgi``; the response is an async
+    iterator that stays open while the client is connected.
+    """
+
+    heartbeat = OPTIONS.get("heartbeat", 15.0)
+
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        """Get request."""
+        if (account := await sync_to_async(get_account)(request)) is None:
+            return HttpResponse(status=HTTPStatus.UNAUTHORIZED)
+
+        authors = await sync_to_async(followed_authors)(account)
+        unread = await sync_to_async(get_unread_count)(account)
+
+        subscription = HUB.subscribe(*topics(account, authors))
+        subscription.put(sse(str(unread), event="notifications"))
+        PUMP.ensure_running()
+
+        response = StreamingHttpResponse(
+            event_stream(subscription, self.heartbeat),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
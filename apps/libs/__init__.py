@@ -1,8 +1,24 @@
-from apps.libs.logger import Log as Logger
+import atexit
+
+from django.conf import settings
+
+from apps.libs import tokens
+from apps.libs.cache import TokenCache, TTLCache
+from apps.libs.identity import IDENTITY
+from apps.libs.logger import get_logger
 from apps.libs.services import (
+    AsyncBlueSkyService,
     BlueSkyService,
     BlueSkySessionRequest,
     BlueSkySessionResponse,
 )
 
-BLUESKY = BlueSkyService()
+BLUESKY = BlueSkyService(
+    resolver=IDENTITY.pds_endpoint, **getattr(settings, "BLUESKY_CLIENT", {})
+)
+ASYNC_BLUESKY = AsyncBlueSkyService(
+    resolver=IDENTITY.pds_endpoint, **getattr(settings, "BLUESKY_CLIENT", {})
+)
+TOKEN_CACHE = TokenCache(**getattr(settings, "BLUESKY_TOKEN_CACHE", {}))
+
+atexit.register(BLUESKY.close)
@@ -1,14 +1,133 @@
 """Custom Authentication Class."""
 
+import dataclasses
+import time
+import typing
+
 import httpx
+from django.conf import settings
 from django.contrib.auth.backends import BaseBackend
+from django.core.exceptions import ImproperlyConfigured
 from django.http import HttpRequest
 from pydantic import ValidationError
 
 from apps.accounts.models import Account
-from apps.libs import BLUESKY, BlueSkySessionRequest, BlueSkySessionResponse, Logger
+from apps.libs import (
+    BLUESKY,
+    TOKEN_CACHE,
+    BlueSkySessionRequest,
+    BlueSkySessionResponse,
+    TokenCache,
+    TTLCache,
+    get_logger,
+    tokens,
+)
+
+logger = get_logger(__name__)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class AccessClaims:
+    """Claims of a validated access JWT."""
+
+    sub: str
+    exp: float
+    aud: str | None = None
+
+
+class LocalJWTValidator:
+    """Validates AT Protocol access JWTs without touching the database.
+
+    The HS256 signature is checked with ``secret``, the PDS signing key; the
+    validator refuses to run without it, since the claims of an unsigned token
+    could be forged. Decoded claims are cached by token digest until the token
+    expires.
+    """
+
+    REJECTED_SCOPES = frozenset({"com.atproto.refresh"})
+
+    def __init__(
+        self,
+        secret: str = "",
+        audience: str | None = None,
+        maxsize: int = 10_000,
+        clock: typing.Callable[[], float] = time.time,
+    ) -> None:
+        """Create a validator.
+
+        Args:
+            secret: HS256 signing key of the PDS.
+            audience: Expected ``aud`` claim, usually the PDS DID.
+            maxsize: Decoded tokens kept in the claims cache.
+            clock: Wall clock used for ``exp`` checks.
+        """
+        self.secret = secret.encode()
+        self.audience = audience
+        self.clock = clock
+        self.claims: TTLCache[str, AccessClaims] = TTLCache(
+            maxsize=maxsize, ttl=24 * 60 * 60
+        )
+
+    def validate(self, token: str) -> AccessClaims:
+        """Validate ``token`` and return its claims.
+
+        Raises:
+            tokens.InvalidTokenError: If the token is malformed, expired,
+                wrongly signed or not meant for us.
+            ImproperlyConfigured: If no ``secret`` was given.
+        """
+        digest = TokenCache.digest(token)
+        if (claims := self.claims.get(digest)) is None:
+            claims = self.decode(token)
+            self.claims.set(digest, claims, claims.exp - self.clock())
+
+        if claims.exp <= self.clock():
+            raise tokens.InvalidTokenError("Token expired")
+
+        return claims
+
+    def decode(self, token: str) -> AccessClaims:
+        """Decode and check the claims of ``token``."""
+        if not self.secret:
+            raise ImproperlyConfigured(
+                'BLUESKY_JWT["secret"] is required for local JWT validation'
+            )
+
+        raw = tokens.verify(token, self.secret)
+
+        exp = raw.get("exp")
+        if not isinstance(exp, int | float):
+            raise tokens.InvalidTokenError("Missing exp claim")
+        if exp <= self.clock():
+            raise tokens.InvalidTokenError("Token expired")
+
+        sub = raw.get("sub")
+        if not isinstance(sub, str) or not sub.startswith("did:"):
+            raise tokens.InvalidTokenError("Subject is not a DID")
 
-logger = Logger(__name__)
+        if raw.get("scope") in self.REJECTED_SCOPES:
+            raise tokens.InvalidTokenError("Not an access token")
+
+        aud = raw.get("aud")
+        if self.audience and aud != self.audience:
+            raise tokens.InvalidTokenError(f"Unexpected audience {aud}")
+
+        return AccessClaims(sub=sub, exp=float(exp), aud=aud)
+
+
+VALIDATOR = LocalJWTValidator(
+    secret=getattr(settings, "BLUESKY_JWT", {}).get("secret", ""),
+    audience=getattr(settings, "BLUESKY_JWT", {}).get("audience"),
+)
+
+
+def bearer_token(request: HttpRequest) -> str | None:
+    """Token of the request's ``Authorization: Bearer`` header, if any."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+
+    return token.strip()
 
 
 class BlueSkyJWTBackend(BaseBackend):
@@ -21,10 +140,11 @@ class BlueSkyJWTBackend(BaseBackend):
         if not request:
             return None
 
-        if auth_header := request.headers.get("Authorization"):
-            _, token = auth_header.split()
-            logger.debug(f"Authenticating user with token: {token[:5]}...{token[-5:]}")
-            return Account.objects.filter(access_token=token).first()
+        if token := bearer_token(request):
+            logger.debug(
+                "Authenticating user with token: %s...%s", token[:5], token[-5:]
+            )
+            return self.authenticate_token(token)
 
         response = BlueSkySessionResponse.model_construct()
 
@@ -36,20 +156,67 @@ class BlueSkyJWTBackend(BaseBackend):
                 email=response.email,
                 access=response.accessJwt,
                 refresh=response.refreshJwt,
+                did=response.did,
+                pds=response.didDoc.pds_endpoint or "",
             )
         except Account.DoesNotExist:
-            logger.info(f"Creating account for {data.identifier}")
+            logger.info("Creating account for %s", data.identifier)
             return Account.auth.create_from_api(
                 email=response.email,
                 handle=response.handle,
                 access=response.accessJwt,
                 refresh=response.refreshJwt,
+                did=response.did,
+                pds=response.didDoc.pds_endpoint or "",
             )
         except ValidationError as exc:
-            logger.error(f"Error validating request: {exc.error_count()}")
-            logger.debug(f"Validation errors: {exc.json(indent=2)}")
+            logger.debug("Missing or invalid credentials: %s", exc.errors())
 
             return None
         except httpx.HTTPStatusError as exc:
-            logger.error(f"Error getting user: {exc}")
+            logger.error("Error getting user: %s", exc)
             return None
+
+    def authenticate_token(self, token: str) -> Account | None:
+        """Authenticate a bearer token.
+
+        With ``BLUESKY_JWT["validation"] == "local"`` the JWT is validated in
+        process, so malformed or expired tokens are rejected without a query,
+        and the account is found by the token's DID. Otherwise the token must
+        match the one stored on the account.
+        """
+        lookup = {"access_token": token}
+        if getattr(settings, "BLUESKY_JWT", {}).get("validation") == "local":
+            try:
+                lookup = {"did": VALIDATOR.validate(token).sub}
+            except tokens.InvalidTokenError as exc:
+                logger.debug("Rejected token: %s", exc)
+                return None
+
+        if account := TOKEN_CACHE.get(token):
+            return account
+
+        if account := Account.objects.filter(**lookup).first():
+            TOKEN_CACHE.set(token, account)
+
+        return account
+
+    def get_user(self, user_id: typing.Any) -> Account | None:  # noqa: ANN401
+        """Account stored in a session, if it is still active."""
+        return Account.objects.filter(pk=user_id, is_active=True).first()
+
+
+def get_account(request: HttpRequest) -> Account | None:
+    """Signed in account, from the session or the bearer token.
+
+    Unlike ``authenticate`` it never tries a login, so anonymous page views
+    are not treated as failed ones.
+    """
+    if request.user.is_authenticated:
+        return request.user
+
+    if token := bearer_token(request):
+        return BlueSkyJWTBackend().authenticate_token(token)
+
+    logger.debug("No credentials for %s", request.path)
+    return None
@@ -0,0 +1,424 @@
+"""Benchmarks for the service layer.
+
+Run with ``python manage.py benchmark <name>``. Every benchmark talks to a
+local stand-in XRPC server, never to bsky.social.
+"""
+
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import string
+import threading
+import time
+import tracemalloc
+import typing
+
+import httpx
+
+from apps.accounts.graph import Snapshot
+from apps.libs import lexicons as bsky
+from apps.libs.hub import Hub, Subscription, event_stream, sse
+from apps.libs.logger import LogFormatter, queue_handler, stream_handler
+from apps.libs.metrics import REGISTRY, Counter, Histogram
+from apps.libs.services import (
+    CREATE_SESSION,
+    AsyncBlueSkyService,
+    BaseBlueSkyService,
+    BlueSkyEndpoints,
+    BlueSkyService,
+    BlueSkySessionResponse,
+    DidDoc,
+)
+from apps.libs.standin import StandInXRPCServer, session_payload
+
+Result = dict[str, typing.Any]
+
+
+def timings(samples: list[float]) -> Result:
+    """Summarize per-call timings in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "calls": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p99_ms": round(ordered[int(len(ordered) * 0.99) - 1] * 1000, 3),
+    }
+
+
+def bench_pooled_client(iterations: int = 200) -> Result:
+    """Compare per-call ``httpx.post`` with the pooled ``BlueSkyService``."""
+    with StandInXRPCServer() as server:
+        url = f"{server.base_url}/xrpc/{BlueSkyEndpoints.CREATE_SESSION}"
+        body = {"identifier": "alice.test", "password": "hunter2"}
+
+        unpooled = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            httpx.post(url, json=body).raise_for_status()
+            unpooled.append(time.perf_counter() - start)
+
+        pooled = []
+        with BlueSkyService(base_url=server.base_url) as service:
+            for _ in range(iterations):
+                start = time.perf_counter()
+                service.get_user_jwt(body["identifier"], body["password"])
+                pooled.append(time.perf_counter() - start)
+
+    return {"httpx.post": timings(unpooled), "BlueSkyService": timings(pooled)}
+
+
+def bench_async_fanout(iterations: int = 200, latency: float = 0.02) -> Result:
+    """Compare sequential sync calls with ``asyncio.gather`` fan-out.
+
+    The stand-in server waits ``latency`` seconds per call, roughly the round
+    trip to a remote PDS, which is what concurrent fan-out overlaps.
+    """
+    with StandInXRPCServer(latency=latency) as server:
+        with BlueSkyService(base_url=server.base_url) as service:
+            service.get_user_jwt("alice.test", "hunter2")
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                service.get_user_jwt("alice.test", "hunter2")
+            sync_elapsed = time.perf_counter() - start
+
+        async def fanout() -> float:
+            async with AsyncBlueSkyService(base_url=server.base_url) as service:
+                await service.get_user_jwt("alice.test", "hunter2")
+
+                start = time.perf_counter()
+                await asyncio.gather(
+                    *(
+                        service.get_user_jwt("alice.test", "hunter2")
+                        for _ in range(iterations)
+                    )
+                )
+                return time.perf_counter() - start
+
+        async_elapsed = asyncio.run(fanout())
+
+    return {
+        "calls": iterations,
+        "BlueSkyService": {
+            "elapsed_s": round(sync_elapsed, 3),
+            "calls_per_s": round(iterations / sync_elapsed, 1),
+        },
+        "AsyncBlueSkyService": {
+            "elapsed_s": round(async_elapsed, 3),
+            "calls_per_s": round(iterations / async_elapsed, 1),
+        },
+    }
+
+
+def legacy_parse_session(content: bytes) -> BlueSkySessionResponse:
+    """Session parsing as ``get_user_jwt`` did it before single-pass decoding."""
+    data = json.loads(content)
+
+    doc = DidDoc.model_construct(**data["didDoc"])
+    doc.context = data["didDoc"]["@context"]
+    resp = BlueSkySessionResponse.model_construct(**data)
+    resp.didDoc = DidDoc.model_validate(doc)
+    response = BlueSkySessionResponse.model_validate(resp)
+
+    # The debug log serialized the whole payload whatever the log level.
+    json.dumps(data, indent=2)
+
+    return response
+
+
+def bench_session_parsing(iterations: int = 5000) -> Result:
+    """Compare legacy session parsing with ``model_validate_json``."""
+    content = json.dumps(session_payload()).encode()
+    parsers = {
+        "legacy": legacy_parse_session,
+        "model_validate_json": BlueSkySessionResponse.from_json,
+    }
+
+    results = {}
+    for name, parse in parsers.items():
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            parse(content)
+            samples.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        parse(content)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = {
+            "mean_us": round(statistics.fmean(samples) * 1_000_000, 2),
+            "p50_us": round(sorted(samples)[len(samples) // 2] * 1_000_000, 2),
+            "peak_bytes_per_response": peak,
+        }
+
+    return results
+
+
+def bench_sse_fanout(connections: int = 1000, events: int = 20) -> Result:
+    """Measure how many SSE connections one worker's ``Hub`` sustains.
+
+    Each connection is an ``event_stream`` consumed by its own task, as the
+    ASGI server would drive it. One event is published to every connection
+    at a time and timed until the last connection has received it.
+    """
+
+    async def run() -> Result:
+        hub = Hub()
+        received = asyncio.Event()
+        remaining = 0
+
+        async def client(subscription: Subscription) -> None:
+            nonlocal remaining
+            stream = event_stream(subscription, heartbeat=60)
+            await anext(stream)
+            async for _ in stream:
+                remaining -= 1
+                if not remaining:
+                    received.set()
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        clients = [
+            asyncio.create_task(client(hub.subscribe("timeline")))
+            for _ in range(connections)
+        ]
+        # Let every client start and block on its subscription.
+        await asyncio.sleep(0)
+        per_connection = (tracemalloc.get_traced_memory()[0] - before) // connections
+        tracemalloc.stop()
+
+        samples = []
+        message = sse("<article>post</article>", event="post")
+        for _ in range(events):
+            remaining = connections
+            received.clear()
+            start = time.perf_counter()
+            hub.publish("timeline", message)
+            await received.wait()
+            samples.append(time.perf_counter() - start)
+
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+
+        return {
+            "connections": connections,
+            "fanout": timings(samples),
+            "deliveries_per_second": round(connections * events / sum(samples)),
+            "bytes_per_connection": per_connection,
+        }
+
+    return asyncio.run(run())
+
+
+def bench_follow_graph(follows: int = 10_000) -> Result:
+    """Measure the memory ``follows`` follows take in each representation.
+
+    The follows arrive as ``getFollows`` pages and each representation keeps
+    what it needs of them. Sizes include what pydantic-core keeps in its
+    string cache while parsing.
+    """
+    rng = random.Random(0)  # noqa: S311
+    alphabet = string.ascii_lowercase + "234567"
+    dids = ["did:plc:" + "".join(rng.choices(alphabet, k=24)) for _ in range(follows)]
+    pages = [
+        json.dumps(
+            {
+                "subject": {"did": "did:plc:owner", "handle": "owner.test"},
+                "follows": [
+                    {"did": did, "handle": f"{did[8:16]}.bsky.social"} for did in page
+                ],
+            }
+        ).encode()
+        for page in itertools.batched(dids, 100)
+    ]
+
+    def received() -> typing.Iterator[bsky.ProfileViewBasic]:
+        for page in pages:
+            yield from bsky.GetFollowsResponse.model_validate_json(page).follows
+
+    builds: dict[str, typing.Callable[[], typing.Any]] = {
+        "profiles": lambda: list(received()),
+        "set": lambda: {profile.did for profile in received()},
+        "snapshot": lambda: Snapshot(profile.did for profile in received()),
+    }
+
+    results: Result = {"follows": follows}
+    kept = {}
+    for name, build in builds.items():
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept[name] = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        results[name] = {"bytes": size, "bytes_per_follow": round(size / follows, 1)}
+
+    lookups = [*dids[::2], *(did.upper() for did in dids[1::2])]
+    for name in ("set", "snapshot"):
+        start = time.perf_counter()
+        for did in lookups:
+            _ = did in kept[name]
+        elapsed = time.perf_counter() - start
+        results[name]["lookup_ns"] = round(elapsed / len(lookups) * 1e9)
+
+    results["persisted_bytes"] = len(kept["snapshot"].encode())
+    return results
+
+
+class LegacyLogFormatter(LogFormatter):
+    """Formatting as ``LogFormatter`` did it before the cached timestamp."""
+
+    def format_message(self, record: logging.LogRecord) -> str:
+        """Build log message."""
+        message = self.colorize(logging.Formatter.format(self, record), record.levelno)
+        level = self.colorize(f"[{record.levelname[:4]}]", record.levelno)
+        path = f"{record.filename}.{record.funcName}:{record.lineno}"
+        timestamp = datetime.datetime.fromtimestamp(record.created).strftime(
+            "%Y-%m-%d %H:%M:%S",
+        )
+        return f"{timestamp} {level} {path} {message}"
+
+
+def bench_logging(iterations: int = 20_000) -> Result:
+    """Measure what a log call costs the thread making it.
+
+    Records go to ``os.devnull``. "stream" formats and writes in the calling
+    thread, as every ``Log`` did, "queue" only enqueues: its listener is
+    started once the calls are timed, as it would run while requests wait
+    on I/O rather than compete with them. The "disabled" cases log at debug
+    level with the logger at info, once with an eager f-string of a
+    ``json.dumps`` and once with %-arguments.
+    """
+    data = json.loads(json.dumps(session_payload()))
+
+    def measure(call: typing.Callable[[], None]) -> Result:
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+        return {
+            "mean_us": round(statistics.fmean(samples) * 1_000_000, 3),
+            "p99_us": round(sorted(samples)[int(iterations * 0.99)] * 1_000_000, 3),
+        }
+
+    def logger(name: str, handler: logging.Handler) -> logging.Logger:
+        logger = logging.Logger(f"benchmark.{name}", logging.INFO)
+        logger.addHandler(handler)
+        return logger
+
+    results = {}
+    # The benchmark command disables logging; measure it enabled.
+    disabled = logging.root.manager.disable
+    logging.disable(logging.NOTSET)
+    with open(os.devnull, "w") as devnull:
+        legacy = logging.StreamHandler(devnull)
+        legacy.setFormatter(LegacyLogFormatter())
+        enqueue, listener = queue_handler(stream_handler(devnull))
+        handlers = {
+            "stream_legacy_formatter": legacy,
+            "stream": stream_handler(devnull),
+            "queue": enqueue,
+        }
+
+        try:
+            for name, handler in handlers.items():
+                info = logger(name, handler).info
+                results[name] = measure(lambda info=info: info("Synced %d", 50))
+
+            debug = logger("disabled", enqueue).debug
+            results["disabled_eager"] = measure(
+                lambda: debug(f"Session: {json.dumps(data, indent=2)}")
+            )
+            results["disabled_lazy"] = measure(lambda: debug("Session: %s", data))
+
+            start = time.perf_counter()
+            listener.start()
+            listener.stop()
+            results["queue"]["listener_drain_s"] = round(time.perf_counter() - start, 3)
+        finally:
+            logging.disable(disabled)
+
+    return results
+
+
+class LockedCounter(Counter):
+    """Counter behind one lock, the obvious alternative to per-thread shards."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Create the counter."""
+        super().__init__(*args, **kwargs)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels: typing.Any, amount: float = 1) -> None:  # noqa: ANN401
+        """Add ``amount`` to the count of ``labels``."""
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+def bench_metrics(iterations: int = 100_000, threads: int = 4) -> Result:
+    """Measure what updating metrics costs the hot path.
+
+    "record_call" is everything ``BlueSkyService`` adds to an XRPC call: a
+    histogram, three counters and a log call (logging is disabled by the
+    benchmark command). The contended cases update one counter from
+    ``threads`` threads at once, through shards and behind a lock.
+    """
+    nsid = BlueSkyEndpoints.CREATE_SESSION
+
+    def per_call(call: typing.Callable[[], None], count: int = iterations) -> float:
+        start = time.perf_counter()
+        for _ in range(count):
+            call()
+        return round((time.perf_counter() - start) / count * 1_000_000, 3)
+
+    def contended(counter: Counter) -> float:
+        def work() -> None:
+            for _ in range(iterations // threads):
+                counter.inc(nsid, 200)
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return round((time.perf_counter() - start) / iterations * 1_000_000, 3)
+
+    counter = Counter("benchmark_total", "Benchmark.", ("nsid", "status"))
+    locked = LockedCounter("benchmark_total", "Benchmark.", ("nsid", "status"))
+    histogram = Histogram("benchmark_seconds", "Benchmark.", ("nsid",))
+    request = httpx.Request("POST", f"https://pds.test/xrpc/{nsid}", content=b"{}")
+    response = httpx.Response(200, content=b"{}" * 512, request=request)
+
+    return {
+        "counter_us": per_call(lambda: counter.inc(nsid, 200)),
+        "locked_counter_us": per_call(lambda: locked.inc(nsid, 200)),
+        "histogram_us": per_call(lambda: histogram.observe(0.042, nsid)),
+        "record_call_us": per_call(
+            lambda: BaseBlueSkyService.record_call(
+                CREATE_SESSION, request, response, 0.042
+            )
+        ),
+        f"counter_{threads}_threads_us": contended(counter),
+        f"locked_counter_{threads}_threads_us": contended(locked),
+        "render_registry_us": per_call(REGISTRY.render, 1000),
+    }
+
+
+BENCHMARKS: dict[str, typing.Callable[..., Result]] = {
+    "pool": bench_pooled_client,
+    "async": bench_async_fanout,
+    "parse": bench_session_parsing,
+    "sse": bench_sse_fanout,
+    "graph": bench_follow_graph,
+    "logging": bench_logging,
+    "metrics": bench_metrics,
+}
@@ -0,0 +1,215 @@
+"""In-process caches."""
+
+import collections
+import copy
+import hashlib
+import threading
+import time
+import typing
+
+from django.core.cache import caches
+
+from apps.libs import tokens
+
+if typing.TYPE_CHECKING:
+    import uuid
+
+    from apps.accounts.models import Account
+
+
+class TTLCache[K: typing.Hashable, V]:
+    """Thread-safe, size-bounded LRU cache whose entries expire.
+
+    Every entry carries its own deadline so callers can tie it to something
+    like a token's expiry; ``ttl`` is the default and the upper bound.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        clock: typing.Callable[[], float] = time.monotonic,
+        maxbytes: int | None = None,
+        weigher: typing.Callable[[V], int] | None = None,
+    ) -> None:
+        """Create an empty cache.
+
+        Args:
+            maxsize: Entries kept before the least recently used is evicted.
+            ttl: Default lifetime of an entry, in seconds.
+            clock: Monotonic time source, overridable in tests.
+            maxbytes: Optional bound on the summed weight of the entries.
+            weigher: Size of a value in bytes, required with ``maxbytes``.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.maxbytes = maxbytes
+        self.weigher = weigher
+        self.hits = 0
+        self.misses = 0
+        self.weight = 0
+
+        self._data: collections.OrderedDict[K, tuple[float, V, int]] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        """Return the live value for ``key``, or ``default``."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            deadline, value, weight = entry
+            if deadline <= self.clock():
+                del self._data[key]
+                self.weight -= weight
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """Store ``value`` for at most ``ttl`` seconds."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+
+        weight = self.weigher(value) if self.weigher else 0
+        if self.maxbytes is not None and weight > self.maxbytes:
+            return
+
+        with self._lock:
+            if (previous := self._data.get(key)) is not None:
+                self.weight -= previous[2]
+            self._data[key] = (self.clock() + ttl, value, weight)
+            self._data.move_to_end(key)
+            self.weight += weight
+
+            while len(self._data) > self.maxsize or (
+                self.maxbytes is not None and self.weight > self.maxbytes
+            ):
+                self.weight -= self._data.popitem(last=False)[1][2]
+
+    def pop(self, key: K, default: V | None = None) -> V | None:
+        """Remove ``key`` and return its value, live or not."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self.weight -= entry[2]
+
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.weight = 0
+
+    def stats(self) -> dict[str, float]:
+        """Size, weight and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "bytes": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        """Number of stored entries, including expired ones not yet evicted."""
+        return len(self._data)
+
+
+class TokenCache:
+    """Bearer token to account cache used by ``BlueSkyJWTBackend``.
+
+    Tokens are keyed by their SHA-256 digest, never stored as-is. Entries live
+    until the JWT ``exp`` or ``ttl``, whichever comes first. With ``alias`` set,
+    entries are also written to that Django cache so other workers can reuse
+    them; the in-process layer is checked first. The digests cached for each
+    account are remembered, since an account can have several sessions, so
+    invalidating the account drops all of them.
+    """
+
+    PREFIX = "hypersky:token"
+
+    def __init__(
+        self, maxsize: int = 10_000, ttl: float = 60.0, alias: str | None = None
+    ) -> None:
+        """Create the cache.
+
+        Args:
+            maxsize: Tokens kept in process.
+            ttl: Upper bound, in seconds, on how long a token is cached.
+            alias: Optional ``CACHES`` alias shared between workers.
+        """
+        self.ttl = ttl
+        self.alias = alias
+        self.local: TTLCache[str, Account] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.digests: TTLCache[uuid.UUID, set[str]] = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def digest(token: str) -> str:
+        """Cache key for ``token``."""
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def lifetime(self, token: str) -> float:
+        """Seconds ``token`` may stay cached."""
+        if (exp := tokens.expires_at(token)) is None:
+            return self.ttl
+
+        return min(self.ttl, exp - time.time())
+
+    def get(self, token: str) -> "Account | None":
+        """Account for ``token``, or ``None`` on a miss."""
+        digest = self.digest(token)
+        account = self.local.get(digest)
+        if account is None and self.alias:
+            account = caches[self.alias].get(f"{self.PREFIX}:{digest}")
+            if account is not None:
+                self.local.set(digest, account, self.lifetime(token))
+
+        # Hand out copies so callers never mutate the cached instance.
+        return None if account is None else copy.copy(account)
+
+    def set(self, token: str, account: "Account") -> None:
+        """Cache ``account`` as the owner of ``token``."""
+        if (ttl := self.lifetime(token)) <= 0:
+            return
+
+        digest = self.digest(token)
+        self.local.set(digest, account, ttl)
+        digests = self.digests.get(account.pk) or set()
+        self.digests.set(account.pk, digests | {digest}, self.ttl)
+
+        if self.alias:
+            shared = caches[self.alias]
+            account_key = f"{self.PREFIX}:account:{account.pk}"
+            shared.set(f"{self.PREFIX}:{digest}", account, ttl)
+            digests = shared.get(account_key) or set()
+            shared.set(account_key, digests | {digest}, self.ttl)
+
+    def invalidate_account(self, pk: "uuid.UUID") -> None:
+        """Forget every token cached for the account with primary key ``pk``."""
+        for digest in self.digests.pop(pk) or ():
+            self.local.pop(digest)
+
+        if self.alias:
+            shared = caches[self.alias]
+            account_key = f"{self.PREFIX}:account:{pk}"
+            digests = shared.get(account_key) or set()
+            shared.delete_many(
+                [*(f"{self.PREFIX}:{digest}" for digest in digests), account_key]
+            )
+
+    def clear(self) -> None:
+        """Drop the in-process entries."""
+        self.local.clear()
+        self.digests.clear()
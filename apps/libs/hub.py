@@ -0,0 +1,159 @@
+"""In-process fan-out hub for Server-Sent Events.
+
+Streaming views subscribe to topics and relay what is published to them.
+A message is encoded once by the publisher and the same bytes are handed to
+every subscriber, so pushing one update to N connections costs N queue puts,
+not N queries or N renders.
+"""
+
+import asyncio
+import collections
+import threading
+import typing
+
+# Sent when a stream opens: how long browsers wait before reconnecting.
+RETRY_MS = 5000
+
+HEARTBEAT = b": heartbeat\n\n"
+
+
+def sse(data: str, event: str | None = None, id: str | None = None) -> bytes:
+    """Encode one Server-Sent Event."""
+    lines = [f"event: {event}"] if event else []
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Subscription:
+    """Bounded mailbox of one subscriber.
+
+    A subscriber that stops reading loses its oldest messages instead of
+    holding memory or blocking the publisher.
+    """
+
+    def __init__(self, hub: "Hub", topics: typing.Iterable[str], maxsize: int) -> None:
+        """Create a subscription; use ``Hub.subscribe``."""
+        self.hub = hub
+        self.topics = frozenset(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, message: bytes) -> None:
+        """Queue ``message``, dropping the oldest one when full."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, wait: float | None = None) -> bytes | None:
+        """Next message, or ``None`` if none arrived within ``wait`` seconds."""
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        try:
+            async with asyncio.timeout(wait):
+                return await self.queue.get()
+        except TimeoutError:
+            return None
+
+    def close(self) -> None:
+        """Stop receiving messages."""
+        self.hub.unsubscribe(self)
+
+    def __enter__(self) -> typing.Self:
+        """Enter context manager."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Unsubscribe when leaving the context manager."""
+        self.close()
+
+
+class Hub:
+    """Topic based publish/subscribe between threads and event loops."""
+
+    def __init__(self, maxsize: int = 100) -> None:
+        """Create an empty hub.
+
+        Args:
+            maxsize: Messages buffered per subscriber.
+        """
+        self.maxsize = maxsize
+        self.published = 0
+        self.delivered = 0
+
+        self._topics: dict[str, set[Subscription]] = collections.defaultdict(set)
+        self._subscriptions: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, *topics: str) -> Subscription:
+        """Subscribe the running event loop to ``topics``."""
+        subscription = Subscription(self, topics, self.maxsize)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            for topic in subscription.topics:
+                self._topics[topic].add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove ``subscription`` from every topic."""
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            for topic in subscription.topics:
+                if subscribers := self._topics.get(topic):
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def topics(self) -> list[str]:
+        """Topics with at least one subscriber."""
+        with self._lock:
+            return list(self._topics)
+
+    def publish(self, topic: str, message: bytes) -> int:
+        """Deliver ``message`` to the subscribers of ``topic``.
+
+        Safe to call from any thread. Returns the number of subscribers.
+        """
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+            self.published += 1
+            self.delivered += len(subscribers)
+
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+
+        for subscription in subscribers:
+            if subscription.loop is current:
+                subscription.put(message)
+            else:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+
+        return len(subscribers)
+
+    def __len__(self) -> int:
+        """Number of subscriptions."""
+        return len(self._subscriptions)
+
+
+async def event_stream(
+    subscription: Subscription, heartbeat: float = 15.0
+) -> typing.AsyncIterator[bytes]:
+    """Relay ``subscription`` as an SSE body.
+
+    A comment line is sent when nothing was published for ``heartbeat``
+    seconds, which keeps proxies from closing idle connections and surfaces
+    dead clients. The subscription is closed when the client disconnects.
+    """
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        while True:
+            yield await subscription.get(heartbeat) or HEARTBEAT
+    finally:
+        subscription.close()
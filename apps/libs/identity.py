@@ -0,0 +1,243 @@
+"""Handle and DID resolution.
+
+Handles resolve to DIDs through the ``_atproto`` DNS TXT record, or
+``/.well-known/atproto-did`` on the handle's domain. DIDs resolve to their
+document through the PLC directory (``did:plc``) or the domain itself
+(``did:web``). The document names the account's PDS, which lets us talk to
+self-hosted servers directly rather than through the bsky.social entryway.
+
+Results are cached with a TTL; failures are cached too, for a shorter while,
+so a bad handle typed repeatedly doesn't hit DNS and HTTP each time.
+
+Handles and ``did:web`` DIDs name hosts anyone can pick, so those are only
+fetched when every address they resolve to is public, and redirects are not
+followed: a handle must not make us probe the internal network.
+"""
+
+import ipaddress
+import socket
+import threading
+import urllib.parse
+
+import dns.exception
+import dns.resolver
+import httpx
+from django.conf import settings
+from pydantic import ValidationError
+
+from apps.libs.cache import TTLCache
+from apps.libs.logger import get_logger
+from apps.libs.services import DidDoc
+
+logger = get_logger(__name__)
+
+PLC_DIRECTORY = "https://plc.directory"
+
+MISSING = object()
+
+
+class ResolutionError(LookupError):
+    """Raised when a handle or DID cannot be resolved."""
+
+
+def is_did(identifier: str) -> bool:
+    """Whether ``identifier`` is a DID rather than a handle."""
+    return identifier.startswith("did:")
+
+
+def normalize_handle(handle: str) -> str:
+    """Handle without the leading ``@``, lowercased."""
+    return handle.removeprefix("@").strip().lower()
+
+
+def is_public_host(host: str) -> bool:
+    """Whether every address of ``host`` is publicly routable."""
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, 443)}
+    except (OSError, UnicodeError):
+        return False
+
+    return bool(addresses) and all(
+        ipaddress.ip_address(address.split("%", 1)[0]).is_global
+        for address in addresses
+    )
+
+
+class IdentityResolver:
+    """Resolve handles to DIDs and DIDs to documents, with caching."""
+
+    def __init__(
+        self,
+        plc_directory: str = PLC_DIRECTORY,
+        maxsize: int = 10_000,
+        ttl: float = 3600.0,
+        negative_ttl: float = 300.0,
+        timeout: float = 3.0,
+        transport: httpx.BaseTransport | None = None,
+    ) -> None:
+        """Create a resolver.
+
+        Args:
+            plc_directory: Base URL of the PLC directory.
+            maxsize: Handles, and documents, kept in process.
+            ttl: Seconds a resolution stays cached.
+            negative_ttl: Seconds a failed resolution stays cached.
+            timeout: Timeout, in seconds, of each DNS or HTTP lookup.
+            transport: Optional transport, mostly useful in tests.
+        """
+        self.plc_directory = plc_directory.rstrip("/")
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.transport = transport
+        self.handles: TTLCache[str, str | None] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.documents: TTLCache[str, DidDoc | None] = TTLCache(
+            maxsize=maxsize, ttl=ttl
+        )
+
+        self._client: httpx.Client | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        """Pooled client for well-known and directory lookups."""
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    timeout=self.timeout,
+                    transport=self.transport,
+                    follow_redirects=False,
+                )
+
+        return self._client
+
+    def lookup_dns(self, handle: str) -> str | None:
+        """DID in the ``_atproto`` TXT record of ``handle``."""
+        try:
+            answers = dns.resolver.resolve(
+                f"_atproto.{handle}", "TXT", lifetime=self.timeout
+            )
+        except dns.exception.DNSException:
+            return None
+
+        for answer in answers:
+            value = b"".join(answer.strings).decode()
+            if value.startswith("did="):
+                return value.removeprefix("did=")
+
+        return None
+
+    def lookup_well_known(self, handle: str) -> str | None:
+        """DID served at ``https://<handle>/.well-known/atproto-did``."""
+        if not is_public_host(handle):
+            logger.info("Not looking up %s: not a public host", handle)
+            return None
+
+        try:
+            response = self.client.get(f"https://{handle}/.well-known/atproto-did")
+        except httpx.HTTPError:
+            return None
+
+        did = response.text.strip()
+        return did if response.is_success and is_did(did) else None
+
+    def resolve_handle(self, handle: str) -> str:
+        """DID of ``handle``.
+
+        Raises:
+            ResolutionError: If neither DNS nor the well-known URL has one.
+        """
+        handle = normalize_handle(handle)
+        if (did := self.handles.get(handle, MISSING)) is MISSING:
+            did = self.lookup_dns(handle) or self.lookup_well_known(handle)
+            self.handles.set(handle, did, None if did else self.negative_ttl)
+
+        if did is None:
+            raise ResolutionError(f"Cannot resolve handle {handle}")
+
+        return did
+
+    def document_url(self, did: str) -> str:
+        """Where the document of ``did`` is published."""
+        if did.startswith("did:plc:"):
+            return f"{self.plc_directory}/{did}"
+
+        if did.startswith("did:web:"):
+            host = did.removeprefix("did:web:").replace("%3A", ":")
+            return f"https://{host}/.well-known/did.json"
+
+        raise ResolutionError(f"Unsupported DID method: {did}")
+
+    def resolve_did(self, did: str) -> DidDoc:
+        """Document of ``did``.
+
+        Raises:
+            ResolutionError: If the document is missing or invalid.
+        """
+        if (document := self.documents.get(did, MISSING)) is MISSING:
+            url = self.document_url(did)
+            host = urllib.parse.urlsplit(url).hostname or ""
+            if did.startswith("did:web:") and not is_public_host(host):
+                logger.info("Not resolving %s: not a public host", did)
+                self.documents.set(did, None, self.negative_ttl)
+                raise ResolutionError(f"Cannot resolve {did}")
+
+            try:
+                response = self.client.get(url)
+                response.raise_for_status()
+                document = DidDoc.model_validate_json(response.content)
+            except (httpx.HTTPError, ValidationError) as exc:
+                logger.warning("Resolving %s failed: %s", did, exc)
+                document = None
+
+            if document is not None and document.id != did:
+                document = None
+            self.documents.set(did, document, None if document else self.negative_ttl)
+
+        if document is None:
+            raise ResolutionError(f"Cannot resolve {did}")
+
+        return document
+
+    def resolve(self, identifier: str) -> tuple[str, DidDoc]:
+        """DID and document of a handle or DID.
+
+        A handle only counts when the document claims it back.
+
+        Raises:
+            ResolutionError: If resolution fails or the handle isn't verified.
+        """
+        did = identifier if is_did(identifier) else self.resolve_handle(identifier)
+        document = self.resolve_did(did)
+
+        claimed = (document.handle or "").lower()
+        if not is_did(identifier) and claimed != normalize_handle(identifier):
+            raise ResolutionError(f"{did} does not claim {identifier}")
+
+        return did, document
+
+    def pds_endpoint(self, identifier: str) -> str | None:
+        """PDS of a handle or DID, or ``None`` if it cannot be resolved.
+
+        Emails, also accepted as login identifiers, are not resolved.
+        """
+        identifier = identifier.removeprefix("@")
+        if "@" in identifier or not (is_did(identifier) or "." in identifier):
+            return None
+
+        try:
+            return self.resolve(identifier)[1].pds_endpoint
+        except ResolutionError as exc:
+            logger.info("Falling back to the entryway: %s", exc)
+            return None
+
+    def clear(self) -> None:
+        """Drop every cached resolution."""
+        self.handles.clear()
+        self.documents.clear()
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Cache statistics of handles and documents."""
+        return {"handles": self.handles.stats(), "documents": self.documents.stats()}
+
+
+IDENTITY = IdentityResolver(**getattr(settings, "IDENTITY", {}))
@@ -0,0 +1,443 @@
+# ruff: noqa: N815
+"""Models and registrations for the ``app.bsky`` lexicons.
+
+``apps.libs.services`` covers the ``com.atproto`` methods used to log in;
+the Bluesky application methods the apps call live here, along with the
+repository writes they make, so every app can share the same view models.
+"""
+
+import datetime
+import enum
+import typing
+
+from polyfactory.factories.pydantic_factory import ModelFactory
+from pydantic import BaseModel, ConfigDict, Field
+
+from apps.libs import xrpc
+
+
+class ProfileViewBasic(BaseModel):
+    """Basic profile view, as embedded in posts."""
+
+    did: str
+    handle: str
+    displayName: str | None = None
+    avatar: str | None = None
+
+    @property
+    def name(self) -> str:
+        """Display name, falling back to the handle."""
+        return self.displayName or self.handle
+
+
+class ProfileViewBasicFactory(ModelFactory["ProfileViewBasic"]):
+    """Basic Profile View Factory."""
+
+    __model__ = ProfileViewBasic
+
+
+class ProfileViewDetailed(ProfileViewBasic):
+    """Full profile view, as returned by ``getProfile(s)``."""
+
+    description: str | None = None
+    banner: str | None = None
+    followersCount: int = 0
+    followsCount: int = 0
+    postsCount: int = 0
+    indexedAt: datetime.datetime | None = None
+
+
+class ProfileViewDetailedFactory(ModelFactory["ProfileViewDetailed"]):
+    """Detailed Profile View Factory."""
+
+    __model__ = ProfileViewDetailed
+
+
+class GetProfilesParams(BaseModel):
+    """Get Profiles Parameters."""
+
+    actors: list[str] = Field(min_length=1, max_length=25)
+
+
+class GetProfilesResponse(BaseModel):
+    """Get Profiles Response."""
+
+    profiles: list[ProfileViewDetailed]
+
+
+class PostView(BaseModel):
+    """Hydrated post view."""
+
+    uri: str
+    cid: str
+    author: ProfileViewBasic
+    record: dict[str, typing.Any]
+    replyCount: int = 0
+    repostCount: int = 0
+    likeCount: int = 0
+    quoteCount: int = 0
+    indexedAt: datetime.datetime
+
+    @property
+    def text(self) -> str:
+        """Text of the post record."""
+        return self.record.get("text", "")
+
+
+class PostViewFactory(ModelFactory["PostView"]):
+    """Post View Factory."""
+
+    __model__ = PostView
+    __set_as_default_factory_for_type__ = True
+
+    @classmethod
+    def record(cls) -> dict[str, typing.Any]:
+        """Minimal ``app.bsky.feed.post`` record."""
+        return {
+            "$type": "app.bsky.feed.post",
+            "text": cls.__faker__.sentence(),
+            "createdAt": cls.__faker__.iso8601(),
+        }
+
+
+class FeedViewPost(BaseModel):
+    """Timeline entry: a post plus why it is in the feed."""
+
+    post: PostView
+    reply: dict[str, typing.Any] | None = None
+    reason: dict[str, typing.Any] | None = None
+
+    @property
+    def sort_at(self) -> datetime.datetime:
+        """When the entry entered the feed: the repost time, or the post's."""
+        if self.reason and (indexed_at := self.reason.get("indexedAt")):
+            return datetime.datetime.fromisoformat(indexed_at)
+
+        return self.post.indexedAt
+
+
+class FeedViewPostFactory(ModelFactory["FeedViewPost"]):
+    """Feed View Post Factory."""
+
+    __model__ = FeedViewPost
+    __set_as_default_factory_for_type__ = True
+
+    reply = None
+    reason = None
+
+
+class GetTimelineParams(BaseModel):
+    """Get Timeline Parameters."""
+
+    algorithm: str | None = None
+    limit: int = Field(default=50, ge=1, le=100)
+    cursor: str | None = None
+
+
+class GetTimelineResponse(BaseModel):
+    """Get Timeline Response."""
+
+    cursor: str | None = None
+    feed: list[FeedViewPost]
+
+
+class GetTimelineResponseFactory(ModelFactory["GetTimelineResponse"]):
+    """Get Timeline Response Factory."""
+
+    __model__ = GetTimelineResponse
+
+
+class Notification(BaseModel):
+    """Notification view."""
+
+    uri: str
+    cid: str
+    author: ProfileViewBasic
+    reason: str
+    reasonSubject: str | None = None
+    record: dict[str, typing.Any]
+    isRead: bool
+    indexedAt: datetime.datetime
+
+
+class NotificationFactory(ModelFactory["Notification"]):
+    """Notification Factory."""
+
+    __model__ = Notification
+    __set_as_default_factory_for_type__ = True
+
+    reasonSubject = None
+
+    @classmethod
+    def reason(cls) -> str:
+        """One of the notification reasons the AppView sends."""
+        return cls.__faker__.random_element(
+            ["like", "repost", "follow", "mention", "reply", "quote"]
+        )
+
+
+class ListNotificationsParams(BaseModel):
+    """List Notifications Parameters."""
+
+    limit: int = Field(default=50, ge=1, le=100)
+    cursor: str | None = None
+
+
+class ListNotificationsResponse(BaseModel):
+    """List Notifications Response."""
+
+    cursor: str | None = None
+    notifications: list[Notification]
+    seenAt: datetime.datetime | None = None
+
+
+class ListNotificationsResponseFactory(ModelFactory["ListNotificationsResponse"]):
+    """List Notifications Response Factory."""
+
+    __model__ = ListNotificationsResponse
+
+
+class GetUnreadCountResponse(BaseModel):
+    """Get Unread Count Response."""
+
+    count: int
+
+
+class UpdateSeenInput(BaseModel):
+    """Update Seen Input."""
+
+    seenAt: datetime.datetime
+
+
+class ListViewBasic(BaseModel):
+    """Basic list view."""
+
+    uri: str
+    cid: str
+    name: str
+    purpose: str
+    avatar: str | None = None
+    listItemCount: int | None = None
+
+
+class ListItemView(BaseModel):
+    """Member of a list."""
+
+    uri: str
+    subject: ProfileViewBasic
+
+
+class GetListParams(BaseModel):
+    """Get List Parameters."""
+
+    limit: int = Field(default=50, ge=1, le=100)
+    cursor: str | None = None
+    list: str
+
+
+class GetListResponse(BaseModel):
+    """Get List Response."""
+
+    cursor: str | None = None
+    items: list[ListItemView]
+    list: ListViewBasic
+
+
+class StarterPackViewBasic(BaseModel):
+    """Basic starter pack view, as listed on a profile."""
+
+    uri: str
+    cid: str
+    record: dict[str, typing.Any]
+    creator: ProfileViewBasic
+    listItemCount: int | None = None
+    joinedAllTimeCount: int | None = None
+    indexedAt: datetime.datetime | None = None
+
+    @property
+    def name(self) -> str:
+        """Name of the pack."""
+        return self.record.get("name", "")
+
+    @property
+    def description(self) -> str:
+        """Description of the pack."""
+        return self.record.get("description", "")
+
+
+class StarterPackView(StarterPackViewBasic):
+    """Starter pack with its list and a sample of its members."""
+
+    listItemsSample: list[ListItemView] = []
+    list: ListViewBasic | None = None
+
+
+class GetStarterPackParams(BaseModel):
+    """Get Starter Pack Parameters."""
+
+    starterPack: str
+
+
+class GetStarterPackResponse(BaseModel):
+    """Get Starter Pack Response."""
+
+    starterPack: StarterPackView
+
+
+class GetActorStarterPacksParams(BaseModel):
+    """Get Actor Starter Packs Parameters."""
+
+    actor: str
+    limit: int = Field(default=50, ge=1, le=100)
+    cursor: str | None = None
+
+
+class GetActorStarterPacksResponse(BaseModel):
+    """Get Actor Starter Packs Response."""
+
+    cursor: str | None = None
+    starterPacks: list[StarterPackViewBasic]
+
+
+class GetFollowsParams(BaseModel):
+    """Get Follows Parameters."""
+
+    actor: str
+    limit: int = Field(default=50, ge=1, le=100)
+    cursor: str | None = None
+
+
+class GetFollowsResponse(BaseModel):
+    """Get Follows Response."""
+
+    subject: ProfileViewBasic
+    cursor: str | None = None
+    follows: list[ProfileViewBasic]
+
+
+class GetFollowersParams(BaseModel):
+    """Get Followers Parameters."""
+
+    actor: str
+    limit: int = Field(default=50, ge=1, le=100)
+    cursor: str | None = None
+
+
+class GetFollowersResponse(BaseModel):
+    """Get Followers Response."""
+
+    subject: ProfileViewBasic
+    cursor: str | None = None
+    followers: list[ProfileViewBasic]
+
+
+# Most writes ``applyWrites`` accepts in one call.
+MAX_WRITES = 200
+
+
+class Create(BaseModel):
+    """``applyWrites`` operation creating a record."""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    type: typing.Literal["com.atproto.repo.applyWrites#create"] = Field(
+        default="com.atproto.repo.applyWrites#create", alias="$type"
+    )
+    collection: str
+    rkey: str | None = None
+    value: dict[str, typing.Any]
+
+
+class Delete(BaseModel):
+    """``applyWrites`` operation deleting a record."""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    type: typing.Literal["com.atproto.repo.applyWrites#delete"] = Field(
+        default="com.atproto.repo.applyWrites#delete", alias="$type"
+    )
+    collection: str
+    rkey: str
+
+
+class ApplyWritesInput(BaseModel):
+    """Apply Writes Input."""
+
+    repo: str
+    validate_: bool | None = Field(default=None, alias="validate")
+    writes: list[Create | Delete] = Field(min_length=1, max_length=MAX_WRITES)
+    swapCommit: str | None = None
+
+
+class WriteResult(BaseModel):
+    """Result of one ``applyWrites`` operation; deletes have no URI."""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    type: str = Field(alias="$type")
+    uri: str | None = None
+    cid: str | None = None
+
+
+class ApplyWritesOutput(BaseModel):
+    """Apply Writes Output."""
+
+    commit: dict[str, typing.Any] | None = None
+    results: list[WriteResult] = []
+
+
+class BskyEndpoints(enum.StrEnum):
+    """NSIDs of the ``app.bsky`` methods in use."""
+
+    GET_PROFILES = "app.bsky.actor.getProfiles"
+    GET_TIMELINE = "app.bsky.feed.getTimeline"
+    LIST_NOTIFICATIONS = "app.bsky.notification.listNotifications"
+    GET_UNREAD_COUNT = "app.bsky.notification.getUnreadCount"
+    UPDATE_SEEN = "app.bsky.notification.updateSeen"
+    GET_LIST = "app.bsky.graph.getList"
+    GET_STARTER_PACK = "app.bsky.graph.getStarterPack"
+    GET_ACTOR_STARTER_PACKS = "app.bsky.graph.getActorStarterPacks"
+    GET_FOLLOWS = "app.bsky.graph.getFollows"
+    GET_FOLLOWERS = "app.bsky.graph.getFollowers"
+    APPLY_WRITES = "com.atproto.repo.applyWrites"
+
+
+GET_PROFILES = xrpc.query(
+    BskyEndpoints.GET_PROFILES, params=GetProfilesParams, output=GetProfilesResponse
+)
+GET_TIMELINE = xrpc.query(
+    BskyEndpoints.GET_TIMELINE, params=GetTimelineParams, output=GetTimelineResponse
+)
+LIST_NOTIFICATIONS = xrpc.query(
+    BskyEndpoints.LIST_NOTIFICATIONS,
+    params=ListNotificationsParams,
+    output=ListNotificationsResponse,
+)
+GET_UNREAD_COUNT = xrpc.query(
+    BskyEndpoints.GET_UNREAD_COUNT, output=GetUnreadCountResponse
+)
+UPDATE_SEEN = xrpc.procedure(BskyEndpoints.UPDATE_SEEN, input=UpdateSeenInput)
+GET_LIST = xrpc.query(
+    BskyEndpoints.GET_LIST, params=GetListParams, output=GetListResponse
+)
+GET_STARTER_PACK = xrpc.query(
+    BskyEndpoints.GET_STARTER_PACK,
+    params=GetStarterPackParams,
+    output=GetStarterPackResponse,
+)
+GET_ACTOR_STARTER_PACKS = xrpc.query(
+    BskyEndpoints.GET_ACTOR_STARTER_PACKS,
+    params=GetActorStarterPacksParams,
+    output=GetActorStarterPacksResponse,
+)
+GET_FOLLOWS = xrpc.query(
+    BskyEndpoints.GET_FOLLOWS, params=GetFollowsParams, output=GetFollowsResponse
+)
+GET_FOLLOWERS = xrpc.query(
+    BskyEndpoints.GET_FOLLOWERS,
+    params=GetFollowersParams,
+    output=GetFollowersResponse,
+)
+APPLY_WRITES = xrpc.procedure(
+    BskyEndpoints.APPLY_WRITES, input=ApplyWritesInput, output=ApplyWritesOutput
+)
@@ -1,7 +1,50 @@
-"""Loggers."""
+"""Loggers.
 
-import datetime
+Modules log through ``get_logger(__name__)``: loggers under ``apps`` share
+the handler Django's ``LOGGING`` setting builds with ``build_handler``, and
+the level set there. By default it is a ``QueueHandler``: the thread logging
+only merges the message and enqueues the record, and a ``QueueListener``
+thread colorizes, timestamps and writes it. The listener is started by the
+first record each process logs, so workers forked after ``LOGGING`` is
+configured get their own. Set ``LOGGER["queue"]`` to ``False`` to write from
+the calling thread instead.
+
+Call sites pass %-style arguments (``logger.debug("Got %s", value)``), so a
+disabled level costs a method call, not the formatting of its message.
+
+``LOGGER["format"]`` picks colored text, for development, or JSON lines for
+the log pipeline. JSON records carry the request id set by
+``apps.libs.middleware.RequestIdMiddleware`` and the ``extra`` fields of the
+call, such as the timings ``BlueSkyService`` logs for every XRPC call. They
+are encoded with ``orjson``.
+"""
+
+import atexit
+import contextvars
 import logging
+import logging.handlers
+import os
+import queue
+import time
+import typing
+
+import orjson
+
+# Id of the request being handled, set by ``RequestIdMiddleware``.
+request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+# Attributes every record has; the others come from ``extra``.
+RECORD_ATTRIBUTES = frozenset(
+    [
+        *vars(logging.LogRecord("", 0, "", 0, "", None, None)),
+        "message",
+        "asctime",
+        "request_id",
+        "taskName",
+    ]
+)
 
 
 class LogFormatter(logging.Formatter):
@@ -13,44 +56,46 @@ class LogFormatter(logging.Formatter):
     CRITICAL = "\033[95m"
     RESET = "\033[0m"
 
+    COLORS = {
+        logging.ERROR: ERROR,
+        logging.WARNING: WARNING,
+        logging.CRITICAL: CRITICAL,
+    }
+
+    DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+    def __init__(self) -> None:
+        """Create the formatter."""
+        super().__init__()
+        # Second of the last timestamp formatted, and its text.
+        self._timestamp: tuple[int, str] = (-1, "")
+
     def colorize(self, text: str, level: int) -> str:
         """Colorize log message."""
-        match level:
-            case logging.ERROR:
-                return f"{self.ERROR}{text}{self.RESET}"
-            case logging.WARNING:
-                return f"{self.WARNING}{text}{self.RESET}"
-            case logging.CRITICAL:
-                return f"{self.CRITICAL}{text}{self.RESET}"
-            case _:
-                return f"{self.DODGER_BLUE}{text}{self.RESET}"
+        return f"{self.COLORS.get(level, self.DODGER_BLUE)}{text}{self.RESET}"
 
     def level_tag(self, record: logging.LogRecord) -> str:
         """Get level tag."""
-        tag = f"[{record.levelname[:4]}]"
-        match record.levelno:
-            case logging.ERROR:
-                return f"{self.ERROR}{tag}{self.RESET}"
-            case logging.WARNING:
-                return f"{self.WARNING}{tag}{self.RESET}"
-            case logging.CRITICAL:
-                return f"{self.CRITICAL}{tag}{self.RESET}"
-            case _:
-                return f"{self.DODGER_BLUE}{tag}{self.RESET}"
+        return self.colorize(f"[{record.levelname[:4]}]", record.levelno)
 
-    def format_message(self, record: logging.LogRecord) -> str:
-        """Build log message."""
-        message = super().format(record)
+    def formatTime(  # noqa: N802
+        self, record: logging.LogRecord, datefmt: str | None = None
+    ) -> str:
+        """Timestamp of ``record``, formatted once per second."""
+        second = int(record.created)
+        cached, text = self._timestamp
+        if second != cached:
+            text = time.strftime(datefmt or self.DATEFMT, time.localtime(second))
+            self._timestamp = (second, text)
 
-        message = self.colorize(message, record.levelno)
-        level = self.colorize(f"[{record.levelname[:4]}]", record.levelno)
+        return text
 
+    def format_message(self, record: logging.LogRecord) -> str:
+        """Build log message."""
+        message = self.colorize(super().format(record), record.levelno)
         path = f"{record.filename}.{record.funcName}:{record.lineno}"
-        timestamp = datetime.datetime.fromtimestamp(record.created).strftime(
-            "%Y-%m-%d %H:%M:%S",
-        )
 
-        return f"{timestamp} {level} {path} {message}"
+        return f"{self.formatTime(record)} {self.level_tag(record)} {path} {message}"
 
     def format(self, record: logging.LogRecord) -> str:
         """Format log record.
@@ -60,18 +105,180 @@ class LogFormatter(logging.Formatter):
         return self.format_message(record)
 
 
-class Log(logging.Logger):
-    """BlueSky Logger."""
+def dumps(fields: dict[str, typing.Any]) -> str:
+    """Compact JSON of ``fields``; values JSON can't hold become strings."""
+    return orjson.dumps(fields, default=str).decode()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, for log pipelines."""
+
+    def __init__(self) -> None:
+        """Create the formatter."""
+        super().__init__()
+        # Second of the last timestamp formatted, and its text.
+        self._timestamp: tuple[int, str] = (-1, "")
+
+    def formatTime(  # noqa: N802
+        self, record: logging.LogRecord, datefmt: str | None = None
+    ) -> str:
+        """UTC ISO 8601 timestamp of ``record``, with milliseconds."""
+        second = int(record.created)
+        cached, text = self._timestamp
+        if second != cached:
+            text = time.strftime(datefmt or "%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+            self._timestamp = (second, text)
+
+        return f"{text}.{int(record.msecs):03d}Z"
+
+    def fields(self, record: logging.LogRecord) -> dict[str, typing.Any]:
+        """Fields of the JSON object for ``record``."""
+        fields = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "location": f"{record.module}.{record.funcName}:{record.lineno}",
+            "request_id": getattr(record, "request_id", None),
+        }
+        fields.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+
+        return fields
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Serialize ``record`` as one line of JSON."""
+        return dumps(self.fields(record))
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id.
+
+    Runs in the thread logging, before the record is enqueued, since the
+    listener thread doesn't see the request's context.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Add ``request_id`` to ``record``."""
+        record.request_id = request_id.get()
+        return True
+
+
+FORMATTERS: dict[str, type[logging.Formatter]] = {
+    "text": LogFormatter,
+    "json": JSONFormatter,
+}
+
+
+class EnqueueHandler(logging.handlers.QueueHandler):
+    """``QueueHandler`` leaving the formatting to the listener.
+
+    Only the message is merged before enqueueing, so later changes to the
+    arguments don't show up in the log. Tracebacks are formatted by the
+    listener, which shares the process.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge the message of ``record`` and drop its arguments."""
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        return record
+
+
+class ProcessQueueHandler(EnqueueHandler):
+    """``EnqueueHandler`` running a listener in each process that logs.
+
+    Threads don't survive ``fork``: a listener started when ``LOGGING`` is
+    configured would leave workers forked afterwards, by a preloading server
+    for instance, enqueueing records nothing reads. The queue and listener
+    are made on the first record of each process instead. ``emit`` runs under
+    the handler's lock, which ``logging`` renews in forked children.
+    """
+
+    def __init__(self, *handlers: logging.Handler) -> None:
+        """Create a handler passing records to ``handlers``."""
+        super().__init__(queue.SimpleQueue())
+        self.targets = handlers
+        self.listener: logging.handlers.QueueListener | None = None
+        self.pid: int | None = None
+        atexit.register(self.stop)
+
+    def start(self) -> None:
+        """Start a listener on a new queue, for the current process."""
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(
+            self.queue, *self.targets, respect_handler_level=True
+        )
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def stop(self) -> None:
+        """Write the queued records and stop the listener of this process."""
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+        self.listener = self.pid = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Enqueue ``record``, starting a listener if this process has none."""
+        if self.pid != os.getpid():
+            self.start()
+
+        super().emit(record)
+
+
+def stream_handler(
+    stream: typing.TextIO | None = None, fmt: str = "text"
+) -> logging.Handler:
+    """Handler writing records to ``stream``, stderr by default.
+
+    Args:
+        stream: Where to write.
+        fmt: Key of ``FORMATTERS``.
+    """
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(FORMATTERS[fmt]())
+    return handler
+
+
+def queue_handler(
+    *handlers: logging.Handler,
+) -> tuple[logging.Handler, logging.handlers.QueueListener]:
+    """Handler enqueueing records, and the listener passing them to ``handlers``."""
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        records, *handlers, respect_handler_level=True
+    )
+    return EnqueueHandler(records), listener
+
+
+def build_handler(
+    fmt: str = "text", queue: bool = True, stream: typing.TextIO | None = None
+) -> logging.Handler:
+    """Handler of the ``apps`` logger, built by ``LOGGING``.
 
-    def __init__(self, name: str = "blue_sky_service") -> None:
-        """Initialize the BlueSky Logger."""
-        super().__init__(name)
-        self.setLevel(logging.DEBUG)
+    Args:
+        fmt: Key of ``FORMATTERS``.
+        queue: Hand records to a listener thread rather than write them from
+            the thread logging.
+        stream: Where to write, stderr by default.
+    """
+    handler = stream_handler(stream, fmt)
+    if not queue:
+        return handler
 
-        handler = logging.StreamHandler()
-        handler.setFormatter(LogFormatter())
+    return ProcessQueueHandler(handler)
 
-        self.addHandler(handler)
 
+def get_logger(name: str) -> logging.Logger:
+    """Logger for the module ``name``, usually ``__name__``.
 
-blue_sky_logger = Log()
+    Loggers come from the ``logging`` registry, so a module gets the same
+    instance every time and modules under ``apps`` share the handler and
+    level ``LOGGING`` configures on the ``apps`` logger.
+    """
+    return logging.getLogger(name)
@@ -0,0 +1,47 @@
+"""Run service layer benchmarks."""
+
+import inspect
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from apps.libs.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    """Run one or more benchmarks from ``apps.libs.benchmarks``."""
+
+    help = "Run service layer benchmarks against a local stand-in server."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument("names", nargs="*", help=", ".join(BENCHMARKS))
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=None,
+            help="Iterations of the benchmarks that take a number of iterations.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """Run the selected benchmarks and print their results as JSON."""
+        names = options["names"] or list(BENCHMARKS)
+        if unknown := set(names) - set(BENCHMARKS):
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+        # Keep log I/O out of the measurements.
+        logging.disable(logging.CRITICAL)
+
+        for name in names:
+            benchmark = BENCHMARKS[name]
+            kwargs = {}
+            # Some benchmarks are sized otherwise, by connections or follows.
+            if (
+                options["iterations"]
+                and "iterations" in inspect.signature(benchmark).parameters
+            ):
+                kwargs["iterations"] = options["iterations"]
+
+            result = benchmark(**kwargs)
+            self.stdout.write(json.dumps({name: result}, indent=2))
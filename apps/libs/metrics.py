@@ -0,0 +1,304 @@
+"""Metrics in the Prometheus text format.
+
+Counters and histograms are updated on hot paths, every XRPC call and every
+database query, so updating one takes no lock: each thread writes to its own
+shard, a plain dict only that thread changes. The lock is only taken when a
+thread first touches a metric and when ``/metrics`` merges the shards. Shards
+of finished threads, such as the ones of a ``ThreadPoolExecutor``, are folded
+into one when new shards are created, so they don't pile up.
+
+Queries are counted per request with a context variable holding an
+``itertools.count``, whose ``next`` is atomic, rather than a locked integer.
+"""
+
+import bisect
+import contextvars
+import itertools
+import threading
+import typing
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+
+Labels = tuple[typing.Any, ...]
+
+# Seconds, from a cached query to a slow PDS.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds waited for a pooled connection; usually none at all.
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+# Database queries of one request.
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def escape(value: object) -> str:
+    """Label value quoted for the text format."""
+    text = str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+    return f'"{text}"'
+
+
+def format_labels(names: tuple[str, ...], values: Labels) -> str:
+    """``{name="value",...}``, or nothing without labels."""
+    if not names:
+        return ""
+
+    pairs = zip(names, values, strict=True)
+    return "{" + ",".join(f"{name}={escape(value)}" for name, value in pairs) + "}"
+
+
+class Metric:
+    """Base of metrics written to per-thread shards."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:  # noqa: A002
+        """Create a metric.
+
+        Args:
+            name: Metric name, with its unit and ``_total`` for counters.
+            help: One line describing it.
+            labels: Names of its labels, passed by position when updating.
+        """
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._local = threading.local()
+        self._shards: list[tuple[threading.Thread, dict[Labels, typing.Any]]] = []
+        self._retired: dict[Labels, typing.Any] = {}
+        self._lock = threading.Lock()
+
+    def shard(self) -> dict[Labels, typing.Any]:
+        """Values written by the current thread."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+
+        shard = self._local.shard = {}
+        with self._lock:
+            self._retire()
+            self._shards.append((threading.current_thread(), shard))
+
+        return shard
+
+    def _retire(self) -> None:
+        """Fold the shards of finished threads into ``_retired``."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for labels, value in shard.items():
+                    self._retired[labels] = self.merge(self._retired.get(labels), value)
+
+        self._shards = live
+
+    def merge(self, total: typing.Any, value: typing.Any) -> typing.Any:  # noqa: ANN401
+        """Sum of two values of one label set."""
+        raise NotImplementedError
+
+    def collect(self) -> dict[Labels, typing.Any]:
+        """Values of every label set, summed over the threads."""
+        with self._lock:
+            self._retire()
+            totals = dict(self._retired)
+            for _, shard in self._shards:
+                # Copies are taken in C, without letting the owner run.
+                for labels, value in shard.copy().items():
+                    totals[labels] = self.merge(totals.get(labels), value)
+
+        return totals
+
+    def samples(self, labels: Labels, value: typing.Any) -> typing.Iterator[str]:  # noqa: ANN401
+        """Text format lines of one label set."""
+        raise NotImplementedError
+
+    def render(self) -> typing.Iterator[str]:
+        """Text format lines of the metric."""
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in sorted(self.collect().items(), key=lambda i: str(i[0])):
+            yield from self.samples(labels, value)
+
+
+class Counter(Metric):
+    """Monotonic count, such as calls or bytes."""
+
+    kind = "counter"
+
+    def inc(self, *labels: typing.Any, amount: float = 1) -> None:  # noqa: ANN401
+        """Add ``amount`` to the count of ``labels``."""
+        shard = self.shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def merge(self, total: float | None, value: float) -> float:
+        """Sum of two counts."""
+        return (total or 0) + value
+
+    def samples(self, labels: Labels, value: float) -> typing.Iterator[str]:
+        """Sample line of one count."""
+        yield f"{self.name}{format_labels(self.labels, labels)} {value}"
+
+
+class Histogram(Metric):
+    """Distribution of observed values in fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,  # noqa: A002
+        labels: tuple[str, ...] = (),
+        buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        """Create a histogram. See ``Metric``.
+
+        Args:
+            name: Metric name, with its unit.
+            help: One line describing it.
+            labels: Names of its labels.
+            buckets: Sorted upper bounds; ``+Inf`` is implied.
+        """
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: typing.Any) -> None:  # noqa: ANN401
+        """Record ``value`` for ``labels``.
+
+        Values are kept as counts per bucket, then the sum of all values.
+        """
+        shard = self.shard()
+        counts = shard.get(labels)
+        if counts is None:
+            counts = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def merge(self, total: list[float] | None, value: list[float]) -> list[float]:
+        """Sum of two bucket lists."""
+        if total is None:
+            return list(value)
+
+        return [a + b for a, b in zip(total, value, strict=True)]
+
+    def samples(self, labels: Labels, value: list[float]) -> typing.Iterator[str]:
+        """Cumulative bucket, sum and count lines of one label set."""
+        names = (*self.labels, "le")
+        bounds = [*self.buckets, "+Inf"]
+        cumulative = list(itertools.accumulate(value[:-1]))
+        for bound, count in zip(bounds, cumulative, strict=True):
+            yield f"{self.name}_bucket{format_labels(names, (*labels, bound))} {count}"
+
+        text = format_labels(self.labels, labels)
+        yield f"{self.name}_sum{text} {value[-1]}"
+        yield f"{self.name}_count{text} {cumulative[-1]}"
+
+
+class Registry:
+    """Metrics served together by ``/metrics``."""
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self.metrics: dict[str, Metric] = {}
+
+    def register[M: Metric](self, metric: M) -> M:
+        """Add ``metric`` and return it.
+
+        Raises:
+            ValueError: If a metric of the same name is registered.
+        """
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:  # noqa: A002
+        """Register a counter."""
+        return self.register(Counter(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,  # noqa: A002
+        labels: tuple[str, ...] = (),
+        buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        """Register a histogram."""
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text format."""
+        return "".join(
+            f"{line}\n" for metric in self.metrics.values() for line in metric.render()
+        )
+
+
+REGISTRY = Registry()
+
+XRPC_DURATION = REGISTRY.histogram(
+    "hypersky_xrpc_request_duration_seconds",
+    "XRPC call latency, retries and throttling included.",
+    ("nsid",),
+)
+XRPC_RESPONSES = REGISTRY.counter(
+    "hypersky_xrpc_responses_total",
+    "XRPC responses by status code.",
+    ("nsid", "status"),
+)
+XRPC_ERRORS = REGISTRY.counter(
+    "hypersky_xrpc_errors_total",
+    "XRPC calls failing without a response.",
+    ("nsid", "error"),
+)
+XRPC_SENT_BYTES = REGISTRY.counter(
+    "hypersky_xrpc_request_bytes_total", "Bytes of XRPC request bodies.", ("nsid",)
+)
+XRPC_RECEIVED_BYTES = REGISTRY.counter(
+    "hypersky_xrpc_response_bytes_total", "Bytes of XRPC response bodies.", ("nsid",)
+)
+XRPC_POOL_WAIT = REGISTRY.histogram(
+    "hypersky_xrpc_pool_wait_seconds",
+    "Time XRPC requests waited for a pooled connection.",
+    buckets=WAIT_BUCKETS,
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "hypersky_cache_lookups_total",
+    "In-process cache lookups by cache and result, hit or miss.",
+    ("cache", "result"),
+)
+DB_QUERIES = REGISTRY.histogram(
+    "hypersky_db_queries_per_request",
+    "Database queries run while handling a request, by view.",
+    ("view",),
+    buckets=QUERY_BUCKETS,
+)
+
+# Counter of the queries of the request being handled, if counted.
+queries: contextvars.ContextVar[itertools.count | None] = contextvars.ContextVar(
+    "queries", default=None
+)
+
+
+def count_query(
+    execute: typing.Callable,
+    sql: str,
+    params: typing.Any,  # noqa: ANN401
+    many: bool,
+    context: dict,
+) -> typing.Any:  # noqa: ANN401
+    """Execute wrapper counting queries in ``queries``."""
+    if (counter := queries.get()) is not None:
+        next(counter)
+
+    return execute(sql, params, many, context)
+
+
+def instrument(connection: BaseDatabaseWrapper, **kwargs) -> None:
+    """Count the queries of ``connection`` from now on."""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+connection_created.connect(instrument)
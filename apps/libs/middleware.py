@@ -0,0 +1,194 @@
+"""Middleware."""
+
+import itertools
+import re
+import typing
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpRequest, HttpResponseBase
+
+from apps.libs import metrics, profiling
+from apps.libs.logger import request_id
+from apps.libs.profiling import PROFILER
+
+HEADER = "X-Request-ID"
+
+# Incoming ids are reused when they look like ids, not arbitrary text.
+VALID_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestIdMiddleware:
+    """Give every request a correlation id.
+
+    The id comes from the ``X-Request-ID`` header when a proxy set one, and
+    is generated otherwise. It is stored in ``request.request_id``, added to
+    every record logged while the request is handled, and echoed back in the
+    response's ``X-Request-ID`` header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: typing.Callable) -> None:
+        """Wrap ``get_response``."""
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def get_id(request: HttpRequest) -> str:
+        """Id of ``request``, from its header if valid."""
+        incoming = request.headers.get(HEADER, "")
+        return incoming if VALID_ID.match(incoming) else uuid.uuid4().hex
+
+    def __call__(
+        self, request: HttpRequest
+    ) -> HttpResponseBase | typing.Awaitable[HttpResponseBase]:
+        """Handle ``request`` with its id set."""
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        request.request_id = self.get_id(request)
+        token = request_id.set(request.request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+
+        response[HEADER] = request.request_id
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        """Async ``__call__``."""
+        request.request_id = self.get_id(request)
+        token = request_id.set(request.request_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id.reset(token)
+
+        response[HEADER] = request.request_id
+        return response
+
+
+class QueryCountMiddleware:
+    """Count the database queries of every request, by view.
+
+    Queries are counted by an execute wrapper on every connection, so the
+    ones async views run through ``sync_to_async`` count too; the counter
+    travels with the request's context.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: typing.Callable) -> None:
+        """Wrap ``get_response``."""
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def observe(request: HttpRequest, counter: itertools.count) -> None:
+        """Record the queries ``counter`` counted for ``request``."""
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unresolved"
+        metrics.DB_QUERIES.observe(next(counter), view)
+
+    def __call__(
+        self, request: HttpRequest
+    ) -> HttpResponseBase | typing.Awaitable[HttpResponseBase]:
+        """Handle ``request``, counting its queries."""
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        # Connections opened before the middleware was loaded.
+        for connection in connections.all(initialized_only=True):
+            metrics.instrument(connection)
+
+        counter = itertools.count()
+        token = metrics.queries.set(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.queries.reset(token)
+
+        self.observe(request, counter)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        """Async ``__call__``."""
+        counter = itertools.count()
+        token = metrics.queries.set(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.queries.reset(token)
+
+        self.observe(request, counter)
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile sampled requests into ``PROFILER``.
+
+    Only loaded when ``PROFILING["enabled"]`` is set. Goes after the
+    authentication middleware, to tell staff asking for a profile apart, and
+    after ``RequestIdMiddleware``, whose id the profile keeps.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: typing.Callable) -> None:
+        """Wrap ``get_response``."""
+        if not PROFILER.enabled:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(
+        self, request: HttpRequest
+    ) -> HttpResponseBase | typing.Awaitable[HttpResponseBase]:
+        """Handle ``request``, profiling it if sampled."""
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not (
+            PROFILER.sample() or (PROFILER.requested(request) and request.user.is_staff)
+        ):
+            return self.get_response(request)
+
+        for connection in connections.all(initialized_only=True):
+            profiling.instrument(connection)
+
+        recording = PROFILER.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            PROFILER.stop(recording)
+
+        PROFILER.record(recording, request, response)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        """Async ``__call__``, without a cProfile of the interleaved tasks."""
+        if not (
+            PROFILER.sample()
+            or (PROFILER.requested(request) and (await request.auser()).is_staff)
+        ):
+            return await self.get_response(request)
+
+        recording = PROFILER.start(python=False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            PROFILER.stop(recording)
+
+        PROFILER.record(recording, request, response)
+        return response
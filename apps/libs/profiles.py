@@ -0,0 +1,151 @@
+"""Batched profile hydration.
+
+Pages that show authors collect their DIDs and hydrate them in one go:
+DIDs are deduplicated, looked up in a TTL cache, and the misses are fetched
+with ``app.bsky.actor.getProfiles`` in chunks of 25, all chunks concurrently.
+A 50-post timeline costs at most two XRPC calls, and none once its authors
+are cached. DIDs the AppView does not know are cached as missing too.
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import typing
+
+from django.conf import settings
+
+from apps.libs import ASYNC_BLUESKY, BLUESKY, TTLCache
+from apps.libs import lexicons as bsky
+
+# Most actors ``getProfiles`` accepts per call.
+CHUNK_SIZE = 25
+
+MISSING = object()
+
+Profiles = dict[str, bsky.ProfileViewDetailed]
+
+
+class ProfileHydrator:
+    """Resolve DIDs to profiles through a shared cache."""
+
+    def __init__(
+        self, maxsize: int = 10_000, ttl: float = 300.0, chunk_size: int = CHUNK_SIZE
+    ) -> None:
+        """Create a hydrator.
+
+        Args:
+            maxsize: Profiles kept in process.
+            ttl: Seconds a profile, or a missing DID, stays cached.
+            chunk_size: Actors per ``getProfiles`` call.
+        """
+        self.chunk_size = chunk_size
+        self.cache: TTLCache[str, bsky.ProfileViewDetailed | None] = TTLCache(
+            maxsize=maxsize, ttl=ttl
+        )
+
+    def lookup(self, dids: typing.Iterable[str]) -> tuple[Profiles, list[str]]:
+        """Cached profiles of ``dids`` and the DIDs still to fetch."""
+        profiles: Profiles = {}
+        misses = []
+        for did in dict.fromkeys(dids):
+            profile = self.cache.get(did, MISSING)
+            if profile is MISSING:
+                misses.append(did)
+            elif profile is not None:
+                profiles[did] = profile
+
+        return profiles, misses
+
+    def chunks(self, dids: list[str]) -> list[tuple[str, ...]]:
+        """``dids`` split into ``getProfiles`` sized chunks."""
+        return list(itertools.batched(dids, self.chunk_size))
+
+    def store(
+        self,
+        profiles: Profiles,
+        chunk: tuple[str, ...],
+        response: bsky.GetProfilesResponse,
+    ) -> None:
+        """Cache the profiles of ``response`` and mark the rest of ``chunk`` missing."""
+        for profile in response.profiles:
+            self.cache.set(profile.did, profile)
+            profiles[profile.did] = profile
+
+        for did in chunk:
+            if did not in profiles:
+                self.cache.set(did, None)
+
+    def fetch(
+        self, actors: list[str], token: str, base_url: str | None = None
+    ) -> list[tuple[tuple[str, ...], bsky.GetProfilesResponse]]:
+        """Call ``getProfiles`` for ``actors``, every chunk concurrently.
+
+        ``base_url`` is the PDS of the account ``token`` belongs to.
+        """
+        if not actors:
+            return []
+
+        def call(chunk: tuple[str, ...]) -> bsky.GetProfilesResponse:
+            return BLUESKY.call(
+                bsky.GET_PROFILES,
+                params=bsky.GetProfilesParams(actors=list(chunk)),
+                token=token,
+                base_url=base_url,
+            )
+
+        chunks = self.chunks(actors)
+        # The sync client is thread-safe and pooled; one thread per chunk.
+        with concurrent.futures.ThreadPoolExecutor(len(chunks)) as executor:
+            return list(zip(chunks, executor.map(call, chunks), strict=True))
+
+    def hydrate(
+        self, dids: typing.Iterable[str], token: str, base_url: str | None = None
+    ) -> Profiles:
+        """Profiles of ``dids`` by DID; unknown DIDs are left out."""
+        profiles, misses = self.lookup(dids)
+        for chunk, response in self.fetch(misses, token, base_url):
+            self.store(profiles, chunk, response)
+
+        return profiles
+
+    def resolve_handles(
+        self, handles: typing.Iterable[str], token: str, base_url: str | None = None
+    ) -> dict[str, str]:
+        """DIDs of ``handles``, keyed by lowercased handle.
+
+        Handles that don't resolve are left out. The profiles fetched along
+        the way are cached for later hydration.
+        """
+        handles = list(dict.fromkeys(h.removeprefix("@").lower() for h in handles))
+        dids = {}
+        for _, response in self.fetch(handles, token, base_url):
+            for profile in response.profiles:
+                self.cache.set(profile.did, profile)
+                dids[profile.handle.lower()] = profile.did
+
+        return dids
+
+    async def ahydrate(
+        self, dids: typing.Iterable[str], token: str, base_url: str | None = None
+    ) -> Profiles:
+        """Async ``hydrate``, fetching the chunks on ``ASYNC_BLUESKY``."""
+        profiles, misses = self.lookup(dids)
+        chunks = self.chunks(misses)
+        responses = await asyncio.gather(
+            *(
+                ASYNC_BLUESKY.call(
+                    bsky.GET_PROFILES,
+                    params=bsky.GetProfilesParams(actors=list(chunk)),
+                    token=token,
+                    base_url=base_url,
+                )
+                for chunk in chunks
+            )
+        )
+        for chunk, response in zip(chunks, responses, strict=True):
+            self.store(profiles, chunk, response)
+
+        return profiles
+
+
+PROFILES = ProfileHydrator(**getattr(settings, "PROFILE_CACHE", {}))
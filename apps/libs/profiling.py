@@ -0,0 +1,293 @@
+"""Sampled request profiling.
+
+``ProfilingMiddleware`` profiles a sample of requests, ``PROFILING["sample_rate"]``
+of them, and any request a staff member sends with the ``X-Profile`` header.
+A profiled request records where its time went: database queries, XRPC calls
+through ``BlueSkyService``, template rendering, and the Python left over, plus
+a cProfile of the view. The latest ``size`` profiles are kept in a ring buffer
+listed on ``/admin/profiles/``.
+
+Since Python 3.12 a cProfile sees every thread and only one can run at once,
+so only one request at a time gets one; requests sampled meanwhile, and async
+ones, only get the breakdown. XRPC calls fanned out concurrently add up their
+durations, so their share can exceed the request's.
+
+Off by default: set ``PROFILING["enabled"]``. Templates are timed by the
+``DjangoTemplates`` backend below, which costs a context variable lookup per
+render when nothing is profiled.
+"""
+
+import collections
+import contextvars
+import cProfile
+import dataclasses
+import datetime
+import io
+import pstats
+import random
+import threading
+import time
+import typing
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest, HttpResponseBase
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as backend
+from django.utils import timezone
+
+OPTIONS = getattr(settings, "PROFILING", {})
+
+
+@dataclasses.dataclass
+class Timings:
+    """Seconds a request spent in each layer, and how often it went there."""
+
+    db: float = 0.0
+    xrpc: float = 0.0
+    template: float = 0.0
+    queries: int = 0
+    calls: int = 0
+    rendering: bool = False
+
+
+# Timings of the request being profiled, if it is.
+timings: contextvars.ContextVar[Timings | None] = contextvars.ContextVar(
+    "timings", default=None
+)
+
+
+def add_xrpc(elapsed: float) -> None:
+    """Add an XRPC call to the timings of the request being profiled."""
+    if (current := timings.get()) is not None:
+        current.xrpc += elapsed
+        current.calls += 1
+
+
+def time_query(
+    execute: typing.Callable,
+    sql: str,
+    params: typing.Any,  # noqa: ANN401
+    many: bool,
+    context: dict,
+) -> typing.Any:  # noqa: ANN401
+    """Execute wrapper timing queries of the request being profiled."""
+    if (current := timings.get()) is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current.db += time.perf_counter() - start
+        current.queries += 1
+
+
+def instrument(connection: BaseDatabaseWrapper, **kwargs) -> None:
+    """Time the queries of ``connection`` from now on."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(instrument)
+
+
+class Template(backend.Template):
+    """Template of the ``DjangoTemplates`` backend, timing its renders.
+
+    Queries and XRPC calls made while rendering, by lazy querysets for
+    instance, count as database or XRPC time rather than template time.
+    """
+
+    def render(
+        self,
+        context: dict[str, typing.Any] | None = None,
+        request: HttpRequest | None = None,
+    ) -> str:
+        """Render the template, timing it when the request is profiled."""
+        current = timings.get()
+        if current is None or current.rendering:
+            return super().render(context, request)
+
+        current.rendering = True
+        start = time.perf_counter()
+        elsewhere = current.db + current.xrpc
+        try:
+            return super().render(context, request)
+        finally:
+            elapsed = time.perf_counter() - start
+            current.template += elapsed - (current.db + current.xrpc - elsewhere)
+            current.rendering = False
+
+
+class DjangoTemplates(backend.DjangoTemplates):
+    """``DjangoTemplates`` backend whose templates time their renders."""
+
+    def from_string(self, template_code: str) -> Template:
+        """Template compiled from ``template_code``."""
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name: str) -> Template:
+        """Template called ``template_name``."""
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            backend.reraise(exc, self)
+
+
+@dataclasses.dataclass
+class RequestProfile:
+    """Where the time of one profiled request went."""
+
+    id: str
+    method: str
+    path: str
+    view: str
+    status: int
+    started: datetime.datetime
+    total: float
+    timings: Timings
+    stats: str = ""
+
+    @property
+    def python(self) -> float:
+        """Seconds left once database, XRPC and template time are taken out."""
+        spent = self.timings.db + self.timings.xrpc + self.timings.template
+        return max(0.0, self.total - spent)
+
+    @property
+    def breakdown(self) -> list[tuple[str, float, float]]:
+        """Layer, milliseconds and percent of the total, per layer."""
+        layers = {
+            "DB": self.timings.db,
+            "XRPC": self.timings.xrpc,
+            "Template": self.timings.template,
+            "Python": self.python,
+        }
+        return [
+            (name, seconds * 1000, seconds / self.total * 100 if self.total else 0.0)
+            for name, seconds in layers.items()
+        ]
+
+
+@dataclasses.dataclass
+class Recording:
+    """A request being profiled."""
+
+    timings: Timings
+    token: contextvars.Token
+    started: datetime.datetime
+    start: float
+    profiler: cProfile.Profile | None = None
+    total: float = 0.0
+
+
+class Profiler:
+    """Picks the requests to profile and keeps their latest profiles."""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_rate: float = 0.0,
+        header: str = "X-Profile",
+        size: int = 50,
+        top: int = 30,
+    ) -> None:
+        """Create a profiler.
+
+        Args:
+            enabled: Whether ``ProfilingMiddleware`` is used at all.
+            sample_rate: Share of requests profiled, from 0 to 1.
+            header: Header staff send to profile a request.
+            size: Profiles kept; older ones are dropped.
+            top: Functions listed in the cProfile of a request.
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.header = header
+        self.top = top
+        self.profiles: collections.deque[RequestProfile] = collections.deque(
+            maxlen=size
+        )
+        # Held while a cProfile runs: there can only be one per process.
+        self._lock = threading.Lock()
+
+    def sample(self) -> bool:
+        """Whether to profile a request picked at random."""
+        return random.random() < self.sample_rate  # noqa: S311
+
+    def requested(self, request: HttpRequest) -> bool:
+        """Whether ``request`` asks to be profiled; only honoured for staff."""
+        return self.header in request.headers
+
+    def start(self, python: bool = True) -> Recording:
+        """Start profiling the current request.
+
+        Args:
+            python: Run a cProfile too, if none is running.
+        """
+        recording = Recording(
+            timings=(current := Timings()),
+            token=timings.set(current),
+            started=timezone.now(),
+            start=time.perf_counter(),
+        )
+        if python and self._lock.acquire(blocking=False):
+            recording.profiler = cProfile.Profile()
+            try:
+                recording.profiler.enable()
+            except ValueError:
+                # Another profiler or debugger holds the hook.
+                recording.profiler = None
+                self._lock.release()
+
+        return recording
+
+    def stop(self, recording: Recording) -> None:
+        """Stop profiling the current request."""
+        recording.total = time.perf_counter() - recording.start
+        if recording.profiler is not None:
+            recording.profiler.disable()
+            self._lock.release()
+        timings.reset(recording.token)
+
+    def stats(self, profiler: cProfile.Profile | None) -> str:
+        """Top functions of ``profiler`` by cumulative time."""
+        if profiler is None:
+            return ""
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        return stream.getvalue()
+
+    def record(
+        self, recording: Recording, request: HttpRequest, response: HttpResponseBase
+    ) -> RequestProfile:
+        """Keep the profile of ``request``."""
+        match = request.resolver_match
+        profile = RequestProfile(
+            id=getattr(request, "request_id", "") or f"{id(recording):x}",
+            method=request.method or "",
+            path=request.get_full_path(),
+            view=match.view_name if match is not None else "",
+            status=response.status_code,
+            started=recording.started,
+            total=recording.total,
+            timings=recording.timings,
+            stats=self.stats(recording.profiler),
+        )
+        self.profiles.append(profile)
+        return profile
+
+    def latest(self) -> list[RequestProfile]:
+        """Kept profiles, newest first."""
+        return list(reversed(self.profiles))
+
+    def clear(self) -> None:
+        """Drop the kept profiles."""
+        self.profiles.clear()
+
+
+PROFILER = Profiler(**OPTIONS)
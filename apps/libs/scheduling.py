@@ -0,0 +1,384 @@
+"""Request scheduling for XRPC calls.
+
+``RequestScheduler`` sits between the services and ``httpx``. It keeps a
+token bucket per host and account, filled from the ``RateLimit-*`` headers the
+PDS sends, waits instead of sending requests that would be throttled, and
+retries transient failures with jittered exponential backoff.
+
+No wait is longer than ``max_backoff``: when the server asks for more, such
+as a 429 whose window resets tomorrow, ``RateLimitedError`` is raised with the
+delay instead, for the caller to schedule a retry.
+"""
+
+import asyncio
+import dataclasses
+import email.utils
+import hashlib
+import math
+import random
+import threading
+import time
+import typing
+
+import httpx
+
+from apps.libs.cache import TTLCache
+from apps.libs.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds an account's bucket is kept after it was last used.
+BUCKET_TTL = 3600.0
+
+# Statuses worth retrying. 429 means the request was not processed, so it is
+# retried for procedures too; the rest only for idempotent queries.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# RateLimit-Reset values above this are UNIX timestamps, below it deltas.
+EPOCH_THRESHOLD = 1_000_000_000
+
+
+class RateLimitedError(httpx.HTTPStatusError):
+    """The server asked to wait longer than the scheduler sleeps.
+
+    Its ``response`` is a 429 whose ``Retry-After`` header says how long, the
+    server's own when it sent one, so callers handling 429s need nothing new.
+    """
+
+    def __init__(
+        self, request: httpx.Request, retry_after: float, response: httpx.Response
+    ) -> None:
+        """Create the error.
+
+        Args:
+            request: Request rate limited.
+            retry_after: Seconds to wait before sending it again.
+            response: The server's 429, or one standing in for it when the
+                request was held back before being sent.
+        """
+        super().__init__(
+            f"Rate limited for {retry_after:.0f}s: {request.url}",
+            request=request,
+            response=response,
+        )
+        self.retry_after = retry_after
+
+    @classmethod
+    def before_sending(cls, request: httpx.Request, retry_after: float) -> typing.Self:
+        """Error for ``request``, held back by its exhausted bucket."""
+        response = httpx.Response(
+            httpx.codes.TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+            request=request,
+        )
+        return cls(request, retry_after, response)
+
+
+def parse_retry_after(value: str | None, now: float | None = None) -> float | None:
+    """Seconds to wait according to a ``Retry-After`` header."""
+    if not value:
+        return None
+
+    if value.isdigit():
+        return float(value)
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def parse_reset(value: str | None) -> float | None:
+    """Seconds until a ``RateLimit-Reset`` header's window resets."""
+    try:
+        reset = float(value) if value else None
+    except ValueError:
+        return None
+
+    if reset is not None and reset > EPOCH_THRESHOLD:
+        return max(0.0, reset - time.time())
+
+    return reset
+
+
+def parse_window(policy: str | None) -> float | None:
+    """Window length, in seconds, from a ``RateLimit-Policy`` header."""
+    for part in (policy or "").split(";")[1:]:
+        key, _, value = part.strip().partition("=")
+        if key == "w" and value.isdigit():
+            return float(value)
+
+    return None
+
+
+class TokenBucket:
+    """Token bucket for one host, shaped by the server's rate-limit headers.
+
+    Until the server has told us its limits the bucket never throttles.
+    """
+
+    def __init__(self, clock: typing.Callable[[], float] = time.monotonic) -> None:
+        """Create an unconstrained bucket."""
+        self.clock = clock
+        self.capacity: float | None = None
+        self.tokens = 0.0
+        self.rate = 0.0
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.capacity is None:
+            return
+
+        if self.reset_at and now >= self.reset_at:
+            self.tokens = max(self.tokens, self.capacity)
+            self.reset_at = 0.0
+        else:
+            elapsed = now - self.updated
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it."""
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            wait = max(0.0, self.blocked_until - now)
+
+            if self.capacity is None:
+                return wait
+
+            self.tokens -= 1
+            if self.tokens < 0:
+                if self.rate:
+                    deficit = -self.tokens / self.rate
+                else:
+                    deficit = max(0.0, self.reset_at - now)
+                wait = max(wait, deficit)
+
+            return wait
+
+    def observe(self, headers: httpx.Headers) -> None:
+        """Update the bucket from a response's rate-limit headers."""
+        limit = headers.get("RateLimit-Limit")
+        remaining = headers.get("RateLimit-Remaining")
+        if not (limit and remaining and limit.isdigit() and remaining.isdigit()):
+            return
+
+        reset = parse_reset(headers.get("RateLimit-Reset"))
+        window = parse_window(headers.get("RateLimit-Policy")) or reset
+
+        with self._lock:
+            now = self.clock()
+            self.capacity = float(limit)
+            self.tokens = float(remaining)
+            self.rate = self.capacity / window if window else 0.0
+            self.reset_at = now + reset if reset is not None else 0.0
+            self.updated = now
+
+    def block(self, seconds: float) -> None:
+        """Hold every request using this bucket for ``seconds``."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+
+@dataclasses.dataclass
+class SchedulerStats:
+    """Counters exposed by ``RequestScheduler``."""
+
+    requests: int = 0
+    retries: int = 0
+    throttle_waits: int = 0
+    throttle_wait_seconds: float = 0.0
+
+
+class RequestScheduler:
+    """Rate-limit aware sending with retries for XRPC requests."""
+
+    def __init__(
+        self,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        sleep: typing.Callable[[float], None] = time.sleep,
+        async_sleep: typing.Callable[[float], typing.Awaitable[None]] = asyncio.sleep,
+        clock: typing.Callable[[], float] = time.monotonic,
+        max_buckets: int = 10_000,
+    ) -> None:
+        """Create a scheduler.
+
+        Args:
+            retries: Extra attempts after the first failed one.
+            backoff: Base delay, in seconds, of the exponential backoff.
+            max_backoff: Upper bound of any single wait, whether a backoff,
+                a ``Retry-After`` or a throttle; longer ones raise
+                ``RateLimitedError``.
+            sleep: Blocking sleep, overridable in tests.
+            async_sleep: Async sleep, overridable in tests.
+            clock: Monotonic clock used by the token buckets.
+            max_buckets: Accounts whose buckets are kept, least recently
+                used first out.
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.clock = clock
+        self.stats = SchedulerStats()
+
+        self._buckets: TTLCache[tuple[str, str], TokenBucket] = TTLCache(
+            maxsize=max_buckets, ttl=BUCKET_TTL
+        )
+        self._lock = threading.Lock()
+
+    def bucket(self, request: httpx.Request) -> TokenBucket | None:
+        """Token bucket of the account sending ``request``, if authenticated.
+
+        The PDS limits each account separately, so one account being rate
+        limited doesn't hold back the others on its host. Anonymous requests,
+        such as logins, aren't tracked.
+        """
+        credential = request.headers.get("Authorization")
+        if not credential:
+            return None
+
+        key = (request.url.host, hashlib.sha256(credential.encode()).hexdigest())
+        if (bucket := self._buckets.get(key)) is None:
+            with self._lock:
+                if (bucket := self._buckets.get(key)) is None:
+                    bucket = TokenBucket(self.clock)
+                    self._buckets.set(key, bucket)
+
+        return bucket
+
+    def send(
+        self, client: httpx.Client, request: httpx.Request, idempotent: bool
+    ) -> httpx.Response:
+        """Send ``request``, waiting on rate limits and retrying failures.
+
+        Raises:
+            RateLimitedError: If sending would mean waiting more than
+                ``max_backoff``.
+        """
+        bucket = self.bucket(request)
+        attempt = 0
+        while True:
+            if wait := self._throttle(request, bucket):
+                self.sleep(wait)
+
+            try:
+                response = client.send(request)
+            except httpx.TransportError as exc:
+                if (delay := self._retry_delay(attempt, idempotent, exc=exc)) is None:
+                    raise
+            else:
+                delay = self._retry_delay(attempt, idempotent, bucket, response)
+                if delay is None:
+                    return response
+                response.close()
+
+            attempt += 1
+            self.sleep(delay)
+
+    async def asend(
+        self, client: httpx.AsyncClient, request: httpx.Request, idempotent: bool
+    ) -> httpx.Response:
+        """Async version of ``send``."""
+        bucket = self.bucket(request)
+        attempt = 0
+        while True:
+            if wait := self._throttle(request, bucket):
+                await self.async_sleep(wait)
+
+            try:
+                response = await client.send(request)
+            except httpx.TransportError as exc:
+                if (delay := self._retry_delay(attempt, idempotent, exc=exc)) is None:
+                    raise
+            else:
+                delay = self._retry_delay(attempt, idempotent, bucket, response)
+                if delay is None:
+                    return response
+                await response.aclose()
+
+            attempt += 1
+            await self.async_sleep(delay)
+
+    def _throttle(self, request: httpx.Request, bucket: TokenBucket | None) -> float:
+        self.stats.requests += 1
+        if bucket is None:
+            return 0.0
+
+        if (wait := bucket.reserve()) > self.max_backoff:
+            raise RateLimitedError.before_sending(request, wait)
+
+        if wait:
+            self.stats.throttle_waits += 1
+            self.stats.throttle_wait_seconds += wait
+            logger.debug("Throttling request for %.2fs", wait)
+
+        return wait
+
+    def _rate_limit_wait(
+        self, response: httpx.Response, bucket: TokenBucket | None
+    ) -> float | None:
+        """Seconds a 429 asks to wait, which also block the account's bucket.
+
+        Raises:
+            RateLimitedError: If that is more than ``max_backoff``.
+        """
+        retry_after = parse_retry_after(
+            response.headers.get("Retry-After")
+        ) or parse_reset(response.headers.get("RateLimit-Reset"))
+        if bucket is not None:
+            bucket.block(retry_after or 0.0)
+        if retry_after and retry_after > self.max_backoff:
+            raise RateLimitedError(response.request, retry_after, response)
+
+        return retry_after
+
+    def _retry_delay(
+        self,
+        attempt: int,
+        idempotent: bool,
+        bucket: TokenBucket | None = None,
+        response: httpx.Response | None = None,
+        exc: httpx.TransportError | None = None,
+    ) -> float | None:
+        """Delay before the next attempt, or ``None`` to stop retrying.
+
+        Raises:
+            RateLimitedError: If a 429 asks to wait more than ``max_backoff``.
+        """
+        retry_after = None
+        if response is not None:
+            if bucket is not None:
+                bucket.observe(response.headers)
+            if response.status_code not in RETRY_STATUSES:
+                return None
+
+            if response.status_code == 429:
+                retry_after = self._rate_limit_wait(response, bucket)
+            else:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if not idempotent or (retry_after or 0.0) > self.max_backoff:
+                    return None
+        elif not (idempotent or isinstance(exc, httpx.ConnectError)):
+            # Only a failed connect guarantees a procedure was never sent.
+            return None
+
+        if attempt >= self.retries:
+            return None
+
+        self.stats.retries += 1
+        ceiling = min(self.max_backoff, self.backoff * 2**attempt)
+        delay = max(retry_after or 0.0, random.uniform(0, ceiling))  # noqa: S311
+        logger.info("Retrying in %.2fs after attempt %d", delay, attempt + 1)
+
+        return delay
@@ -4,16 +4,25 @@
 Provides interface to interact with BlueSky/AT Protocol.
 """
 
+import asyncio
 import enum
-import json
+import http
+import logging
+import threading
+import time
 import typing
+import weakref
 
 import httpx
 from django.http import HttpRequest
 from polyfactory.factories.pydantic_factory import ModelFactory
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
-from apps.libs.logger import blue_sky_logger as logger
+from apps.libs import metrics, profiling, xrpc
+from apps.libs.logger import get_logger
+from apps.libs.scheduling import RateLimitedError, RequestScheduler
+
+logger = get_logger(__name__)
 
 
 class BlueSkySessionRequest(BaseModel):
@@ -66,8 +75,10 @@ class ServiceFactory(ModelFactory["Service"]):
 class DidDoc(BaseModel):
     """DID Document."""
 
+    model_config = ConfigDict(populate_by_name=True)
+
     id: str
-    context: list[str]
+    context: list[str] = Field(alias="@context")
     alsoKnownAs: list[str]
     verificationMethod: list[VerificationMethod]
     service: list[Service]
@@ -76,11 +87,27 @@ class DidDoc(BaseModel):
     def from_response(cls, response: dict) -> "DidDoc":
         """Create DidDoc from response.
 
-        This handles the @context key in the response.
+        The @context key is mapped through the field alias.
         """
-        doc = cls.model_construct(**response)
-        doc.context = response["@context"]
-        return cls.model_validate(doc)
+        return cls.model_validate(response)
+
+    @property
+    def handle(self) -> str | None:
+        """Handle claimed by the document, if any."""
+        for alias in self.alsoKnownAs:
+            if alias.startswith("at://"):
+                return alias.removeprefix("at://")
+
+        return None
+
+    @property
+    def pds_endpoint(self) -> str | None:
+        """URL of the account's personal data server, if declared."""
+        for service in self.service:
+            if service.id.endswith("#atproto_pds"):
+                return service.serviceEndpoint.rstrip("/")
+
+        return None
 
 
 class DidDocFactory(ModelFactory["DidDoc"]):
@@ -105,9 +132,12 @@ class BlueSkySessionResponse(BaseModel):
     @classmethod
     def from_response(cls, response: dict) -> "BlueSkySessionResponse":
         """Create BlueSkySessionResponse from response."""
-        resp = cls.model_construct(**response)
-        resp.didDoc = DidDoc.from_response(response["didDoc"])
-        return cls.model_validate(resp)
+        return cls.model_validate(response)
+
+    @classmethod
+    def from_json(cls, content: bytes) -> "BlueSkySessionResponse":
+        """Validate BlueSkySessionResponse straight from the response body."""
+        return cls.model_validate_json(content)
 
 
 class BlueSkySessionResponseFactory(ModelFactory["BlueSkySessionResponse"]):
@@ -116,6 +146,44 @@ class BlueSkySessionResponseFactory(ModelFactory["BlueSkySessionResponse"]):
     __model__ = BlueSkySessionResponse
 
 
+class BlueSkyRefreshResponse(BaseModel):
+    """BlueSky Refresh Session Response."""
+
+    did: str
+    handle: str
+    accessJwt: str
+    refreshJwt: str
+    active: bool = True
+
+    @classmethod
+    def from_response(cls, response: dict) -> "BlueSkyRefreshResponse":
+        """Create BlueSkyRefreshResponse from response."""
+        return cls.model_validate(response)
+
+    @classmethod
+    def from_json(cls, content: bytes) -> "BlueSkyRefreshResponse":
+        """Validate BlueSkyRefreshResponse straight from the response body."""
+        return cls.model_validate_json(content)
+
+
+class BlueSkyRefreshResponseFactory(ModelFactory["BlueSkyRefreshResponse"]):
+    """BlueSky Refresh Session Response Factory."""
+
+    __model__ = BlueSkyRefreshResponse
+
+
+class ResolveHandleParams(BaseModel):
+    """Resolve Handle Parameters."""
+
+    handle: str
+
+
+class ResolveHandleResponse(BaseModel):
+    """Resolve Handle Response."""
+
+    did: str
+
+
 class BlueSkyEndpoints(enum.StrEnum):
     """Endpoints for BlueSky AT Protocol Implementation."""
 
@@ -123,47 +191,448 @@ class BlueSkyEndpoints(enum.StrEnum):
     PROTOCOL = "xrpc"
     CREATE_SESSION = "com.atproto.server.createSession"
     REFRESH_SESSION = "com.atproto.server.refreshSession"
+    RESOLVE_HANDLE = "com.atproto.identity.resolveHandle"
+
+
+CREATE_SESSION = xrpc.procedure(
+    BlueSkyEndpoints.CREATE_SESSION,
+    input=BlueSkySessionRequest,
+    output=BlueSkySessionResponse,
+)
+REFRESH_SESSION = xrpc.procedure(
+    BlueSkyEndpoints.REFRESH_SESSION, output=BlueSkyRefreshResponse
+)
+RESOLVE_HANDLE = xrpc.query(
+    BlueSkyEndpoints.RESOLVE_HANDLE,
+    params=ResolveHandleParams,
+    output=ResolveHandleResponse,
+)
+
+
+class PoolWait:
+    """``trace`` extension timing how long a request waits for a connection.
+
+    httpcore reports the first event of a request once the pool hands it a
+    connection: connecting a new one, or sending headers on a kept-alive one.
+    The clock starts in the client's ``request`` hook, after any throttling,
+    and again on every retry.
+    """
+
+    __slots__ = ("started",)
+
+    def __init__(self) -> None:
+        """Create a stopped clock."""
+        self.started: float | None = None
+
+    def start(self) -> None:
+        """Start waiting."""
+        self.started = time.perf_counter()
+
+    def __call__(self, event: str, info: dict) -> None:
+        """Record the wait on the first event after ``start``."""
+        if self.started is not None:
+            metrics.XRPC_POOL_WAIT.observe(time.perf_counter() - self.started)
+            self.started = None
+
+
+class AsyncPoolWait(PoolWait):
+    """``PoolWait`` for async clients, which await their trace callbacks."""
+
+    __slots__ = ()
+
+    async def __call__(self, event: str, info: dict) -> None:
+        """Record the wait on the first event after ``start``."""
+        super().__call__(event, info)
+
+
+class BaseBlueSkyService:
+    """Configuration and request/response handling shared by the services.
+
+    Subclasses only decide how the underlying ``httpx`` client is created and
+    how the request is sent, so the sync and async services stay in step.
+    """
+
+    pool_wait = PoolWait
+
+    def __init__(
+        self,
+        base_url: str = BlueSkyEndpoints.BASE_URL,
+        *,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 10.0,
+        http2: bool = True,
+        retries: int = 2,
+        backoff: float = 0.5,
+        transport: httpx.BaseTransport | httpx.AsyncBaseTransport | None = None,
+        scheduler: RequestScheduler | None = None,
+        resolver: typing.Callable[[str], str | None] | None = None,
+    ) -> None:
+        """BlueSky Service.
+
+        Args:
+            base_url: Base URL of the PDS or entryway.
+            max_connections: Upper bound on open connections in the pool.
+            max_keepalive_connections: Idle connections kept around for reuse.
+            keepalive_expiry: Seconds an idle connection is kept alive.
+            timeout: Default timeout, in seconds, for each request.
+            http2: Negotiate HTTP/2 with servers that support it.
+            retries: Extra attempts for throttled or transiently failing calls.
+            backoff: Base delay, in seconds, between retries.
+            transport: Optional transport, mostly useful in tests.
+            scheduler: Scheduler to send requests through, overrides
+                ``retries`` and ``backoff``.
+            resolver: Finds the PDS of a login identifier, so logins the
+                entryway turns down are retried on the user's own PDS.
+        """
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout)
+        self.http2 = http2
+        self.transport = transport
+        self.scheduler = scheduler or RequestScheduler(retries=retries, backoff=backoff)
+        self.resolver = resolver
+
+    def client_options(self) -> dict[str, typing.Any]:
+        """Keyword arguments used to build the pooled client."""
+        return {
+            "headers": {"Content-Type": "application/json"},
+            "limits": self.limits,
+            "timeout": self.timeout,
+            "http2": self.http2,
+            "transport": self.transport,
+        }
+
+    @staticmethod
+    def bearer(token: str) -> dict[str, str]:
+        """Authorization header for ``token``."""
+        return {"Authorization": f"Bearer {token}"}
+
+    def build_request(
+        self,
+        client: httpx.Client | httpx.AsyncClient,
+        method: xrpc.XRPCMethod,
+        params: BaseModel | dict | None = None,
+        body: BaseModel | dict | None = None,
+        token: str | None = None,
+        base_url: str | None = None,
+    ) -> httpx.Request:
+        """Build the HTTP request for an XRPC call."""
+        return client.build_request(
+            method.kind.http_method,
+            xrpc.endpoint(base_url or self.base_url, method.nsid),
+            params=method.encode_params(params),
+            content=method.encode_input(body),
+            headers=self.bearer(token) if token else None,
+            extensions={"trace": self.pool_wait()},
+        )
 
-    URL = "{base_url}/{protocol}/{action}"
-
+    @staticmethod
+    def start_pool_wait(request: httpx.Request) -> None:
+        """Start the clock of the request's ``PoolWait``, as it is sent."""
+        if isinstance(trace := request.extensions.get("trace"), PoolWait):
+            trace.start()
 
-class BlueSkyService:
-    """API Handler Methods for BlueSky."""
+    def own_pds(self, identifier: str, exc: httpx.HTTPStatusError) -> str | None:
+        """PDS to retry a login rejected by ``base_url`` with ``exc`` on, if any.
 
-    def __init__(self, base_url: str = BlueSkyEndpoints.BASE_URL) -> None:
-        """BlueSky Service."""
-        self.base_url = base_url
+        The entryway resolves handles itself, so ours are only resolved when
+        it doesn't know the account, as for self-hosted PDSes.
+        """
+        if exc.response.status_code != http.HTTPStatus.UNAUTHORIZED:
+            return None
+        if self.resolver is None or not (pds := self.resolver(identifier)):
+            return None
 
-    def get_user_jwt(
-        self, handle: str, password: str
-    ) -> BlueSkySessionResponse:  # pragma: no cover
-        """Get JWT for user."""
-        url = BlueSkyEndpoints.URL.format(
-            base_url=self.base_url,
-            protocol=BlueSkyEndpoints.PROTOCOL,
-            action=BlueSkyEndpoints.CREATE_SESSION,
-        )
-        headers = {"Content-Type": "application/json"}
-        logger.debug(f"Constructed URL: {url}")
-
-        resp = httpx.post(
-            url,
-            headers=headers,
-            json=BlueSkySessionRequest(
-                identifier=handle,
-                password=password,
-            ).model_dump(),
-        )
+        return pds if pds.rstrip("/") != self.base_url.rstrip("/") else None
 
+    @staticmethod
+    def raise_for_status(resp: httpx.Response) -> None:
+        """Log and raise for failed requests."""
         if resp.is_error:
             logger.error(
-                f"Request to {url} failed: {resp.text} with status {resp.status_code}"
+                "Request to %s failed: %s with status %s",
+                resp.url,
+                resp.text,
+                resp.status_code,
             )
             resp.raise_for_status()
 
-        data = resp.json()
-        response = BlueSkySessionResponse.from_response(data)
+    @staticmethod
+    def log_call(method: xrpc.XRPCMethod, resp: httpx.Response, elapsed: float) -> None:
+        """Log how long an XRPC call took, with its details as fields."""
+        if not logger.isEnabledFor(logging.INFO):
+            return
+
+        duration_ms = round(elapsed * 1000, 2)
+        logger.info(
+            "%s %s in %.2fms",
+            method.nsid,
+            resp.status_code,
+            duration_ms,
+            extra={
+                "xrpc": {
+                    "nsid": method.nsid,
+                    "host": resp.request.url.host,
+                    "status": resp.status_code,
+                    "duration_ms": duration_ms,
+                    "response_bytes": len(resp.content),
+                }
+            },
+        )
 
-        logger.debug(f"Response: {json.dumps(data, indent=2)}")
+    @classmethod
+    def record_call(
+        cls,
+        method: xrpc.XRPCMethod,
+        request: httpx.Request,
+        resp: httpx.Response,
+        elapsed: float,
+    ) -> None:
+        """Add an XRPC call to the metrics and log it."""
+        metrics.XRPC_DURATION.observe(elapsed, method.nsid)
+        metrics.XRPC_RESPONSES.inc(method.nsid, resp.status_code)
+        metrics.XRPC_SENT_BYTES.inc(method.nsid, amount=len(request.content))
+        metrics.XRPC_RECEIVED_BYTES.inc(method.nsid, amount=len(resp.content))
+        profiling.add_xrpc(elapsed)
+        cls.log_call(method, resp, elapsed)
+
+    @staticmethod
+    def record_error(
+        method: xrpc.XRPCMethod,
+        exc: httpx.TransportError | RateLimitedError,
+        elapsed: float,
+    ) -> None:
+        """Count an XRPC call that failed without a usable response."""
+        metrics.XRPC_ERRORS.inc(method.nsid, type(exc).__name__)
+        profiling.add_xrpc(elapsed)
 
-        return response
+    @classmethod
+    def parse[O](cls, method: xrpc.XRPCMethod[O], resp: httpx.Response) -> O:
+        """Raise for failed requests, otherwise validate the output model."""
+        cls.raise_for_status(resp)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response from %s: %s", method.nsid, resp.text)
+
+        return method.decode_output(resp.content)
+
+
+class BlueSkyService(BaseBlueSkyService):
+    """API Handler Methods for BlueSky.
+
+    Owns long-lived, pooled ``httpx.Client`` instances so repeated calls to a
+    PDS reuse keep-alive connections instead of paying for DNS, TCP and TLS on
+    every request. There is one client per server called, created lazily, so
+    a slow PDS can only tie up its own connections. Clients are safe to share
+    between threads.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """BlueSky Service. See ``BaseBlueSkyService`` for arguments."""
+        super().__init__(*args, **kwargs)
+
+        self._clients: dict[str, httpx.Client] = {}
+        self._lock = threading.Lock()
+
+    def client_options(self) -> dict[str, typing.Any]:
+        """Keyword arguments used to build the pooled client."""
+        return {
+            **super().client_options(),
+            "event_hooks": {"request": [self.start_pool_wait]},
+        }
+
+    def client_for(self, base_url: str | None = None) -> httpx.Client:
+        """Pooled client of ``base_url``, created on first use."""
+        base_url = base_url or self.base_url
+        client = self._clients.get(base_url)
+        if client is None or client.is_closed:
+            with self._lock:
+                client = self._clients.get(base_url)
+                if client is None or client.is_closed:
+                    client = self._clients[base_url] = httpx.Client(
+                        **self.client_options()
+                    )
+
+        return client
+
+    @property
+    def client(self) -> httpx.Client:
+        """Shared pooled client of ``base_url``."""
+        return self.client_for()
+
+    def close(self) -> None:
+        """Close the pooled clients and release their connections."""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    def __enter__(self) -> typing.Self:
+        """Enter context manager."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Close the client when leaving the context manager."""
+        self.close()
+
+    def call[O](
+        self,
+        nsid: str | xrpc.XRPCMethod[O],
+        params: BaseModel | dict | None = None,
+        body: BaseModel | dict | None = None,
+        *,
+        token: str | None = None,
+        base_url: str | None = None,
+    ) -> O:
+        """Call a registered XRPC method and return its output model.
+
+        Args:
+            nsid: NSID, or the ``XRPCMethod`` returned when registering it.
+            params: Query string parameters.
+            body: Procedure input.
+            token: Bearer token to authenticate with.
+            base_url: Server to call instead of ``self.base_url``, such as
+                the account's own PDS.
+        """
+        method = xrpc.get_method(nsid)
+        client = self.client_for(base_url)
+        request = self.build_request(client, method, params, body, token, base_url)
+
+        start = time.perf_counter()
+        try:
+            response = self.scheduler.send(
+                client, request, idempotent=method.kind is xrpc.Kind.QUERY
+            )
+        except (httpx.TransportError, RateLimitedError) as exc:
+            self.record_error(method, exc, time.perf_counter() - start)
+            raise
+        self.record_call(method, request, response, time.perf_counter() - start)
+
+        return self.parse(method, response)
+
+    def get_user_jwt(self, handle: str, password: str) -> BlueSkySessionResponse:
+        """Get JWT for user, from their own PDS if the entryway doesn't know them."""
+        body = BlueSkySessionRequest(identifier=handle, password=password)
+        try:
+            return self.call(CREATE_SESSION, body=body)
+        except httpx.HTTPStatusError as exc:
+            if (pds := self.own_pds(handle, exc)) is None:
+                raise
+
+        return self.call(CREATE_SESSION, body=body, base_url=pds)
+
+    def refresh_session(
+        self, refresh_jwt: str, base_url: str | None = None
+    ) -> BlueSkyRefreshResponse:
+        """Exchange a refresh token for a new access/refresh token pair."""
+        return self.call(REFRESH_SESSION, token=refresh_jwt, base_url=base_url)
+
+
+class AsyncBlueSkyService(BaseBlueSkyService):
+    """Async API Handler Methods for BlueSky.
+
+    Mirrors ``BlueSkyService`` on top of ``httpx.AsyncClient`` so async views
+    can await XRPC calls, or fan several out with ``asyncio.gather``, without
+    blocking the event loop. An ``AsyncClient`` is bound to the loop that
+    created it, so the pooled clients, one per server called, are kept per
+    running event loop.
+    """
+
+    pool_wait = AsyncPoolWait
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Async BlueSky Service. See ``BaseBlueSkyService`` for arguments."""
+        super().__init__(*args, **kwargs)
+
+        self._clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]
+        ] = weakref.WeakKeyDictionary()
+
+    def client_options(self) -> dict[str, typing.Any]:
+        """Keyword arguments used to build the pooled client."""
+        return {
+            **super().client_options(),
+            "event_hooks": {"request": [self.astart_pool_wait]},
+        }
+
+    @classmethod
+    async def astart_pool_wait(cls, request: httpx.Request) -> None:
+        """Async version of ``start_pool_wait``."""
+        cls.start_pool_wait(request)
+
+    def client_for(self, base_url: str | None = None) -> httpx.AsyncClient:
+        """Pooled client of ``base_url`` for the running event loop."""
+        base_url = base_url or self.base_url
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get(base_url)
+        if client is None or client.is_closed:
+            client = clients[base_url] = httpx.AsyncClient(**self.client_options())
+
+        return client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled client of ``base_url`` for the running event loop."""
+        return self.client_for()
+
+    async def aclose(self) -> None:
+        """Close the pooled clients of the running event loop."""
+        for client in self._clients.pop(asyncio.get_running_loop(), {}).values():
+            await client.aclose()
+
+    async def __aenter__(self) -> typing.Self:
+        """Enter async context manager."""
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Close the client when leaving the async context manager."""
+        await self.aclose()
+
+    async def call[O](
+        self,
+        nsid: str | xrpc.XRPCMethod[O],
+        params: BaseModel | dict | None = None,
+        body: BaseModel | dict | None = None,
+        *,
+        token: str | None = None,
+        base_url: str | None = None,
+    ) -> O:
+        """Call a registered XRPC method. See ``BlueSkyService.call``."""
+        method = xrpc.get_method(nsid)
+        client = self.client_for(base_url)
+        request = self.build_request(client, method, params, body, token, base_url)
+
+        start = time.perf_counter()
+        try:
+            response = await self.scheduler.asend(
+                client, request, idempotent=method.kind is xrpc.Kind.QUERY
+            )
+        except (httpx.TransportError, RateLimitedError) as exc:
+            self.record_error(method, exc, time.perf_counter() - start)
+            raise
+        self.record_call(method, request, response, time.perf_counter() - start)
+
+        return self.parse(method, response)
+
+    async def get_user_jwt(self, handle: str, password: str) -> BlueSkySessionResponse:
+        """Get JWT for user, from their own PDS if the entryway doesn't know them."""
+        body = BlueSkySessionRequest(identifier=handle, password=password)
+        try:
+            return await self.call(CREATE_SESSION, body=body)
+        except httpx.HTTPStatusError as exc:
+            if (pds := await asyncio.to_thread(self.own_pds, handle, exc)) is None:
+                raise
+
+        return await self.call(CREATE_SESSION, body=body, base_url=pds)
+
+    async def refresh_session(
+        self, refresh_jwt: str, base_url: str | None = None
+    ) -> BlueSkyRefreshResponse:
+        """Exchange a refresh token for a new access/refresh token pair."""
+        return await self.call(REFRESH_SESSION, token=refresh_jwt, base_url=base_url)
@@ -0,0 +1,263 @@
+"""Local stand-in servers.
+
+``StandInXRPCServer`` is a tiny threaded HTTP server that answers XRPC
+requests with canned responses, and ``StandInJetstreamServer`` replays
+recorded Jetstream events over a WebSocket. Tests and benchmarks point the
+services at them so they exercise real sockets without talking to
+bsky.social.
+"""
+
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import http
+import http.server
+import json
+import pathlib
+import threading
+import time
+import typing
+import urllib.parse
+
+from websockets.asyncio.server import Server, ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+
+from apps.libs.services import BlueSkyEndpoints, BlueSkySessionResponseFactory
+
+
+@dataclasses.dataclass
+class Route:
+    """Canned response for a single NSID."""
+
+    body: bytes
+    status: int = 200
+    headers: dict[str, str] = dataclasses.field(default_factory=dict)
+
+
+def session_payload() -> dict:
+    """Build a createSession response body as the PDS would serialize it."""
+    return BlueSkySessionResponseFactory.build().model_dump(by_alias=True)
+
+
+class StandInXRPCServer:
+    """Threaded stand-in for a PDS, listening on localhost."""
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0
+    ) -> None:
+        """Create the server; call ``start`` to begin serving.
+
+        Args:
+            host: Interface to bind.
+            port: Port to bind, ``0`` picks a free one.
+            latency: Seconds to wait before answering, to mimic a remote PDS.
+        """
+        self.latency = latency
+        self.routes: dict[str, Route] = {}
+        self.hits: dict[str, int] = {}
+        self.faults: dict[str, collections.deque[Route]] = {}
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(
+            (host, port), self._handler_class()
+        )
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+        self.route(BlueSkyEndpoints.CREATE_SESSION, session_payload())
+
+    @property
+    def base_url(self) -> str:
+        """URL to hand to ``BlueSkyService(base_url=...)``."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def route(
+        self,
+        nsid: str,
+        body: dict | bytes,
+        status: int = 200,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        """Register the response returned for ``nsid``."""
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+
+        self.routes[nsid] = Route(body=body, status=status, headers=headers or {})
+
+    def fail(
+        self,
+        nsid: str,
+        status: int,
+        headers: dict[str, str] | None = None,
+        times: int = 1,
+    ) -> None:
+        """Answer the next ``times`` calls to ``nsid`` with ``status``.
+
+        Once the faults are used up the regular route answers again.
+        """
+        body = json.dumps({"error": http.HTTPStatus(status).phrase}).encode()
+        fault = Route(body=body, status=status, headers=headers or {})
+        with self._lock:
+            self.faults.setdefault(nsid, collections.deque()).extend([fault] * times)
+
+    def respond(self, nsid: str) -> Route:
+        """Resolve the route for ``nsid`` and record the hit."""
+        with self._lock:
+            self.hits[nsid] = self.hits.get(nsid, 0) + 1
+            if faults := self.faults.get(nsid):
+                return faults.popleft()
+
+        return self.routes.get(
+            nsid, Route(body=b'{"error": "MethodNotImplemented"}', status=501)
+        )
+
+    def start(self) -> typing.Self:
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> typing.Self:
+        """Start the server."""
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        """Stop the server."""
+        self.stop()
+
+    def _handler_class(self) -> type[http.server.BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def handle_xrpc(self) -> None:
+                if length := int(self.headers.get("Content-Length", 0)):
+                    self.rfile.read(length)
+
+                nsid = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+                route = server.respond(nsid)
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                self.send_response(route.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(route.body)))
+                for key, value in route.headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(route.body)
+
+            do_GET = handle_xrpc  # noqa: N815
+            do_POST = handle_xrpc  # noqa: N815
+
+            def log_message(self, *args) -> None:
+                return None
+
+        return Handler
+
+
+class StandInJetstreamServer:
+    """WebSocket stand-in for Jetstream replaying recorded events.
+
+    Every connection gets the events from its ``cursor`` query parameter on,
+    then a close frame, like a Jetstream instance that ran out of history.
+    """
+
+    def __init__(
+        self, events: typing.Iterable[dict | str], host: str = "127.0.0.1"
+    ) -> None:
+        """Create the server; call ``start`` to begin serving.
+
+        Args:
+            events: Events, as dicts or JSON lines, in ``time_us`` order.
+            host: Interface to bind.
+        """
+        self.events = [
+            event if isinstance(event, str) else json.dumps(event) for event in events
+        ]
+        self.host = host
+        self.port = 0
+        self.requests: list[str] = []
+        self._loop = asyncio.new_event_loop()
+        self._server: Server | None = None
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def replay(cls, path: str | pathlib.Path, host: str = "127.0.0.1") -> typing.Self:
+        """Server replaying a recorded file of JSON lines."""
+        with open(path) as lines:
+            return cls([line.strip() for line in lines if line.strip()], host)
+
+    @property
+    def url(self) -> str:
+        """Subscription URL to hand to the consumer."""
+        return f"ws://{self.host}:{self.port}/subscribe"
+
+    def start(self) -> typing.Self:
+        """Serve connections on a background thread."""
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        if self._thread is not None:
+            self._thread.join()
+        self._loop.close()
+
+    def _serve(self, ready: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(self._listen())
+        self.port = self._server.sockets[0].getsockname()[1]
+        ready.set()
+        self._loop.run_forever()
+
+    def __enter__(self) -> typing.Self:
+        """Start the server."""
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        """Stop the server."""
+        self.stop()
+
+    async def _listen(self) -> Server:
+        return await serve(self._handle, self.host, 0)
+
+    async def _shutdown(self) -> None:
+        if self._server is not None:
+            self._server.close()
+
+        current = asyncio.current_task()
+        for task in asyncio.all_tasks():
+            if task is not current:
+                task.cancel()
+
+        self._loop.call_soon(self._loop.stop)
+
+    async def _handle(self, connection: ServerConnection) -> None:
+        path = connection.request.path
+        self.requests.append(path)
+
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)
+        cursor = int(query["cursor"][0]) if "cursor" in query else None
+
+        with contextlib.suppress(ConnectionClosed):
+            for event in self.events:
+                if cursor is not None and json.loads(event)["time_us"] < cursor:
+                    continue
+                await connection.send(event)
@@ -1,14 +1,79 @@
+import asyncio
+import inspect
+import io
+import json
 import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
 from unittest import mock
 
+import dns.resolver
 import httpx
-from django.test import RequestFactory, TestCase
-from django.urls import reverse_lazy
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse_lazy
 from faker import Faker
+from pydantic import ValidationError
 
 from apps.accounts.models import Account
-from apps.libs.authentication import BlueSkyJWTBackend
-from apps.libs.services import BlueSkySessionResponseFactory
+from apps.libs import ASYNC_BLUESKY, BLUESKY, TOKEN_CACHE, tokens, xrpc
+from apps.libs import lexicons as bsky
+from apps.libs.authentication import (
+    VALIDATOR,
+    BlueSkyJWTBackend,
+    LocalJWTValidator,
+    get_account,
+)
+from apps.libs.benchmarks import BENCHMARKS, legacy_parse_session
+from apps.libs.cache import TokenCache, TTLCache
+from apps.libs.hub import HEARTBEAT, Hub, event_stream, sse
+from apps.libs.identity import IdentityResolver, ResolutionError
+from apps.libs.logger import (
+    JSONFormatter,
+    LogFormatter,
+    RequestIdFilter,
+    build_handler,
+    get_logger,
+    queue_handler,
+    request_id,
+    stream_handler,
+)
+from apps.libs.metrics import (
+    DB_QUERIES,
+    XRPC_POOL_WAIT,
+    XRPC_RECEIVED_BYTES,
+    XRPC_RESPONSES,
+    Counter,
+    Histogram,
+)
+from apps.libs.middleware import (
+    ProfilingMiddleware,
+    QueryCountMiddleware,
+    RequestIdMiddleware,
+)
+from apps.libs.profiles import ProfileHydrator
+from apps.libs.profiling import PROFILER, Profiler
+from apps.libs.scheduling import RateLimitedError, RequestScheduler, parse_retry_after
+from apps.libs.services import (
+    RESOLVE_HANDLE,
+    AsyncBlueSkyService,
+    BlueSkyEndpoints,
+    BlueSkyService,
+    BlueSkySessionResponse,
+    BlueSkySessionResponseFactory,
+    DidDocFactory,
+    ServiceFactory,
+)
+from apps.libs.standin import StandInXRPCServer, session_payload
+from apps.libs.views import OPTIONS as METRICS_OPTIONS
 
 fake = Faker()
 logging.disable(logging.CRITICAL)
@@ -16,6 +81,7 @@ logging.disable(logging.CRITICAL)
 
 class JWTBackendTestCase(TestCase):
     def setUp(self):
+        TOKEN_CACHE.clear()
         self.backend = BlueSkyJWTBackend()
         self.access_token = fake.sha256(raw_output=False)
         self.refresh_token = fake.sha256(raw_output=False)
@@ -39,6 +105,71 @@ class JWTBackendTestCase(TestCase):
 
         self.assertEqual(result, self.user)
 
+    def test_authenticate_cached(self):
+        request = self.request_factory.get(
+            reverse_lazy("home"),
+            headers={"Authorization": f"Bearer {self.user.access_token}"},
+        )
+        self.backend.authenticate(request)
+
+        with self.assertNumQueries(0):
+            result = self.backend.authenticate(request)
+
+        self.assertEqual(result, self.user)
+
+    def test_authenticate_after_token_update(self):
+        old_token = self.user.access_token
+        request = self.request_factory.get(
+            reverse_lazy("home"), headers={"Authorization": f"Bearer {old_token}"}
+        )
+        self.backend.authenticate(request)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.update_tokens(fake.sha256(), fake.sha256())
+
+        self.assertIsNone(self.backend.authenticate(request))
+
+    def test_token_cache_invalidated_on_commit(self):
+        TOKEN_CACHE.set(self.user.access_token, self.user)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.update_tokens(fake.sha256(), fake.sha256())
+            self.assertEqual(TOKEN_CACHE.get(self.access_token), self.user)
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertIsNone(TOKEN_CACHE.get(self.access_token))
+
+    def test_get_account_anonymous(self):
+        request = self.request_factory.get(reverse_lazy("home"))
+        request.user = AnonymousUser()
+
+        with (
+            mock.patch("apps.libs.authentication.logger") as logger,
+            mock.patch.object(BLUESKY, "get_user_jwt") as get_user_jwt,
+        ):
+            self.assertIsNone(get_account(request))
+
+        get_user_jwt.assert_not_called()
+        logger.error.assert_not_called()
+
+    def test_get_account_bearer_token(self):
+        request = self.request_factory.get(
+            reverse_lazy("home"),
+            headers={"Authorization": f"Bearer {self.user.access_token}"},
+        )
+        request.user = AnonymousUser()
+
+        self.assertEqual(get_account(request), self.user)
+
+    def test_authenticate_without_credentials_logs_no_error(self):
+        request = self.request_factory.get(reverse_lazy("home"))
+
+        with mock.patch("apps.libs.authentication.logger") as logger:
+            self.assertIsNone(self.backend.authenticate(request))
+
+        logger.error.assert_not_called()
+
     def test_authenticate_no_request(self):
         backend = BlueSkyJWTBackend()
         result = backend.authenticate()
@@ -68,6 +199,19 @@ class JWTBackendTestCase(TestCase):
         else:
             self.fail("User not authenticated")
 
+    @mock.patch("apps.libs.services.BlueSkyService.get_user_jwt")
+    def test_login_query_count(self, mock_get_user_jwt: mock.MagicMock):
+        mock_get_user_jwt.return_value = BlueSkySessionResponseFactory.build(
+            email=self.user.email
+        )
+        request = self.request_factory.post(
+            reverse_lazy("home"),
+            data={"identifier": self.user.email, "password": fake.password()},
+        )
+
+        with self.assertNumQueries(1 if connection.vendor == "postgresql" else 2):
+            self.backend.authenticate(request)
+
     @mock.patch("apps.libs.services.BlueSkyService.get_user_jwt")
     def test_create_account(self, mock_get_user_jwt: mock.MagicMock):
         response = BlueSkySessionResponseFactory.build(email=fake.email())
@@ -87,7 +231,7 @@ class JWTBackendTestCase(TestCase):
         else:
             self.fail("User not authenticated")
 
-    @mock.patch("httpx.post")
+    @mock.patch("httpx.Client.send")
     def test_authentication_error(self, mock_post: mock.MagicMock):
         mock_post.return_value = httpx.Response(
             status_code=fake.random_int(400, 599),
@@ -101,3 +245,1280 @@ class JWTBackendTestCase(TestCase):
 
         result = self.backend.authenticate(request)
         self.assertIsNone(result)
+
+
+class BlueSkyServiceTestCase(TestCase):
+    def setUp(self):
+        self.payload = session_payload()
+        self.service = BlueSkyService(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, json=self.payload)
+            )
+        )
+        self.addCleanup(self.service.close)
+
+    def test_client_is_reused(self):
+        client = self.service.client
+
+        self.service.get_user_jwt(fake.email(), fake.password())
+        self.service.get_user_jwt(fake.email(), fake.password())
+
+        self.assertIs(self.service.client, client)
+
+    def test_one_pool_per_endpoint(self):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request.url.host)
+            return httpx.Response(200, json=self.payload)
+
+        service = BlueSkyService(transport=httpx.MockTransport(handler))
+        with mock.patch.object(
+            httpx.Client, "send", autospec=True, side_effect=httpx.Client.send
+        ) as send:
+            service.refresh_session("refresh-token", base_url="https://pds.example.com")
+            service.refresh_session("refresh-token")
+
+        self.assertEqual(requests, ["pds.example.com", "bsky.social"])
+        self.assertEqual(
+            [call.args[0] for call in send.call_args_list],
+            [service.client_for("https://pds.example.com"), service.client],
+        )
+        self.assertEqual(
+            set(service._clients), {"https://pds.example.com", service.base_url}
+        )
+        self.assertIsNot(service.client_for("https://pds.example.com"), service.client)
+        self.assertIs(service.client_for(""), service.client)
+
+        clients = [service.client, service.client_for("https://pds.example.com")]
+        service.close()
+        self.assertTrue(all(client.is_closed for client in clients))
+
+    def test_close(self):
+        client = self.service.client
+        self.service.close()
+
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(self.service.client, client)
+
+    def test_context_manager(self):
+        with self.service as service:
+            client = service.client
+
+        self.assertTrue(client.is_closed)
+
+    def test_get_user_jwt(self):
+        response = self.service.get_user_jwt(fake.email(), fake.password())
+
+        self.assertEqual(response.handle, self.payload["handle"])
+        self.assertEqual(response.accessJwt, self.payload["accessJwt"])
+
+    def test_refresh_session(self):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json=self.payload)
+
+        service = BlueSkyService(transport=httpx.MockTransport(handler))
+        response = service.refresh_session("refresh-token")
+        service.close()
+
+        self.assertEqual(requests[0].headers["Authorization"], "Bearer refresh-token")
+        self.assertTrue(requests[0].url.path.endswith("refreshSession"))
+        self.assertEqual(response.accessJwt, self.payload["accessJwt"])
+        self.assertEqual(response.refreshJwt, self.payload["refreshJwt"])
+
+    def test_keep_alive_against_standin_server(self):
+        with StandInXRPCServer() as server:
+            service = BlueSkyService(base_url=server.base_url)
+            self.addCleanup(service.close)
+
+            for _ in range(3):
+                service.get_user_jwt(fake.email(), fake.password())
+
+            pool = service.client._transport._pool
+
+            self.assertEqual(len(pool.connections), 1)
+
+
+class AsyncBlueSkyServiceTestCase(TestCase):
+    def setUp(self):
+        self.payload = session_payload()
+        self.service = AsyncBlueSkyService(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, json=self.payload)
+            )
+        )
+
+    async def test_get_user_jwt(self):
+        async with self.service as service:
+            response = await service.get_user_jwt(fake.email(), fake.password())
+
+        self.assertEqual(response.handle, self.payload["handle"])
+        self.assertEqual(response.accessJwt, self.payload["accessJwt"])
+
+    async def test_gather(self):
+        async with self.service as service:
+            responses = await asyncio.gather(
+                *(service.get_user_jwt(fake.email(), fake.password()) for _ in range(5))
+            )
+
+        self.assertEqual(len(responses), 5)
+        self.assertEqual({r.did for r in responses}, {self.payload["did"]})
+
+    async def test_client_is_reused_and_closed(self):
+        client = self.service.client
+        self.assertIs(self.service.client, client)
+
+        await self.service.aclose()
+
+        self.assertTrue(client.is_closed)
+
+    async def test_one_pool_per_endpoint(self):
+        with mock.patch.object(
+            httpx.AsyncClient, "send", autospec=True, side_effect=httpx.AsyncClient.send
+        ) as send:
+            await self.service.refresh_session(
+                "refresh-token", base_url="https://pds.example.com"
+            )
+            await self.service.refresh_session("refresh-token")
+
+        self.assertEqual(
+            [call.args[0] for call in send.call_args_list],
+            [self.service.client_for("https://pds.example.com"), self.service.client],
+        )
+        await self.service.aclose()
+
+    async def test_error(self):
+        service = AsyncBlueSkyService(
+            transport=httpx.MockTransport(lambda request: httpx.Response(401))
+        )
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            await service.get_user_jwt(fake.email(), fake.password())
+
+        await service.aclose()
+
+
+class TokensTestCase(TestCase):
+    def test_decode_claims(self):
+        token = tokens.encode_claims({"sub": "did:plc:alice", "exp": 1})
+
+        self.assertEqual(
+            tokens.decode_claims(token), {"sub": "did:plc:alice", "exp": 1}
+        )
+        self.assertIsNone(tokens.decode_claims(fake.sha256()))
+        self.assertIsNone(tokens.decode_claims("a.!!!.c"))
+
+    def test_expires_soon(self):
+        now = time.time()
+
+        self.assertTrue(tokens.expires_soon(tokens.encode_claims({"exp": now - 1})))
+        self.assertTrue(tokens.expires_soon(tokens.encode_claims({"exp": now + 30})))
+        self.assertFalse(tokens.expires_soon(tokens.encode_claims({"exp": now + 600})))
+        self.assertFalse(tokens.expires_soon(fake.sha256()))
+
+    def test_single_flight(self):
+        group = tokens.SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def work() -> str:
+            calls.append(1)
+            release.wait()
+            return "token"
+
+        threads = [
+            threading.Thread(target=lambda: results.append(group.do("key", work)))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["token"] * 10)
+
+    def test_single_flight_error(self):
+        group = tokens.SingleFlight()
+
+        with self.assertRaises(ValueError):
+            group.do("key", mock.Mock(side_effect=ValueError))
+
+        self.assertEqual(group.do("key", lambda: 1), 1)
+
+
+class TTLCacheTestCase(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = TTLCache(maxsize=2, ttl=10, clock=lambda: self.now)
+
+    def test_lru_eviction(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("c"), 3)
+
+    def test_expiry(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2, ttl=1)
+        self.cache.set("c", 3, ttl=0)
+        self.now = 5
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNone(self.cache.get("c"))
+
+        self.now = 11
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_stats(self):
+        self.cache.set("a", 1)
+        self.cache.get("a")
+        self.cache.get("b")
+
+        self.assertEqual(
+            self.cache.stats(),
+            {"size": 1, "bytes": 0, "hits": 1, "misses": 1, "hit_rate": 0.5},
+        )
+
+    def test_maxbytes(self):
+        cache = TTLCache(maxsize=10, maxbytes=10, weigher=len)
+        cache.set("a", b"1234")
+        cache.set("b", b"1234")
+        cache.set("c", b"1234")
+        cache.set("huge", b"x" * 11)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), b"1234")
+        self.assertIsNone(cache.get("huge"))
+        self.assertEqual(cache.weight, 8)
+
+        cache.pop("b")
+        self.assertEqual(cache.weight, 4)
+
+
+class TokenCacheTestCase(TestCase):
+    def setUp(self):
+        self.account = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(),
+            refresh=fake.sha256(),
+        )
+
+    def test_expired_token_not_cached(self):
+        cache = TokenCache()
+        token = tokens.encode_claims({"exp": time.time() - 1})
+        cache.set(token, self.account)
+
+        self.assertIsNone(cache.get(token))
+
+    def test_returns_copy(self):
+        cache = TokenCache()
+        cache.set(self.account.access_token, self.account)
+
+        cached = cache.get(self.account.access_token)
+
+        self.assertEqual(cached, self.account)
+        self.assertIsNot(cached, self.account)
+
+    def test_shared_cache(self):
+        writer = TokenCache(alias="default")
+        reader = TokenCache(alias="default")
+        writer.set(self.account.access_token, self.account)
+
+        self.assertEqual(reader.get(self.account.access_token), self.account)
+
+        writer.invalidate_account(self.account.pk)
+        reader.local.clear()
+
+        self.assertIsNone(reader.get(self.account.access_token))
+
+    def test_invalidate_every_session(self):
+        cache = TokenCache(alias="default")
+        sessions = [tokens.encode_claims({"sub": fake.uuid4()}) for _ in range(2)]
+        for token in sessions:
+            cache.set(token, self.account)
+
+        cache.invalidate_account(self.account.pk)
+        reader = TokenCache(alias="default")
+
+        for token in sessions:
+            self.assertIsNone(cache.get(token))
+            self.assertIsNone(reader.get(token))
+
+
+class LocalJWTValidatorTestCase(TestCase):
+    def setUp(self):
+        self.claims = {
+            "sub": "did:plc:alice",
+            "aud": "did:web:pds.test",
+            "scope": "com.atproto.access",
+            "exp": time.time() + 600,
+        }
+        self.secret = fake.password()
+        self.key = self.secret.encode()
+        self.validator = LocalJWTValidator(
+            secret=self.secret, audience="did:web:pds.test"
+        )
+
+    def test_validate(self):
+        token = tokens.encode_claims(self.claims, self.key)
+
+        claims = self.validator.validate(token)
+
+        self.assertEqual(claims.sub, "did:plc:alice")
+        self.assertEqual(claims.aud, "did:web:pds.test")
+
+    def test_claims_are_cached(self):
+        token = tokens.encode_claims(self.claims, self.key)
+
+        with mock.patch.object(
+            self.validator, "decode", wraps=self.validator.decode
+        ) as decode:
+            self.validator.validate(token)
+            self.validator.validate(token)
+
+        decode.assert_called_once()
+
+    def test_rejects(self):
+        cases = {
+            "signature": tokens.encode_claims(self.claims, b"other"),
+            "expired": tokens.encode_claims(
+                {**self.claims, "exp": time.time() - 1}, self.key
+            ),
+            "audience": tokens.encode_claims(
+                {**self.claims, "aud": "did:web:other.test"}, self.key
+            ),
+            "subject": tokens.encode_claims({**self.claims, "sub": "alice"}, self.key),
+            "scope": tokens.encode_claims(
+                {**self.claims, "scope": "com.atproto.refresh"}, self.key
+            ),
+            "malformed": fake.sha256(),
+        }
+
+        for case, token in cases.items():
+            with self.subTest(case), self.assertRaises(tokens.InvalidTokenError):
+                self.validator.validate(token)
+
+    def test_without_secret(self):
+        validator = LocalJWTValidator()
+        token = tokens.encode_claims(self.claims, b"unknown")
+
+        with self.assertRaises(ImproperlyConfigured):
+            validator.validate(token)
+
+
+@override_settings(BLUESKY_JWT={"validation": "local"})
+class LocalJWTBackendTestCase(TestCase):
+    def setUp(self):
+        TOKEN_CACHE.clear()
+        self.backend = BlueSkyJWTBackend()
+        self.request_factory = RequestFactory()
+        self.user = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(),
+            refresh=fake.sha256(),
+            did="did:plc:alice",
+        )
+        self.key = fake.password().encode()
+        patcher = mock.patch.object(VALIDATOR, "secret", self.key)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def authenticate(self, token: str) -> Account | None:
+        request = self.request_factory.get(
+            reverse_lazy("home"), headers={"Authorization": f"Bearer {token}"}
+        )
+        return self.backend.authenticate(request)
+
+    def test_expired_token_without_query(self):
+        token = tokens.encode_claims(
+            {"sub": "did:plc:alice", "exp": time.time() - 1}, self.key
+        )
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.authenticate(token))
+
+    def test_unpersisted_token(self):
+        token = tokens.encode_claims(
+            {"sub": "did:plc:alice", "exp": time.time() + 60}, self.key
+        )
+
+        self.assertEqual(self.authenticate(token), self.user)
+
+    def test_forged_token(self):
+        token = tokens.encode_claims({"sub": "did:plc:alice", "exp": time.time() + 60})
+
+        self.assertIsNone(self.authenticate(token))
+
+    def test_unknown_did(self):
+        token = tokens.encode_claims(
+            {"sub": "did:plc:bob", "exp": time.time() + 60}, self.key
+        )
+
+        self.assertIsNone(self.authenticate(token))
+
+
+class SessionParsingTestCase(TestCase):
+    def setUp(self):
+        self.payload = session_payload()
+        self.content = json.dumps(self.payload).encode()
+
+    def test_from_json(self):
+        response = BlueSkySessionResponse.from_json(self.content)
+
+        self.assertEqual(response.didDoc.context, self.payload["didDoc"]["@context"])
+        self.assertEqual(response, BlueSkySessionResponse.from_response(self.payload))
+
+    def test_matches_legacy_parsing(self):
+        response = BlueSkySessionResponse.from_json(self.content)
+        legacy = legacy_parse_session(self.content)
+
+        self.assertEqual(response.accessJwt, legacy.accessJwt)
+        self.assertEqual(response.didDoc.context, legacy.didDoc.context)
+        # The legacy path never validated nested models, they stayed dicts.
+        self.assertIsInstance(legacy.didDoc.service[0], dict)
+        self.assertEqual(response.didDoc.service[0].id, legacy.didDoc.service[0]["id"])
+
+    def test_invalid(self):
+        del self.payload["didDoc"]["@context"]
+
+        with self.assertRaises(ValidationError):
+            BlueSkySessionResponse.from_json(json.dumps(self.payload).encode())
+
+
+class XRPCTestCase(TestCase):
+    def setUp(self):
+        self.requests = []
+        self.service = BlueSkyService(transport=httpx.MockTransport(self.handler))
+        self.addCleanup(self.service.close)
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.url.path.endswith("resolveHandle"):
+            return httpx.Response(200, json={"did": "did:plc:alice"})
+
+        return httpx.Response(200, json=session_payload())
+
+    def test_query(self):
+        response = self.service.call(RESOLVE_HANDLE, params={"handle": "alice.test"})
+
+        request = self.requests[0]
+        self.assertEqual(request.method, "GET")
+        self.assertEqual(request.url.params["handle"], "alice.test")
+        self.assertEqual(response.did, "did:plc:alice")
+
+    def test_query_by_nsid(self):
+        response = self.service.call(
+            "com.atproto.identity.resolveHandle", params={"handle": "alice.test"}
+        )
+
+        self.assertEqual(response.did, "did:plc:alice")
+
+    def test_procedure(self):
+        self.service.get_user_jwt("alice.test", "hunter2")
+
+        request = self.requests[0]
+        self.assertEqual(request.method, "POST")
+        self.assertEqual(
+            json.loads(request.content),
+            {"identifier": "alice.test", "password": "hunter2"},
+        )
+
+    def test_procedure_validates_dict_input(self):
+        with self.assertRaises(ValidationError):
+            self.service.call(
+                "com.atproto.server.createSession", body={"identifier": "alice"}
+            )
+
+        self.assertEqual(self.requests, [])
+
+    def test_unknown_method(self):
+        with self.assertRaises(xrpc.UnknownMethodError):
+            self.service.call("com.example.unknown")
+
+    def test_endpoint_is_cached(self):
+        xrpc.endpoint.cache_clear()
+        xrpc.endpoint("https://pds.test", RESOLVE_HANDLE.nsid)
+        xrpc.endpoint("https://pds.test", RESOLVE_HANDLE.nsid)
+
+        self.assertEqual(xrpc.endpoint.cache_info().hits, 1)
+        self.assertIs(RESOLVE_HANDLE.output_adapter, RESOLVE_HANDLE.output_adapter)
+
+
+class RequestSchedulerTestCase(TestCase):
+    def setUp(self):
+        self.server = StandInXRPCServer().start()
+        self.addCleanup(self.server.stop)
+        self.server.route(RESOLVE_HANDLE.nsid, {"did": "did:plc:alice"})
+
+        self.sleeps = []
+        self.scheduler = RequestScheduler(
+            retries=2, backoff=0.01, sleep=self.sleeps.append
+        )
+        self.service = BlueSkyService(
+            base_url=self.server.base_url, scheduler=self.scheduler
+        )
+        self.addCleanup(self.service.close)
+        self.token = fake.sha256(raw_output=False)
+
+    def resolve(self, token: str | None = None) -> str:
+        return self.service.call(
+            RESOLVE_HANDLE, params={"handle": "alice.test"}, token=token or self.token
+        ).did
+
+    def test_retries_query_on_503(self):
+        self.server.fail(RESOLVE_HANDLE.nsid, 503, times=2)
+
+        self.assertEqual(self.resolve(), "did:plc:alice")
+        self.assertEqual(self.server.hits[RESOLVE_HANDLE.nsid], 3)
+        self.assertEqual(self.scheduler.stats.retries, 2)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(all(0 <= delay <= 0.02 for delay in self.sleeps))
+
+    def test_gives_up_after_retries(self):
+        self.server.fail(RESOLVE_HANDLE.nsid, 503, times=3)
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            self.resolve()
+
+        self.assertEqual(self.server.hits[RESOLVE_HANDLE.nsid], 3)
+
+    def test_procedure_not_retried_on_503(self):
+        self.server.fail(BlueSkyEndpoints.CREATE_SESSION, 503)
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            self.service.get_user_jwt(fake.email(), fake.password())
+
+        self.assertEqual(self.server.hits[BlueSkyEndpoints.CREATE_SESSION], 1)
+        self.assertEqual(self.scheduler.stats.retries, 0)
+
+    def test_procedure_retried_on_429_after_retry_after(self):
+        self.server.fail(
+            BlueSkyEndpoints.CREATE_SESSION, 429, headers={"Retry-After": "3"}
+        )
+
+        self.service.get_user_jwt(fake.email(), fake.password())
+
+        self.assertEqual(self.server.hits[BlueSkyEndpoints.CREATE_SESSION], 2)
+        self.assertGreaterEqual(self.sleeps[0], 3)
+        # Logins are anonymous: one being limited doesn't hold back the others.
+        self.assertEqual(self.scheduler.stats.throttle_waits, 0)
+
+    def test_long_retry_after_raises(self):
+        self.server.fail(
+            BlueSkyEndpoints.CREATE_SESSION, 429, headers={"RateLimit-Reset": "86400"}
+        )
+
+        with self.assertRaises(RateLimitedError) as caught:
+            self.service.get_user_jwt(fake.email(), fake.password())
+
+        self.assertEqual(caught.exception.retry_after, 86400)
+        self.assertEqual(caught.exception.response.status_code, 429)
+        self.assertEqual(self.server.hits[BlueSkyEndpoints.CREATE_SESSION], 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_rate_limit_is_per_account(self):
+        self.server.fail(RESOLVE_HANDLE.nsid, 429, headers={"Retry-After": "86400"})
+
+        with self.assertRaises(RateLimitedError):
+            self.resolve()
+        # The account's bucket holds it back without asking the server again.
+        with self.assertRaises(RateLimitedError) as caught:
+            self.resolve()
+        self.assertEqual(caught.exception.response.headers["Retry-After"], "86400")
+        self.assertEqual(self.server.hits[RESOLVE_HANDLE.nsid], 1)
+
+        self.assertEqual(self.resolve(fake.sha256(raw_output=False)), "did:plc:alice")
+        self.assertEqual(self.sleeps, [])
+
+    def test_token_bucket_throttles_exhausted_host(self):
+        self.server.route(
+            RESOLVE_HANDLE.nsid,
+            {"did": "did:plc:alice"},
+            headers={
+                "RateLimit-Limit": "10",
+                "RateLimit-Remaining": "0",
+                "RateLimit-Reset": "5",
+                "RateLimit-Policy": "10;w=5",
+            },
+        )
+
+        self.resolve()
+        self.resolve()
+
+        self.assertEqual(self.scheduler.stats.throttle_waits, 1)
+        self.assertAlmostEqual(self.sleeps[0], 0.5, places=1)
+
+    def test_async_retries_query_on_429(self):
+        async_sleeps = []
+
+        async def sleep(delay: float) -> None:
+            async_sleeps.append(delay)
+
+        scheduler = RequestScheduler(backoff=0.01, async_sleep=sleep)
+        self.server.fail(RESOLVE_HANDLE.nsid, 429, headers={"Retry-After": "1"})
+
+        async def resolve() -> str:
+            async with AsyncBlueSkyService(
+                base_url=self.server.base_url, scheduler=scheduler
+            ) as service:
+                response = await service.call(
+                    RESOLVE_HANDLE, params={"handle": "alice.test"}
+                )
+                return response.did
+
+        self.assertEqual(asyncio.run(resolve()), "did:plc:alice")
+        self.assertEqual(scheduler.stats.retries, 1)
+        self.assertGreaterEqual(async_sleeps[0], 1)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("7"), 7)
+        self.assertAlmostEqual(
+            parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480),
+            10,
+        )
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class HubTestCase(TestCase):
+    def test_sse(self):
+        self.assertEqual(
+            sse("one\ntwo", event="post", id="1"),
+            b"event: post\nid: 1\ndata: one\ndata: two\n\n",
+        )
+        self.assertEqual(sse(""), b"data: \n\n")
+
+    async def test_fan_out_shares_the_message(self):
+        hub = Hub()
+        subscriptions = [hub.subscribe("a") for _ in range(3)]
+        other = hub.subscribe("b")
+        message = sse("hello")
+
+        self.assertEqual(hub.publish("a", message), 3)
+        for subscription in subscriptions:
+            self.assertIs(await subscription.get(0), message)
+        self.assertIsNone(await other.get(0))
+
+        for subscription in subscriptions:
+            subscription.close()
+        self.assertEqual(hub.topics(), ["b"])
+
+    async def test_slow_subscriber_drops_oldest(self):
+        hub = Hub(maxsize=2)
+        subscription = hub.subscribe("a")
+        for i in range(3):
+            hub.publish("a", str(i).encode())
+
+        self.assertEqual(subscription.dropped, 1)
+        self.assertEqual(await subscription.get(0), b"1")
+
+    async def test_publish_from_another_thread(self):
+        hub = Hub()
+        subscription = hub.subscribe("a")
+
+        thread = threading.Thread(target=hub.publish, args=("a", b"x"))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(await subscription.get(1), b"x")
+
+    async def test_event_stream_heartbeat_and_close(self):
+        hub = Hub()
+        subscription = hub.subscribe("a")
+        stream = event_stream(subscription, heartbeat=0.01)
+
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+        self.assertEqual(await anext(stream), HEARTBEAT)
+        hub.publish("a", b"data: x\n\n")
+        self.assertEqual(await anext(stream), b"data: x\n\n")
+
+        await stream.aclose()
+        self.assertEqual(len(hub), 0)
+
+
+class LoggerTestCase(TestCase):
+    def record(self, created: float = 0.0) -> logging.LogRecord:
+        record = logging.LogRecord(
+            "test", logging.INFO, __file__, 1, "Synced %d entries", (50,), None
+        )
+        if created:
+            record.created = created
+            record.msecs = (created - int(created)) * 1000
+        return record
+
+    def test_queue_handler(self):
+        stream = io.StringIO()
+        handler, listener = queue_handler(stream_handler(stream))
+        record = self.record()
+
+        handler.handle(record)
+
+        self.assertEqual((record.msg, record.args), ("Synced 50 entries", None))
+        self.assertEqual(stream.getvalue(), "")
+        listener.start()
+        listener.stop()
+        self.assertIn("Synced 50 entries", stream.getvalue())
+        self.assertIn("[INFO]", stream.getvalue())
+
+    def test_timestamp_is_formatted_once_per_second(self):
+        formatter = LogFormatter()
+
+        first = formatter.formatTime(self.record(1_700_000_000.1))
+        second = formatter.formatTime(self.record(1_700_000_000.9))
+        third = formatter.formatTime(self.record(1_700_000_001.0))
+
+        self.assertIs(first, second)
+        self.assertNotEqual(first, third)
+
+    def test_loggers_share_the_apps_handler(self):
+        logger = get_logger("apps.libs.example")
+
+        self.assertIs(logger, get_logger("apps.libs.example"))
+        self.assertEqual(logger.handlers, [])
+        (handler,) = logging.getLogger("apps").handlers
+        self.assertIsInstance(handler.filters[0], RequestIdFilter)
+        self.assertEqual(logger.getEffectiveLevel(), logging.INFO)
+
+    def test_build_handler(self):
+        stream = io.StringIO()
+        handler = build_handler("json", queue=False, stream=stream)
+
+        handler.handle(self.record())
+
+        self.assertEqual(json.loads(stream.getvalue())["message"], "Synced 50 entries")
+
+    def test_queue_listener_starts_on_first_record(self):
+        stream = io.StringIO()
+        handler = build_handler("json", stream=stream)
+        self.addCleanup(handler.stop)
+
+        self.assertIsNone(handler.listener)
+        handler.handle(self.record())
+        handler.stop()
+
+        self.assertEqual(json.loads(stream.getvalue())["message"], "Synced 50 entries")
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_forked_process_starts_its_own_listener(self):
+        with tempfile.TemporaryFile("w+") as stream:
+            handler = build_handler("json", stream=stream)
+            self.addCleanup(handler.stop)
+            handler.handle(self.record())
+
+            if (pid := os.fork()) == 0:
+                handler.handle(self.record())
+                handler.stop()
+                os._exit(0)
+            os.waitpid(pid, 0)
+            handler.stop()
+
+            stream.seek(0)
+            lines = stream.read().splitlines()
+
+        self.assertEqual(len(lines), 2)
+
+    def test_json_formatter(self):
+        record = self.record(1_700_000_000.25)
+        record.xrpc = {"nsid": "app.bsky.feed.getTimeline", "duration_ms": 12.5}
+        token = request_id.set("abc123")
+        self.addCleanup(request_id.reset, token)
+        RequestIdFilter().filter(record)
+
+        line = JSONFormatter().format(record)
+
+        self.assertNotIn("\n", line)
+        self.assertEqual(
+            json.loads(line),
+            {
+                "time": "2023-11-14T22:13:20.250Z",
+                "level": "INFO",
+                "logger": "test",
+                "message": "Synced 50 entries",
+                "location": "tests.None:1",
+                "request_id": "abc123",
+                "xrpc": {"nsid": "app.bsky.feed.getTimeline", "duration_ms": 12.5},
+            },
+        )
+
+    def test_xrpc_calls_are_timed(self):
+        with (
+            StandInXRPCServer() as server,
+            BlueSkyService(base_url=server.base_url) as service,
+            mock.patch("apps.libs.services.logger") as logger,
+        ):
+            service.get_user_jwt("alice.test", "hunter2")
+
+        fields = logger.info.call_args.kwargs["extra"]["xrpc"]
+        self.assertEqual(fields["nsid"], BlueSkyEndpoints.CREATE_SESSION)
+        self.assertEqual(fields["status"], 200)
+        self.assertGreater(fields["duration_ms"], 0)
+
+
+class RequestIdMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen: list[str | None] = []
+
+    def get_response(self, request: HttpRequest) -> HttpResponse:
+        self.seen.append(request_id.get())
+        return HttpResponse()
+
+    def test_generates_an_id(self):
+        response = RequestIdMiddleware(self.get_response)(self.factory.get("/"))
+
+        self.assertEqual(len(response["X-Request-ID"]), 32)
+        self.assertEqual(self.seen, [response["X-Request-ID"]])
+        self.assertIsNone(request_id.get())
+
+    def test_reuses_a_valid_incoming_id(self):
+        middleware = RequestIdMiddleware(self.get_response)
+
+        response = middleware(self.factory.get("/", headers={"X-Request-ID": "abc-1"}))
+        self.assertEqual(response["X-Request-ID"], "abc-1")
+
+        response = middleware(self.factory.get("/", headers={"X-Request-ID": "a b"}))
+        self.assertNotEqual(response["X-Request-ID"], "a b")
+
+    def test_async(self):
+        async def get_response(request: HttpRequest) -> HttpResponse:
+            return self.get_response(request)
+
+        middleware = RequestIdMiddleware(get_response)
+        response = asyncio.run(middleware(self.factory.get("/")))
+
+        self.assertEqual(self.seen, [response["X-Request-ID"]])
+
+
+class MetricsTestCase(TestCase):
+    def test_counter_sums_threads(self):
+        counter = Counter("calls_total", "Calls.", ("nsid",))
+
+        def work() -> None:
+            for _ in range(1000):
+                counter.inc("a")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc("b", amount=2)
+
+        self.assertEqual(counter.collect(), {("a",): 4000, ("b",): 2})
+        self.assertIn('calls_total{nsid="a"} 4000', list(counter.render()))
+
+    def test_histogram_render(self):
+        histogram = Histogram("x_seconds", "X.", ("nsid",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 2.0):
+            histogram.observe(value, 'a"b')
+
+        self.assertEqual(
+            list(histogram.render()),
+            [
+                "# HELP x_seconds X.",
+                "# TYPE x_seconds histogram",
+                'x_seconds_bucket{nsid="a\\"b",le="0.1"} 1',
+                'x_seconds_bucket{nsid="a\\"b",le="1.0"} 2',
+                'x_seconds_bucket{nsid="a\\"b",le="+Inf"} 3',
+                'x_seconds_sum{nsid="a\\"b"} 2.55',
+                'x_seconds_count{nsid="a\\"b"} 3',
+            ],
+        )
+
+    def test_xrpc_calls_are_measured(self):
+        nsid = BlueSkyEndpoints.CREATE_SESSION
+        responses = XRPC_RESPONSES.collect().get((nsid, 200), 0)
+        waits = sum(XRPC_POOL_WAIT.collect().get((), [0])[:-1])
+
+        with (
+            StandInXRPCServer() as server,
+            BlueSkyService(base_url=server.base_url) as service,
+        ):
+            service.get_user_jwt("alice.test", "hunter2")
+            service.get_user_jwt("alice.test", "hunter2")
+
+        self.assertEqual(XRPC_RESPONSES.collect()[(nsid, 200)], responses + 2)
+        self.assertGreater(XRPC_RECEIVED_BYTES.collect()[(nsid,)], 0)
+        self.assertEqual(sum(XRPC_POOL_WAIT.collect()[()][:-1]), waits + 2)
+
+    def test_queries_are_counted_per_view(self):
+        def get_response(request: HttpRequest) -> HttpResponse:
+            request.resolver_match = resolve(reverse_lazy("metrics"))
+            Account.objects.count()
+            Account.objects.exists()
+            return HttpResponse()
+
+        before = DB_QUERIES.collect().get(("metrics",), [0.0])[-1]
+        QueryCountMiddleware(get_response)(RequestFactory().get("/"))
+
+        self.assertEqual(DB_QUERIES.collect()[("metrics",)][-1], before + 2)
+
+    def test_metrics_view(self):
+        staff = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(raw_output=False),
+            refresh=fake.sha256(raw_output=False),
+        )
+        staff.is_staff = True
+        staff.save(update_fields=["is_staff"])
+
+        with mock.patch.dict(METRICS_OPTIONS, token=""):
+            self.assertEqual(self.client.get(reverse_lazy("metrics")).status_code, 404)
+            self.client.force_login(staff)
+            response = self.client.get(reverse_lazy("metrics"))
+            self.client.logout()
+
+        self.assertEqual(
+            response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8"
+        )
+        self.assertContains(response, "# TYPE hypersky_xrpc_request_duration_seconds")
+
+        token = fake.sha256(raw_output=False)
+        with mock.patch.dict(METRICS_OPTIONS, token=token):
+            self.assertEqual(self.client.get(reverse_lazy("metrics")).status_code, 401)
+            response = self.client.get(
+                reverse_lazy("metrics"), headers={"Authorization": f"Bearer {token}"}
+            )
+            self.assertContains(
+                response, 'hypersky_db_queries_per_request_count{view="metrics"}'
+            )
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        PROFILER.clear()
+        self.addCleanup(PROFILER.clear)
+        patcher = mock.patch.multiple(PROFILER, enabled=True, sample_rate=0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def get_response(self, request: HttpRequest) -> HttpResponse:
+        request.resolver_match = resolve(reverse_lazy("metrics"))
+        Account.objects.count()
+        Account.objects.exists()
+        with (
+            StandInXRPCServer() as server,
+            BlueSkyService(base_url=server.base_url) as service,
+        ):
+            service.get_user_jwt("alice.test", "hunter2")
+        template = engines["django"].from_string(
+            "{% for i in items %}{{ i }}{% endfor %}"
+        )
+        return HttpResponse(template.render({"items": range(1000)}))
+
+    def test_breakdown(self):
+        request = self.factory.get("/metrics", headers={"X-Profile": "1"})
+        request.user = Account(is_staff=True)
+        request.request_id = "abc123"
+
+        ProfilingMiddleware(self.get_response)(request)
+
+        (profile,) = PROFILER.latest()
+        self.assertEqual(
+            (profile.id, profile.view, profile.status), ("abc123", "metrics", 200)
+        )
+        self.assertEqual((profile.timings.queries, profile.timings.calls), (2, 1))
+        self.assertGreater(profile.timings.db, 0)
+        self.assertGreater(profile.timings.xrpc, 0)
+        self.assertGreater(profile.timings.template, 0)
+        self.assertAlmostEqual(
+            sum(ms for _, ms, _ in profile.breakdown), profile.total * 1000, places=3
+        )
+        self.assertIn("get_response", profile.stats)
+
+    def test_sampling(self):
+        middleware = ProfilingMiddleware(lambda request: HttpResponse())
+        request = self.factory.get("/", headers={"X-Profile": "1"})
+        request.user = AnonymousUser()
+
+        middleware(request)
+        self.assertEqual(PROFILER.latest(), [])
+
+        with mock.patch.object(PROFILER, "sample_rate", 1.0):
+            middleware(self.factory.get("/"))
+        self.assertEqual(len(PROFILER.latest()), 1)
+
+    def test_ring_buffer(self):
+        profiler = Profiler(enabled=True, size=2)
+        for path in ("/a", "/b", "/c"):
+            recording = profiler.start(python=False)
+            profiler.stop(recording)
+            profiler.record(recording, self.factory.get(path), HttpResponse())
+
+        self.assertEqual([p.path for p in profiler.latest()], ["/c", "/b"])
+
+    def test_disabled(self):
+        with (
+            mock.patch.object(PROFILER, "enabled", False),
+            self.assertRaises(MiddlewareNotUsed),
+        ):
+            ProfilingMiddleware(self.get_response)
+
+    def test_page_is_for_staff(self):
+        request = self.factory.get("/metrics", headers={"X-Profile": "1"})
+        request.user = Account(is_staff=True)
+        ProfilingMiddleware(self.get_response)(request)
+        account = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(raw_output=False),
+            refresh=fake.sha256(raw_output=False),
+            did="did:plc:staff",
+        )
+        self.client.force_login(account)
+
+        response = self.client.get(reverse_lazy("request_profiles"))
+        self.assertEqual(response.status_code, 302)
+
+        Account.objects.filter(pk=account.pk).update(is_staff=True)
+        response = self.client.get(reverse_lazy("request_profiles"))
+        self.assertContains(response, "GET /metrics")
+        self.assertContains(response, "cProfile")
+
+
+class ProfileHydratorTestCase(TestCase):
+    def setUp(self):
+        self.hydrator = ProfileHydrator()
+        self.token = fake.sha256(raw_output=False)
+
+    def get_profiles(
+        self, method, params=None, body=None, *, token=None, base_url=None
+    ) -> bsky.GetProfilesResponse:
+        return bsky.GetProfilesResponse(
+            profiles=[
+                bsky.ProfileViewDetailedFactory.build(did=did)
+                for did in params.actors
+                if not did.endswith("gone")
+            ]
+        )
+
+    async def aget_profiles(self, *args, **kwargs) -> bsky.GetProfilesResponse:
+        return self.get_profiles(*args, **kwargs)
+
+    def test_chunks_and_caches(self):
+        dids = [f"did:plc:{i}" for i in range(50)]
+
+        with mock.patch.object(BLUESKY, "call", side_effect=self.get_profiles) as call:
+            profiles = self.hydrator.hydrate(dids + dids[:10], token=self.token)
+            again = self.hydrator.hydrate(reversed(dids), token=self.token)
+
+        self.assertEqual(call.call_count, 2)
+        self.assertEqual(
+            sorted(len(c.kwargs["params"].actors) for c in call.call_args_list),
+            [25, 25],
+        )
+        self.assertEqual(set(profiles), set(dids))
+        self.assertEqual(again, profiles)
+
+    def test_missing_dids_are_cached(self):
+        with mock.patch.object(BLUESKY, "call", side_effect=self.get_profiles) as call:
+            first = self.hydrator.hydrate(["did:plc:a", "did:plc:gone"], self.token)
+            second = self.hydrator.hydrate(["did:plc:gone"], self.token)
+
+        self.assertEqual(list(first), ["did:plc:a"])
+        self.assertEqual(second, {})
+        self.assertEqual(call.call_count, 1)
+
+    async def test_ahydrate(self):
+        dids = [f"did:plc:{i}" for i in range(30)]
+
+        with mock.patch.object(
+            ASYNC_BLUESKY, "call", side_effect=self.aget_profiles
+        ) as call:
+            profiles = await self.hydrator.ahydrate(dids, token=self.token)
+
+        self.assertEqual(call.call_count, 2)
+        self.assertEqual(set(profiles), set(dids))
+
+
+class IdentityResolverTestCase(TestCase):
+    def setUp(self):
+        self.requests: list[str] = []
+        self.pds = "https://pds.example.com"
+        self.documents = {
+            "/did:plc:alice": self.document("did:plc:alice", "alice.example.com"),
+            "/.well-known/did.json": self.document(
+                "did:web:bob.example", "bob.example"
+            ),
+        }
+        self.resolver = IdentityResolver(
+            negative_ttl=60, transport=httpx.MockTransport(self.handle)
+        )
+        self.addresses = {
+            "intranet.example.com": "10.0.0.1",
+            "internal": "::1",
+            "127.0.0.1": "127.0.0.1",
+        }
+        patcher = mock.patch("apps.libs.identity.socket")
+        patcher.start().getaddrinfo.side_effect = self.getaddrinfo
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            "apps.libs.identity.dns.resolver.resolve",
+            side_effect=dns.resolver.NXDOMAIN,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def getaddrinfo(self, host: str, port: int) -> list[tuple]:
+        return [(None, None, None, "", (self.addresses.get(host, "192.0.43.10"), port))]
+
+    def document(self, did: str, handle: str) -> dict:
+        return DidDocFactory.build(
+            id=did,
+            alsoKnownAs=[f"at://{handle}"],
+            service=[
+                ServiceFactory.build(
+                    id="#atproto_pds",
+                    type="AtprotoPersonalDataServer",
+                    serviceEndpoint=self.pds,
+                )
+            ],
+        ).model_dump(mode="json", by_alias=True)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(str(request.url))
+        if request.url.path == "/.well-known/atproto-did":
+            if request.url.host == "alice.example.com":
+                return httpx.Response(200, text="did:plc:alice\n")
+            if request.url.host == "mallory.example.com":
+                return httpx.Response(200, text="did:plc:alice")
+            if request.url.host == "moved.example.com":
+                return httpx.Response(
+                    302, headers={"Location": "http://intranet.example.com/"}
+                )
+            return httpx.Response(404)
+
+        if (document := self.documents.get(request.url.path)) is not None:
+            return httpx.Response(200, json=document)
+        return httpx.Response(404)
+
+    def test_resolve_handle_through_well_known(self):
+        did, document = self.resolver.resolve("@Alice.example.com")
+        self.resolver.resolve("alice.example.com")
+
+        self.assertEqual(did, "did:plc:alice")
+        self.assertEqual(document.pds_endpoint, self.pds)
+        self.assertEqual(
+            self.requests,
+            [
+                "https://alice.example.com/.well-known/atproto-did",
+                "https://plc.directory/did:plc:alice",
+            ],
+        )
+
+    def test_resolve_handle_through_dns(self):
+        record = mock.Mock(strings=[b"did=did:plc:", b"alice"])
+        fake_dns = mock.Mock()
+        fake_dns.resolver.resolve.return_value = [record]
+
+        with mock.patch("apps.libs.identity.dns", fake_dns):
+            did = self.resolver.resolve_handle("alice.example.com")
+
+        self.assertEqual(did, "did:plc:alice")
+        fake_dns.resolver.resolve.assert_called_once_with(
+            "_atproto.alice.example.com", "TXT", lifetime=self.resolver.timeout
+        )
+        self.assertEqual(self.requests, [])
+
+    def test_resolve_did_web(self):
+        document = self.resolver.resolve_did("did:web:bob.example")
+
+        self.assertEqual(document.handle, "bob.example")
+        self.assertEqual(self.requests, ["https://bob.example/.well-known/did.json"])
+
+    def test_failures_are_cached(self):
+        for _ in range(2):
+            with self.assertRaises(ResolutionError):
+                self.resolver.resolve("nobody.example.com")
+            with self.assertRaises(ResolutionError):
+                self.resolver.resolve_did("did:plc:nobody")
+
+        self.assertEqual(len(self.requests), 2)
+
+    def test_unverified_handle(self):
+        with self.assertRaises(ResolutionError):
+            self.resolver.resolve("mallory.example.com")
+
+        self.assertIsNone(self.resolver.pds_endpoint("mallory.example.com"))
+
+    def test_private_hosts_are_not_fetched(self):
+        for identifier in ("intranet.example.com", "did:web:internal", "127.0.0.1"):
+            with self.subTest(identifier), self.assertRaises(ResolutionError):
+                self.resolver.resolve(identifier)
+
+        self.assertEqual(self.requests, [])
+
+    def test_redirects_are_not_followed(self):
+        with self.assertRaises(ResolutionError):
+            self.resolver.resolve("moved.example.com")
+
+        self.assertEqual(
+            self.requests, ["https://moved.example.com/.well-known/atproto-did"]
+        )
+
+    def test_pds_endpoint(self):
+        self.assertEqual(self.resolver.pds_endpoint("did:plc:alice"), self.pds)
+        self.assertIsNone(self.resolver.pds_endpoint(fake.email()))
+        self.assertIsNone(self.resolver.pds_endpoint("localhandle"))
+        self.assertEqual(len(self.requests), 1)
+
+    def test_login_goes_through_entryway(self):
+        resolver = mock.Mock()
+        with StandInXRPCServer() as entryway:
+            service = BlueSkyService(entryway.base_url, resolver=resolver)
+            self.addCleanup(service.close)
+
+            service.get_user_jwt("alice.example.com", fake.password())
+
+        self.assertEqual(entryway.hits[BlueSkyEndpoints.CREATE_SESSION], 1)
+        resolver.assert_not_called()
+
+    def test_login_falls_back_to_resolved_pds(self):
+        with StandInXRPCServer() as entryway, StandInXRPCServer() as pds:
+            entryway.fail(BlueSkyEndpoints.CREATE_SESSION, 401)
+            service = BlueSkyService(
+                entryway.base_url, resolver=lambda identifier: pds.base_url
+            )
+            self.addCleanup(service.close)
+
+            service.get_user_jwt("alice.example.com", fake.password())
+
+        self.assertEqual(entryway.hits[BlueSkyEndpoints.CREATE_SESSION], 1)
+        self.assertEqual(pds.hits[BlueSkyEndpoints.CREATE_SESSION], 1)
+
+
+class BenchmarkCommandTestCase(TestCase):
+    def test_iterations_only_where_taken(self):
+        benchmarks = {
+            name: mock.create_autospec(benchmark, return_value={})
+            for name, benchmark in BENCHMARKS.items()
+        }
+        out = io.StringIO()
+
+        with mock.patch.dict(BENCHMARKS, benchmarks):
+            call_command("benchmark", iterations=3, stdout=out)
+
+        for name, benchmark in benchmarks.items():
+            with self.subTest(name):
+                if "iterations" in inspect.signature(BENCHMARKS[name]).parameters:
+                    benchmark.assert_called_once_with(iterations=3)
+                else:
+                    benchmark.assert_called_once_with()
+        self.assertIn('"graph"', out.getvalue())
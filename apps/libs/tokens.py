@@ -0,0 +1,157 @@
+"""JWT helpers.
+
+The PDS signs access and refresh tokens with its own key. Most helpers only
+decode the claims locally, without verifying signatures, to decide when a
+token needs to be refreshed. ``verify`` checks HS256 signatures for PDSes
+whose secret we hold.
+"""
+
+import base64
+import binascii
+import dataclasses
+import hashlib
+import hmac
+import json
+import threading
+import time
+import typing
+
+# Refresh access tokens this many seconds before they actually expire.
+REFRESH_LEEWAY = 60
+
+
+class InvalidTokenError(ValueError):
+    """Raised when a JWT fails local validation."""
+
+
+def b64encode(data: bytes) -> str:
+    """Unpadded base64url encoding used by JWTs."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def encode_claims(claims: dict[str, typing.Any], key: bytes = b"") -> str:
+    """Encode ``claims`` as an HS256 JWT.
+
+    The PDS is the one minting real tokens; this is for tests and the local
+    stand-in server.
+    """
+    header = b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = b64encode(json.dumps(claims).encode())
+    signature = hmac.new(key, f"{header}.{payload}".encode(), hashlib.sha256)
+
+    return f"{header}.{payload}.{b64encode(signature.digest())}"
+
+
+def b64decode(data: str) -> bytes:
+    """Decode unpadded base64url."""
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def split(token: str) -> tuple[dict, dict, bytes, bytes]:
+    """Split a JWT into header, claims, signing input and signature.
+
+    Raises:
+        InvalidTokenError: If the token is not a well-formed JWT.
+    """
+    try:
+        header, payload, signature = token.split(".")
+        parts = json.loads(b64decode(header)), json.loads(b64decode(payload))
+        raw_signature = b64decode(signature)
+    except (ValueError, binascii.Error) as exc:
+        raise InvalidTokenError("Malformed token") from exc
+
+    if not all(isinstance(part, dict) for part in parts):
+        raise InvalidTokenError("Malformed token")
+
+    return *parts, f"{header}.{payload}".encode(), raw_signature
+
+
+def verify(token: str, key: bytes) -> dict[str, typing.Any]:
+    """Verify an HS256 signature and return the claims.
+
+    Raises:
+        InvalidTokenError: If the token is malformed or the signature is wrong.
+    """
+    header, claims, signing_input, signature = split(token)
+    if header.get("alg") != "HS256":
+        raise InvalidTokenError(f"Unsupported algorithm {header.get('alg')}")
+
+    expected = hmac.new(key, signing_input, hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, signature):
+        raise InvalidTokenError("Bad signature")
+
+    return claims
+
+
+def decode_claims(token: str) -> dict[str, typing.Any] | None:
+    """Decode the payload of a JWT, or ``None`` if it is malformed."""
+    try:
+        return split(token)[1]
+    except InvalidTokenError:
+        return None
+
+
+def expires_at(token: str) -> float | None:
+    """Expiry of ``token`` as a UNIX timestamp, if it carries one."""
+    if (claims := decode_claims(token)) and isinstance(claims.get("exp"), int | float):
+        return float(claims["exp"])
+
+    return None
+
+
+def expires_soon(token: str, leeway: float = REFRESH_LEEWAY) -> bool:
+    """Whether ``token`` expires within ``leeway`` seconds.
+
+    Tokens without a readable ``exp`` claim are treated as not expiring, the
+    PDS remains the authority on those.
+    """
+    if (exp := expires_at(token)) is None:
+        return False
+
+    return exp - leeway <= time.time()
+
+
+@dataclasses.dataclass
+class _Call:
+    done: threading.Event = dataclasses.field(default_factory=threading.Event)
+    result: typing.Any = None
+    error: BaseException | None = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one.
+
+    The first caller for a key runs the function, callers arriving while it is
+    in flight wait for it and share its result (or exception).
+    """
+
+    def __init__(self) -> None:
+        """Create an empty group of in-flight calls."""
+        self._lock = threading.Lock()
+        self._calls: dict[typing.Hashable, _Call] = {}
+
+    def do[T](self, key: typing.Hashable, fn: typing.Callable[[], T]) -> T:
+        """Run ``fn`` unless a call for ``key`` is already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
@@ -0,0 +1,95 @@
+"""Views."""
+
+import hmac
+import math
+from http import HTTPStatus
+
+import httpx
+from django import views
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import render
+from django.utils.decorators import method_decorator
+
+from apps.libs.logger import get_logger
+from apps.libs.metrics import REGISTRY
+from apps.libs.profiling import PROFILER
+from apps.libs.scheduling import RateLimitedError, parse_retry_after
+
+logger = get_logger(__name__)
+
+OPTIONS = getattr(settings, "METRICS", {})
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def upstream_error(request: HttpRequest, exc: httpx.HTTPError) -> HttpResponse:
+    """Response for an XRPC call that failed while handling ``request``.
+
+    Rate limits answer 503 with the ``Retry-After`` the PDS asked for, other
+    failures 502. HTMX requests get the error partial with a 200 instead, as
+    HTMX doesn't swap in error responses.
+    """
+    retry_after = None
+    if isinstance(exc, RateLimitedError):
+        retry_after = exc.retry_after
+    elif (
+        isinstance(exc, httpx.HTTPStatusError)
+        and exc.response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    ):
+        retry_after = parse_retry_after(exc.response.headers.get("Retry-After"))
+
+    logger.warning("Upstream error on %s: %s", request.path, exc)
+    if retry_after is not None:
+        retry_after = math.ceil(retry_after)
+        status = HTTPStatus.SERVICE_UNAVAILABLE
+    else:
+        status = HTTPStatus.BAD_GATEWAY
+
+    response = render(
+        request,
+        template_name=(
+            "partials/upstream_error.dj" if request.htmx else "upstream_error.dj"
+        ),
+        context={"retry_after": retry_after},
+        status=HTTPStatus.OK if request.htmx else status,
+    )
+    if retry_after is not None:
+        response["Retry-After"] = str(retry_after)
+    return response
+
+
+class MetricsView(views.View):
+    """Metrics of this process in the Prometheus text format.
+
+    Scrapers send ``METRICS["token"]`` as a bearer token. Without one set,
+    only signed in staff see the metrics; anyone else gets a 404. Each worker
+    process keeps its own metrics, so scrape every worker.
+    """
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Get request."""
+        if token := OPTIONS.get("token"):
+            sent = request.headers.get("Authorization", "").encode()
+            if not hmac.compare_digest(sent, f"Bearer {token}".encode()):
+                return HttpResponse(status=HTTPStatus.UNAUTHORIZED)
+        elif not request.user.is_staff:
+            return HttpResponse(status=HTTPStatus.NOT_FOUND)
+
+        return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@method_decorator(staff_member_required, name="dispatch")
+class RequestProfilesView(views.View):
+    """Latest profiled requests, for staff."""
+
+    template_name = "request_profiles.dj"
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Get request."""
+        return render(
+            request,
+            template_name=self.template_name,
+            context={"profiles": PROFILER.latest(), "profiler": PROFILER},
+        )
@@ -0,0 +1,138 @@
+"""XRPC method registry.
+
+Every XRPC method the service layer calls is registered once, with its kind
+(query or procedure) and the pydantic models for its parameters, input and
+output. ``BlueSkyService.call`` looks the method up here, so adding an
+endpoint is a ``query(...)``/``procedure(...)`` line next to its models.
+"""
+
+import dataclasses
+import enum
+import functools
+import typing
+
+from pydantic import BaseModel, TypeAdapter
+
+PROTOCOL = "xrpc"
+
+JSON_OBJECT = TypeAdapter(dict[str, typing.Any])
+
+
+class Kind(enum.StrEnum):
+    """XRPC method kinds."""
+
+    QUERY = "query"
+    PROCEDURE = "procedure"
+
+    @property
+    def http_method(self) -> str:
+        """HTTP verb used to call a method of this kind."""
+        return "GET" if self is Kind.QUERY else "POST"
+
+
+class UnknownMethodError(KeyError):
+    """Raised when calling an NSID that was never registered."""
+
+
+@dataclasses.dataclass(frozen=True)
+class XRPCMethod[O]:
+    """A registered XRPC method and the models it speaks."""
+
+    nsid: str
+    kind: Kind
+    output: type[O] | None = None
+    params: type[BaseModel] | None = None
+    input: type[BaseModel] | None = None
+
+    @functools.cached_property
+    def output_adapter(self) -> TypeAdapter[O] | None:
+        """Validator for the output, built once per method."""
+        return None if self.output is None else TypeAdapter(self.output)
+
+    @functools.cached_property
+    def input_adapter(self) -> TypeAdapter | None:
+        """Validator/serializer for the input, built once per method."""
+        return None if self.input is None else TypeAdapter(self.input)
+
+    def encode_params(
+        self, params: BaseModel | dict | None
+    ) -> dict[str, typing.Any] | None:
+        """Query string parameters, with unset values dropped."""
+        if params is None:
+            return None
+
+        if isinstance(params, BaseModel):
+            return params.model_dump(mode="json", by_alias=True, exclude_none=True)
+
+        return {key: value for key, value in params.items() if value is not None}
+
+    def encode_input(self, body: BaseModel | dict | None) -> bytes | None:
+        """JSON request body for procedures."""
+        if body is None:
+            return None
+
+        if (adapter := self.input_adapter) is None:
+            return JSON_OBJECT.dump_json(body)
+
+        if isinstance(body, dict):
+            body = adapter.validate_python(body)
+
+        return adapter.dump_json(body, by_alias=True, exclude_none=True)
+
+    def decode_output(self, content: bytes) -> O | None:
+        """Validate the response body straight from bytes."""
+        if (adapter := self.output_adapter) is None:
+            return None
+
+        return adapter.validate_json(content)
+
+
+METHODS: dict[str, XRPCMethod] = {}
+
+
+def register[O](
+    nsid: str,
+    kind: Kind,
+    output: type[O] | None = None,
+    params: type[BaseModel] | None = None,
+    input: type[BaseModel] | None = None,
+) -> XRPCMethod[O]:
+    """Register an XRPC method and return it."""
+    method = METHODS[nsid] = XRPCMethod(
+        nsid=str(nsid), kind=kind, output=output, params=params, input=input
+    )
+    return method
+
+
+def query[O](
+    nsid: str, output: type[O] | None = None, params: type[BaseModel] | None = None
+) -> XRPCMethod[O]:
+    """Register a query (HTTP GET) method."""
+    return register(nsid, Kind.QUERY, output=output, params=params)
+
+
+def procedure[O](
+    nsid: str,
+    output: type[O] | None = None,
+    input: type[BaseModel] | None = None,
+    params: type[BaseModel] | None = None,
+) -> XRPCMethod[O]:
+    """Register a procedure (HTTP POST) method."""
+    return register(nsid, Kind.PROCEDURE, output=output, params=params, input=input)
+
+
+def get_method(nsid: "str | XRPCMethod") -> XRPCMethod:
+    """Look up a registered method by NSID."""
+    if isinstance(nsid, XRPCMethod):
+        return nsid
+
+    try:
+        return METHODS[nsid]
+    except KeyError:
+        raise UnknownMethodError(nsid) from None
+
+
+@functools.lru_cache(maxsize=1024)
+def endpoint(base_url: str, nsid: str) -> str:
+    """URL of ``nsid`` on ``base_url``, built once per pair."""
+    return f"{base_url}/{PROTOCOL}/{nsid}"
@@ -0,0 +1,36 @@
+"""List forms."""
+
+from django import forms
+
+from apps.lists.models import List
+from apps.lists.services import parse_actors
+
+
+class ListForm(forms.Form):
+    """New list."""
+
+    name = forms.CharField(max_length=64)
+    description = forms.CharField(required=False, widget=forms.Textarea)
+    purpose = forms.ChoiceField(
+        choices=List.Purpose.choices, initial=List.Purpose.CURATE, required=False
+    )
+
+    def clean_purpose(self) -> str:
+        """Purpose, a user list unless chosen otherwise."""
+        return self.cleaned_data["purpose"] or List.Purpose.CURATE
+
+
+class MembersForm(forms.Form):
+    """Members to add to a list."""
+
+    actors = forms.CharField(
+        widget=forms.Textarea,
+        help_text="Handles or DIDs, separated by spaces, commas or new lines.",
+    )
+
+    def clean_actors(self) -> list[str]:
+        """Split the input into unique handles and DIDs."""
+        if not (actors := parse_actors(self.cleaned_data["actors"])):
+            raise forms.ValidationError("Enter at least one handle or DID.")
+
+        return actors
@@ -1,3 +1,91 @@
+"""Bluesky lists owned by accounts, mirrored locally."""
+
+from django.conf import settings
 from django.db import models
+from django_stubs_ext.db.models import TypedModelMeta
+
+
+class List(models.Model):
+    """``app.bsky.graph.list`` record of an account."""
+
+    class Purpose(models.TextChoices):
+        """What the list is for."""
+
+        CURATE = "app.bsky.graph.defs#curatelist", "User list"
+        MODERATE = "app.bsky.graph.defs#modlist", "Moderation list"
+
+    account = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="lists"
+    )
+    uri = models.CharField(max_length=512, unique=True)
+    cid = models.CharField(max_length=255)
+    name = models.CharField(max_length=64)
+    purpose = models.CharField(
+        max_length=64, choices=Purpose.choices, default=Purpose.CURATE
+    )
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        """Name of the list."""
+        return self.name
+
+
+class ListMember(models.Model):
+    """``app.bsky.graph.listitem`` record adding ``subject_did`` to a list."""
+
+    list = models.ForeignKey(List, on_delete=models.CASCADE, related_name="members")
+    subject_did = models.CharField(max_length=255)
+    uri = models.CharField(max_length=512)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta(TypedModelMeta):
+        """Meta class for ListMember."""
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["list", "subject_did"], name="list_member_subject"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """Subject of the membership."""
+        return self.subject_did
+
+    @property
+    def rkey(self) -> str:
+        """Record key of the listitem record."""
+        return self.uri.rsplit("/", 1)[-1]
+
+
+class ListImport(models.Model):
+    """Members being added to a list, one ``applyWrites`` batch at a time."""
+
+    # Handles or DIDs not processed yet. Declared before the ``list`` field,
+    # which shadows the builtin in the class body.
+    pending = models.JSONField(default=list)
+    list = models.ForeignKey(List, on_delete=models.CASCADE, related_name="imports")
+    total = models.PositiveIntegerField(default=0)
+    added = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        """Progress of the import."""
+        return f"{self.list}: {self.processed}/{self.total}"
+
+    @property
+    def processed(self) -> int:
+        """Entries handled so far."""
+        return self.total - len(self.pending)
+
+    @property
+    def done(self) -> bool:
+        """Whether every entry was handled."""
+        return not self.pending
 
-# Create your models here.
+    @property
+    def percent(self) -> int:
+        """Progress, in percent."""
+        return 100 * self.processed // self.total if self.total else 100
@@ -0,0 +1,216 @@
+"""List management.
+
+Lists and their members are records in the owner's repository. Members are
+added and removed with ``com.atproto.repo.applyWrites``, up to 200 records
+per call, instead of one ``createRecord``/``deleteRecord`` each, and every
+batch is mirrored locally as soon as the PDS accepted it. Adding 500 people
+to a list takes three calls.
+"""
+
+import itertools
+import re
+import typing
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.libs import BLUESKY, get_logger
+from apps.libs import lexicons as bsky
+from apps.libs.profiles import PROFILES
+from apps.lists.models import List, ListImport, ListMember
+
+if typing.TYPE_CHECKING:
+    from apps.accounts.models import Account
+
+logger = get_logger(__name__)
+
+LIST = "app.bsky.graph.list"
+LISTITEM = "app.bsky.graph.listitem"
+
+
+def parse_actors(text: str) -> list[str]:
+    """Handles and DIDs in ``text``, separated by whitespace or commas."""
+    actors = (actor.removeprefix("@") for actor in re.split(r"[\s,]+", text))
+    return list(dict.fromkeys(actor for actor in actors if actor))
+
+
+def apply_writes(
+    account: "Account", writes: list[bsky.Create | bsky.Delete]
+) -> list[bsky.WriteResult]:
+    """Apply ``writes`` to the account's repository, 200 per call."""
+    results: list[bsky.WriteResult] = []
+    for batch in itertools.batched(writes, bsky.MAX_WRITES):
+        output = BLUESKY.call(
+            bsky.APPLY_WRITES,
+            body=bsky.ApplyWritesInput(repo=account.did, writes=list(batch)),
+            token=account.fresh_access_token(),
+            base_url=account.pds_endpoint,
+        )
+        results.extend(output.results)
+
+    return results
+
+
+def create_list(
+    account: "Account",
+    name: str,
+    description: str = "",
+    purpose: str = List.Purpose.CURATE,
+) -> List:
+    """Create a list record and its local copy."""
+    record = {
+        "$type": LIST,
+        "name": name,
+        "purpose": purpose,
+        "description": description,
+        "createdAt": timezone.now().isoformat(),
+    }
+    (result,) = apply_writes(account, [bsky.Create(collection=LIST, value=record)])
+
+    return List.objects.create(
+        account=account,
+        uri=result.uri,
+        cid=result.cid or "",
+        name=name,
+        purpose=purpose,
+        description=description,
+    )
+
+
+def add_members(lst: List, dids: typing.Iterable[str]) -> int:
+    """Add ``dids`` to ``lst``, skipping current members.
+
+    Returns the number of members added.
+    """
+    dids = list(dict.fromkeys(dids))
+    existing = set(
+        ListMember.objects.filter(list=lst, subject_did__in=dids).values_list(
+            "subject_did", flat=True
+        )
+    )
+    new = [did for did in dids if did not in existing]
+
+    added = 0
+    for batch in itertools.batched(new, bsky.MAX_WRITES):
+        now = timezone.now().isoformat()
+        results = apply_writes(
+            lst.account,
+            [
+                bsky.Create(
+                    collection=LISTITEM,
+                    value={
+                        "$type": LISTITEM,
+                        "subject": did,
+                        "list": lst.uri,
+                        "createdAt": now,
+                    },
+                )
+                for did in batch
+            ],
+        )
+        ListMember.objects.bulk_create(
+            [
+                ListMember(list=lst, subject_did=did, uri=result.uri or "")
+                for did, result in zip(batch, results, strict=True)
+            ],
+            ignore_conflicts=True,
+        )
+        added += len(batch)
+
+    return added
+
+
+def remove_members(lst: List, dids: typing.Iterable[str]) -> int:
+    """Remove ``dids`` from ``lst`` and return how many were members."""
+    members = list(ListMember.objects.filter(list=lst, subject_did__in=list(dids)))
+
+    for batch in itertools.batched(members, bsky.MAX_WRITES):
+        # Members mirrored without a record URI have no record to delete.
+        apply_writes(
+            lst.account,
+            [
+                bsky.Delete(collection=LISTITEM, rkey=member.rkey)
+                for member in batch
+                if member.uri
+            ],
+        )
+        ListMember.objects.filter(pk__in=[member.pk for member in batch]).delete()
+
+    return len(members)
+
+
+def start_import(lst: List, actors: list[str]) -> ListImport:
+    """Queue ``actors``, handles or DIDs, to be added to ``lst``."""
+    return ListImport.objects.create(list=lst, pending=actors, total=len(actors))
+
+
+def claim_batch(pk: int) -> tuple[ListImport, list[str]]:
+    """Take the next batch off the pending entries of a ``ListImport``.
+
+    The row is only locked while claiming, so concurrent steps get distinct
+    batches and no transaction stays open during XRPC calls.
+    """
+    with transaction.atomic():
+        job = (
+            ListImport.objects.select_for_update()
+            .select_related("list__account")
+            .get(pk=pk)
+        )
+        batch = job.pending[: bsky.MAX_WRITES]
+        if batch:
+            job.pending = job.pending[bsky.MAX_WRITES :]
+            job.save(update_fields=["pending", "updated_at"])
+
+    return job, batch
+
+
+def import_batch(lst: List, actors: list[str]) -> int:
+    """Add ``actors``, handles or DIDs, to ``lst`` and return how many were added."""
+    account = lst.account
+    handles = [actor for actor in actors if not actor.startswith("did:")]
+    resolved = PROFILES.resolve_handles(
+        handles,
+        token=account.fresh_access_token(),
+        base_url=account.pds_endpoint,
+    )
+    dids = [
+        actor if actor.startswith("did:") else resolved.get(actor.lower())
+        for actor in actors
+    ]
+
+    return add_members(lst, [did for did in dids if did])
+
+
+def step_import(pk: int) -> ListImport:
+    """Add the next batch of a ``ListImport`` and return its progress.
+
+    Each step makes a single ``applyWrites`` call, plus the ``getProfiles``
+    calls resolving the handles of the batch, so an import of any size
+    advances one short request at a time. A batch that fails is put back:
+    adding members skips current ones, so the next step can retry it.
+    """
+    job, batch = claim_batch(pk)
+    if not batch:
+        return job
+
+    try:
+        added = import_batch(job.list, batch)
+    except Exception:
+        with transaction.atomic():
+            job = ListImport.objects.select_for_update().get(pk=pk)
+            job.pending = batch + job.pending
+            job.save(update_fields=["pending", "updated_at"])
+        raise
+
+    with transaction.atomic():
+        job = (
+            ListImport.objects.select_for_update()
+            .select_related("list__account")
+            .get(pk=pk)
+        )
+        job.added += added
+        job.skipped += len(batch) - added
+        job.save(update_fields=["added", "skipped", "updated_at"])
+
+    logger.info("List import %s: %d added", job, added)
+    return job
@@ -1,3 +1,264 @@
+import itertools
+import logging
+from http import HTTPStatus
+from unittest import mock
+
+import httpx
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse_lazy
+from faker import Faker
+
+from apps.accounts.models import Account
+from apps.libs import BLUESKY
+from apps.libs import lexicons as bsky
+from apps.libs.profiles import PROFILES
+from apps.libs.services import BlueSkyService
+from apps.lists.models import List, ListMember
+from apps.lists.services import (
+    add_members,
+    create_list,
+    parse_actors,
+    remove_members,
+    start_import,
+    step_import,
+)
+
+fake = Faker()
+
+logging.disable(logging.CRITICAL)
+
+
+class FakePDS:
+    """Stands in for ``BLUESKY.call``, answering applyWrites and getProfiles."""
+
+    def __init__(self) -> None:
+        self.writes: list[list[bsky.Create | bsky.Delete]] = []
+        self.lookups: list[list[str]] = []
+        self.rkeys = itertools.count()
+        # Transactions open around each call, the test case's own included;
+        # none in the worker threads resolving handles.
+        self.atomic_blocks: list[int] = []
+
+    def __call__(
+        self, method, params=None, body=None, *, token=None, base_url=None
+    ) -> bsky.ApplyWritesOutput | bsky.GetProfilesResponse:
+        self.atomic_blocks.append(len(connection.atomic_blocks))
+        if method is bsky.GET_PROFILES:
+            self.lookups.append(params.actors)
+            return bsky.GetProfilesResponse(
+                profiles=[
+                    bsky.ProfileViewDetailedFactory.build(
+                        did=f"did:plc:{actor.split('.')[0]}", handle=actor
+                    )
+                    for actor in params.actors
+                    if not actor.startswith("unknown")
+                ]
+            )
+
+        self.writes.append(body.writes)
+        return bsky.ApplyWritesOutput(
+            results=[
+                bsky.WriteResult(
+                    type=f"{write.type}Result",
+                    uri=f"at://{body.repo}/{write.collection}/{next(self.rkeys)}",
+                    cid=fake.sha256(),
+                )
+                if isinstance(write, bsky.Create)
+                else bsky.WriteResult(type=f"{write.type}Result")
+                for write in body.writes
+            ]
+        )
+
+
+class ListsTestCase(TestCase):
+    def setUp(self):
+        PROFILES.cache.clear()
+        self.account = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(raw_output=False),
+            refresh=fake.sha256(raw_output=False),
+            did="did:plc:owner",
+        )
+        self.pds = FakePDS()
+        patcher = mock.patch.object(BLUESKY, "call", self.pds)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.headers = {"Authorization": f"Bearer {self.account.access_token}"}
+        self.atomic_blocks = len(connection.atomic_blocks)
+
+    def test_parse_actors(self):
+        self.assertEqual(
+            parse_actors("@alice.test, bob.test\n did:plc:carol  alice.test"),
+            ["alice.test", "bob.test", "did:plc:carol"],
+        )
+
+    def test_create_list(self):
+        lst = create_list(self.account, "Friends", "People I know")
+
+        (writes,) = self.pds.writes
+        self.assertEqual(writes[0].collection, "app.bsky.graph.list")
+        self.assertEqual(writes[0].value["name"], "Friends")
+        self.assertTrue(lst.uri.startswith("at://did:plc:owner/app.bsky.graph.list/"))
+
+    def test_add_500_members_in_three_calls(self):
+        lst = create_list(self.account, "Big")
+        self.pds.writes.clear()
+        dids = [f"did:plc:{i}" for i in range(500)]
+
+        added = add_members(lst, dids + dids[:10])
+
+        self.assertEqual(added, 500)
+        self.assertEqual([len(batch) for batch in self.pds.writes], [200, 200, 100])
+        self.assertEqual(lst.members.count(), 500)
+        self.assertEqual(self.pds.writes[0][0].value["list"], lst.uri)
+
+    def test_existing_members_are_skipped(self):
+        lst = create_list(self.account, "Small")
+        add_members(lst, ["did:plc:a", "did:plc:b"])
+
+        self.assertEqual(add_members(lst, ["did:plc:b", "did:plc:c"]), 1)
+        self.assertEqual(self.pds.writes[-1][0].value["subject"], "did:plc:c")
+        self.assertEqual(
+            sorted(lst.members.values_list("subject_did", flat=True)),
+            ["did:plc:a", "did:plc:b", "did:plc:c"],
+        )
+
+    def test_remove_members_in_one_call(self):
+        lst = create_list(self.account, "Small")
+        add_members(lst, [f"did:plc:{i}" for i in range(5)])
+        rkeys = {m.rkey for m in lst.members.filter(subject_did__in=["did:plc:1"])}
+
+        removed = remove_members(lst, ["did:plc:1", "did:plc:9"])
+
+        self.assertEqual(removed, 1)
+        (delete,) = self.pds.writes[-1]
+        self.assertIsInstance(delete, bsky.Delete)
+        self.assertEqual({delete.rkey}, rkeys)
+        self.assertFalse(lst.members.filter(subject_did="did:plc:1").exists())
+
+    def test_members_without_uri_are_not_deleted_remotely(self):
+        lst = create_list(self.account, "Small")
+        ListMember.objects.create(list=lst, subject_did="did:plc:1", uri="")
+        writes = len(self.pds.writes)
+
+        self.assertEqual(remove_members(lst, ["did:plc:1"]), 1)
+        self.assertEqual(len(self.pds.writes), writes)
+        self.assertFalse(lst.members.exists())
+
+    def test_import_advances_one_batch_per_step(self):
+        lst = create_list(self.account, "Import")
+        actors = [f"user{i}.test" for i in range(250)] + ["unknown.test"]
+        job = start_import(lst, actors)
+
+        job = step_import(job.pk)
+        self.assertEqual((job.processed, job.added), (200, 200))
+        self.assertEqual(len(self.pds.lookups), 8)
+
+        job = step_import(job.pk)
+        self.assertTrue(job.done)
+        self.assertEqual((job.added, job.skipped), (250, 1))
+        self.assertEqual(ListMember.objects.filter(list=lst).count(), 250)
+        # Only the test case's transaction is open while calling the PDS.
+        self.assertLessEqual(max(self.pds.atomic_blocks), self.atomic_blocks)
+
+    def test_failed_import_batch_is_put_back(self):
+        lst = create_list(self.account, "Import")
+        job = start_import(lst, ["did:plc:1", "did:plc:2"])
+
+        with (
+            mock.patch.object(BLUESKY, "call", side_effect=httpx.ConnectError("")),
+            self.assertRaises(httpx.ConnectError),
+        ):
+            step_import(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.pending, ["did:plc:1", "did:plc:2"])
+        job = step_import(job.pk)
+        self.assertEqual((job.added, job.done), (2, True))
+
+    def test_htmx_import_progress(self):
+        lst = create_list(self.account, "Import")
+        actors = " ".join(f"did:plc:{i}" for i in range(300))
+
+        response = self.client.post(
+            reverse_lazy("list_import", args=[lst.pk]),
+            {"actors": actors},
+            headers={**self.headers, "HX-Request": "true"},
+        )
+        self.assertContains(response, "0 of 300")
+        job = lst.imports.get()
+
+        progress = reverse_lazy("list_import_progress", args=[job.pk])
+        response = self.client.post(progress, headers=self.headers)
+        self.assertContains(response, "200 of 300")
+        self.assertContains(response, 'hx-trigger="load"')
+
+        response = self.client.post(progress, headers=self.headers)
+        self.assertContains(response, "Added 300 of 300")
+        self.assertEqual(lst.members.count(), 300)
+
+    def test_failed_import_step(self):
+        lst = create_list(self.account, "Import")
+        job = start_import(lst, ["did:plc:alice"])
+        service = BlueSkyService(
+            transport=httpx.MockTransport(lambda request: httpx.Response(500))
+        )
+
+        with mock.patch("apps.lists.services.BLUESKY", service):
+            response = self.client.post(
+                reverse_lazy("list_import_progress", args=[job.pk]),
+                headers={**self.headers, "HX-Request": "true"},
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "partials/upstream_error.dj")
+        self.assertContains(response, "could not be reached")
+        job.refresh_from_db()
+        self.assertFalse(job.done)
+
+    def test_views(self):
+        response = self.client.post(
+            reverse_lazy("lists"), {"name": "Friends"}, headers=self.headers
+        )
+        lst = List.objects.get()
+        self.assertRedirects(response, reverse_lazy("list_detail", args=[lst.pk]))
+
+        self.client.post(
+            reverse_lazy("list_import", args=[lst.pk]),
+            {"actors": "alice.test bob.test"},
+            headers=self.headers,
+        )
+        response = self.client.get(
+            reverse_lazy("list_detail", args=[lst.pk]), headers=self.headers
+        )
+        self.assertContains(response, "did:plc:alice")
+
+        self.client.post(
+            reverse_lazy("list_remove_members", args=[lst.pk]),
+            {"subject_did": ["did:plc:alice"]},
+            headers=self.headers,
+        )
+        self.assertEqual(
+            list(lst.members.values_list("subject_did", flat=True)), ["did:plc:bob"]
+        )
+
+    def test_other_accounts_lists_are_hidden(self):
+        lst = List.objects.create(
+            account=Account.auth.create_from_api(
+                email=fake.email(),
+                handle=fake.user_name(),
+                access=fake.sha256(raw_output=False),
+                refresh=fake.sha256(raw_output=False),
+            ),
+            uri="at://did:plc:other/app.bsky.graph.list/1",
+            cid=fake.sha256(),
+            name="Theirs",
+        )
+
+        response = self.client.get(
+            reverse_lazy("list_detail", args=[lst.pk]), headers=self.headers
+        )
 
-# Create your tests here.
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,23 @@
+"""Lists URL Configuration."""
+
+from django.urls import path
+
+from apps.lists.views import (
+    ListDetailView,
+    ListImportProgressView,
+    ListImportView,
+    ListsView,
+    RemoveMembersView,
+)
+
+urlpatterns = [
+    path("", ListsView.as_view(), name="lists"),
+    path("<int:pk>/", ListDetailView.as_view(), name="list_detail"),
+    path("<int:pk>/import/", ListImportView.as_view(), name="list_import"),
+    path(
+        "imports/<int:pk>/",
+        ListImportProgressView.as_view(),
+        name="list_import_progress",
+    ),
+    path("<int:pk>/remove/", RemoveMembersView.as_view(), name="list_remove_members"),
+]
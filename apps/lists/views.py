@@ -1,3 +1,150 @@
-from django.shortcuts import render
+"""List views."""
 
-# Create your views here.
+import httpx
+from django import views
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+
+from apps.accounts.models import Account
+from apps.libs.authentication import get_account
+from apps.libs.views import upstream_error
+from apps.lists.forms import ListForm, MembersForm
+from apps.lists.models import List, ListImport
+from apps.lists.services import create_list, remove_members, start_import, step_import
+
+
+class ListsView(views.View):
+    """Lists of the account, and a form to create one."""
+
+    template_name = "lists.dj"
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Get request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        return self.render(request, account, ListForm())
+
+    def post(self, request: HttpRequest) -> HttpResponse:
+        """Create a list."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        form = ListForm(request.POST)
+        if not form.is_valid():
+            return self.render(request, account, form)
+
+        lst = create_list(account, **form.cleaned_data)
+        return redirect(reverse("list_detail", args=[lst.pk]))
+
+    def render(
+        self, request: HttpRequest, account: Account, form: ListForm
+    ) -> HttpResponse:
+        """Render the lists page."""
+        return render(
+            request,
+            template_name=self.template_name,
+            context={"lists": List.objects.filter(account=account), "form": form},
+        )
+
+
+class ListDetailView(views.View):
+    """Members of a list."""
+
+    template_name = "list_detail.dj"
+
+    def get(self, request: HttpRequest, pk: int) -> HttpResponse:
+        """Get request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        lst = get_object_or_404(List, pk=pk, account=account)
+        return render(
+            request,
+            template_name=self.template_name,
+            context={
+                "list": lst,
+                "members": lst.members.order_by("-created_at"),
+                "form": MembersForm(),
+            },
+        )
+
+
+class ListImportView(views.View):
+    """Start adding members to a list.
+
+    The import runs one ``applyWrites`` batch per request: HTMX keeps
+    requesting the progress partial, which advances the import, until done.
+    """
+
+    partial_template_name = "partials/list_import.dj"
+
+    def post(self, request: HttpRequest, pk: int) -> HttpResponse:
+        """Queue the submitted handles and DIDs."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        lst = get_object_or_404(List, pk=pk, account=account)
+        form = MembersForm(request.POST)
+        if not form.is_valid():
+            return render(
+                request,
+                template_name=self.partial_template_name,
+                context={"list": lst, "form": form},
+            )
+
+        job = start_import(lst, form.cleaned_data["actors"])
+        if not request.htmx:
+            try:
+                while not job.done:
+                    job = step_import(job.pk)
+            except httpx.HTTPError as exc:
+                return upstream_error(request, exc)
+            return redirect(reverse("list_detail", args=[lst.pk]))
+
+        return render(
+            request,
+            template_name=self.partial_template_name,
+            context={"list": lst, "job": job},
+        )
+
+
+class ListImportProgressView(views.View):
+    """Advance an import by one batch and render its progress."""
+
+    partial_template_name = "partials/list_import.dj"
+
+    def post(self, request: HttpRequest, pk: int) -> HttpResponse:
+        """Post request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        job = get_object_or_404(ListImport, pk=pk, list__account=account)
+        try:
+            job = step_import(job.pk)
+        except httpx.HTTPError as exc:
+            return upstream_error(request, exc)
+
+        return render(
+            request,
+            template_name=self.partial_template_name,
+            context={"list": job.list, "job": job},
+        )
+
+
+class RemoveMembersView(views.View):
+    """Remove the selected members from a list."""
+
+    def post(self, request: HttpRequest, pk: int) -> HttpResponse:
+        """Post request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        lst = get_object_or_404(List, pk=pk, account=account)
+        try:
+            remove_members(lst, request.POST.getlist("subject_did"))
+        except httpx.HTTPError as exc:
+            return upstream_error(request, exc)
+
+        return redirect(reverse("list_detail", args=[lst.pk]))
@@ -0,0 +1,15 @@
+"""Notification context processors."""
+
+from django.http import HttpRequest
+from django.utils.functional import SimpleLazyObject
+
+from apps.notifications.services import get_unread_count
+
+
+def unread_notifications(request: HttpRequest) -> dict[str, SimpleLazyObject]:
+    """Unread count for the nav badge, read from cache only when rendered."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {}
+
+    return {"unread_notifications": SimpleLazyObject(lambda: get_unread_count(user))}
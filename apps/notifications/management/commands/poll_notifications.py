@@ -0,0 +1,51 @@
+"""Poll notifications for every account."""
+
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from apps.accounts.models import Account
+from apps.libs import ASYNC_BLUESKY
+from apps.notifications.services import poll_accounts
+
+
+class Command(BaseCommand):
+    """Poll notifications in concurrent batches of accounts."""
+
+    help = "Poll notifications and refresh the cached unread counts."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        options = getattr(settings, "NOTIFICATIONS", {})
+        parser.add_argument(
+            "--batch-size", type=int, default=options.get("poll_batch_size", 25)
+        )
+        parser.add_argument(
+            "--interval", type=float, default=options.get("poll_interval", 30)
+        )
+        parser.add_argument("--once", action="store_true", help="Poll a single round.")
+
+    def handle(self, *args, **options) -> None:
+        """Poll until interrupted, or once with ``--once``."""
+        async_to_sync(self.poll)(
+            options["batch_size"], options["interval"], options["once"]
+        )
+
+    async def poll(self, batch_size: int, interval: float, once: bool) -> None:
+        """Poll rounds on a single event loop, so the pooled client is reused."""
+        try:
+            while True:
+                accounts = await sync_to_async(list)(
+                    Account.objects.exclude(access_token="")
+                )
+                result = await poll_accounts(accounts, batch_size)
+                self.stdout.write(json.dumps(vars(result)))
+
+                if once:
+                    return
+                await asyncio.sleep(interval)
+        finally:
+            await ASYNC_BLUESKY.aclose()
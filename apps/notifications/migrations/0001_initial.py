@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latest_indexed_at', models.DateTimeField(blank=True, null=True)),
+                ('seen_at', models.DateTimeField(blank=True, null=True)),
+                ('polled_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_sync', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uri', models.CharField(max_length=512)),
+                ('cid', models.CharField(max_length=255)),
+                ('author_did', models.CharField(max_length=255)),
+                ('author_handle', models.CharField(max_length=255)),
+                ('author_name', models.CharField(blank=True, max_length=640)),
+                ('reason', models.CharField(max_length=32)),
+                ('reason_subject', models.CharField(blank=True, max_length=512)),
+                ('record', models.JSONField(default=dict)),
+                ('is_read', models.BooleanField(default=False)),
+                ('indexed_at', models.DateTimeField()),
+                ('account', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', '-indexed_at'], name='notification_account_indexed')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'uri'), name='notification_account_uri')],
+            },
+        ),
+    ]
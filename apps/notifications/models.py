@@ -1,3 +1,59 @@
+"""Notifications received by accounts."""
+
+from django.conf import settings
 from django.db import models
+from django_stubs_ext.db.models import TypedModelMeta
+
+
+class Notification(models.Model):
+    """Notification for an account, as returned by listNotifications."""
+
+    account = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="notifications",
+        db_index=False,
+    )
+    uri = models.CharField(max_length=512)
+    cid = models.CharField(max_length=255)
+    author_did = models.CharField(max_length=255)
+    author_handle = models.CharField(max_length=255)
+    author_name = models.CharField(max_length=640, blank=True)
+    reason = models.CharField(max_length=32)
+    reason_subject = models.CharField(max_length=512, blank=True)
+    record = models.JSONField(default=dict)
+    is_read = models.BooleanField(default=False)
+    indexed_at = models.DateTimeField()
+
+    class Meta(TypedModelMeta):
+        """Meta class for Notification."""
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "uri"], name="notification_account_uri"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["account", "-indexed_at"], name="notification_account_indexed"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """Reason and author."""
+        return f"{self.reason} from {self.author_handle}"
+
+
+class NotificationSync(models.Model):
+    """Polling state of an account's notifications."""
 
-# Create your models here.
+    account = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="notification_sync",
+    )
+    # Newest notification stored; polls stop paging once they reach it.
+    latest_indexed_at = models.DateTimeField(null=True, blank=True)
+    # Last time the account marked its notifications as seen.
+    seen_at = models.DateTimeField(null=True, blank=True)
+    polled_at = models.DateTimeField(null=True, blank=True)
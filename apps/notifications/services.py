@@ -0,0 +1,201 @@
+"""Notification polling.
+
+``poll_accounts`` polls accounts in batches, every account of a batch
+concurrently on ``ASYNC_BLUESKY``. Each poll stores the notifications newer
+than the last one seen and caches the account's unread count, which is what
+the nav badge reads, so page views never wait on the network for it.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import itertools
+import typing
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+from django.utils import timezone
+
+from apps.libs import ASYNC_BLUESKY, BLUESKY, get_logger
+from apps.libs import lexicons as bsky
+from apps.notifications.models import Notification, NotificationSync
+
+if typing.TYPE_CHECKING:
+    import uuid
+
+    from apps.accounts.models import Account
+
+logger = get_logger(__name__)
+
+OPTIONS = getattr(settings, "NOTIFICATIONS", {})
+
+PAGE_SIZE = 50
+MAX_PAGES = 4
+
+
+def cache() -> BaseCache:
+    """Cache holding the unread counts."""
+    return caches[OPTIONS.get("cache_alias", "default")]
+
+
+def unread_key(pk: "uuid.UUID") -> str:
+    """Cache key of an account's unread count."""
+    return f"hypersky:notifications:unread:{pk}"
+
+
+def set_unread_count(pk: "uuid.UUID", count: int) -> None:
+    """Cache the unread count of the account with primary key ``pk``."""
+    cache().set(unread_key(pk), count, timeout=OPTIONS.get("unread_ttl", 300))
+
+
+def get_unread_count(account: "Account") -> int:
+    """Cached unread count, counted from stored notifications on a miss."""
+    count = cache().get(unread_key(account.pk))
+    if count is None:
+        count = Notification.objects.filter(account=account, is_read=False).count()
+        set_unread_count(account.pk, count)
+
+    return count
+
+
+def store_notifications(
+    account: "Account", notifications: list[bsky.Notification]
+) -> None:
+    """Upsert ``notifications`` and move the account's polling state on."""
+    rows = {
+        item.uri: Notification(
+            account=account,
+            uri=item.uri,
+            cid=item.cid,
+            author_did=item.author.did,
+            author_handle=item.author.handle,
+            author_name=item.author.displayName or "",
+            reason=item.reason,
+            reason_subject=item.reasonSubject or "",
+            record=item.record,
+            is_read=item.isRead,
+            indexed_at=item.indexedAt,
+        )
+        for item in notifications
+    }
+
+    with transaction.atomic():
+        Notification.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=["account", "uri"],
+            update_fields=["is_read"],
+        )
+
+        state, _ = NotificationSync.objects.get_or_create(account=account)
+        if notifications:
+            latest = max(item.indexedAt for item in notifications)
+            state.latest_indexed_at = max(latest, state.latest_indexed_at or latest)
+        state.polled_at = timezone.now()
+        state.save(update_fields=["latest_indexed_at", "polled_at"])
+
+
+async def fetch_new_notifications(
+    token: str,
+    since: datetime.datetime | None,
+    max_pages: int = MAX_PAGES,
+    base_url: str | None = None,
+) -> list[bsky.Notification]:
+    """Notifications newer than ``since``, newest first."""
+    notifications: list[bsky.Notification] = []
+    cursor = None
+
+    for _ in range(max_pages):
+        page = await ASYNC_BLUESKY.call(
+            bsky.LIST_NOTIFICATIONS,
+            params=bsky.ListNotificationsParams(cursor=cursor, limit=PAGE_SIZE),
+            token=token,
+            base_url=base_url,
+        )
+        fresh = [
+            item
+            for item in page.notifications
+            if since is None or item.indexedAt > since
+        ]
+        notifications.extend(fresh)
+
+        if len(fresh) < len(page.notifications) or not page.cursor:
+            break
+        cursor = page.cursor
+
+    return notifications
+
+
+async def poll_account(account: "Account", max_pages: int = MAX_PAGES) -> int:
+    """Poll one account and return how many new notifications it got."""
+    state, _ = await NotificationSync.objects.aget_or_create(account=account)
+    token = await sync_to_async(account.fresh_access_token)()
+
+    unread, notifications = await asyncio.gather(
+        ASYNC_BLUESKY.call(
+            bsky.GET_UNREAD_COUNT, token=token, base_url=account.pds_endpoint
+        ),
+        fetch_new_notifications(
+            token, state.latest_indexed_at, max_pages, account.pds_endpoint
+        ),
+    )
+
+    await sync_to_async(store_notifications)(account, notifications)
+    set_unread_count(account.pk, unread.count)
+
+    return len(notifications)
+
+
+@dataclasses.dataclass
+class PollResult:
+    """Outcome of one ``poll_accounts`` round."""
+
+    accounts: int = 0
+    notifications: int = 0
+    errors: int = 0
+
+
+async def poll_accounts(
+    accounts: typing.Iterable["Account"], batch_size: int = 25
+) -> PollResult:
+    """Poll ``accounts`` in concurrent batches of ``batch_size``."""
+    result = PollResult()
+    for batch in itertools.batched(accounts, batch_size):
+        outcomes = await asyncio.gather(
+            *(poll_account(account) for account in batch), return_exceptions=True
+        )
+
+        for account, outcome in zip(batch, outcomes, strict=True):
+            result.accounts += 1
+            if isinstance(outcome, BaseException):
+                result.errors += 1
+                logger.error(
+                    "Polling notifications for %s: %s", account.handle, outcome
+                )
+            else:
+                result.notifications += outcome
+
+    return result
+
+
+def mark_seen(account: "Account") -> None:
+    """Mark every notification of ``account`` as seen, here and on the PDS."""
+    now = timezone.now()
+    BLUESKY.call(
+        bsky.UPDATE_SEEN,
+        body=bsky.UpdateSeenInput(seenAt=now),
+        token=account.fresh_access_token(),
+        base_url=account.pds_endpoint,
+    )
+
+    with transaction.atomic():
+        Notification.objects.filter(
+            account=account, is_read=False, indexed_at__lte=now
+        ).update(is_read=True)
+        NotificationSync.objects.update_or_create(
+            account=account, defaults={"seen_at": now}
+        )
+
+    set_unread_count(account.pk, 0)
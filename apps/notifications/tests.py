@@ -1,3 +1,197 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import logging
+from http import HTTPStatus
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse_lazy
+from faker import Faker
+
+from apps.accounts.models import Account
+from apps.libs import ASYNC_BLUESKY, BLUESKY
+from apps.libs import lexicons as bsky
+from apps.notifications.context_processors import unread_notifications
+from apps.notifications.models import Notification, NotificationSync
+from apps.notifications.services import (
+    get_unread_count,
+    poll_account,
+    poll_accounts,
+    set_unread_count,
+)
+
+fake = Faker()
+
+logging.disable(logging.CRITICAL)
+
+NOW = datetime.datetime(2024, 11, 20, 12, tzinfo=datetime.UTC)
+
+
+def create_account() -> Account:
+    return Account.auth.create_from_api(
+        email=fake.email(),
+        handle=fake.user_name(),
+        access=fake.sha256(raw_output=False),
+        refresh=fake.sha256(raw_output=False),
+    )
+
+
+def notification(minutes_ago: int, **kwargs) -> bsky.Notification:
+    return bsky.NotificationFactory.build(
+        indexedAt=NOW - datetime.timedelta(minutes=minutes_ago), **kwargs
+    )
+
+
+class FakeAppView:
+    """Stands in for ``ASYNC_BLUESKY.call``, tracking concurrent calls."""
+
+    def __init__(self, notifications, unread: int = 0) -> None:
+        self.notifications = notifications
+        self.unread = unread
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(
+        self, method, params=None, body=None, *, token=None, base_url=None
+    ) -> bsky.GetUnreadCountResponse | bsky.ListNotificationsResponse:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+        if method is bsky.GET_UNREAD_COUNT:
+            return bsky.GetUnreadCountResponse(count=self.unread)
+        return bsky.ListNotificationsResponse(notifications=self.notifications)
+
+
+class NotificationPollingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.account = create_account()
+        self.token = fake.sha256(raw_output=False)
+
+    async def test_poll_account(self):
+        appview = FakeAppView([notification(1), notification(2)], unread=2)
+
+        with mock.patch.object(ASYNC_BLUESKY, "call", appview):
+            new = await poll_account(self.account)
+
+        self.assertEqual(new, 2)
+        self.assertEqual(await Notification.objects.acount(), 2)
+        self.assertEqual(
+            cache.get(f"hypersky:notifications:unread:{self.account.pk}"), 2
+        )
+        state = await NotificationSync.objects.aget(account=self.account)
+        self.assertEqual(state.latest_indexed_at, NOW - datetime.timedelta(minutes=1))
+
+    async def test_poll_is_incremental(self):
+        seen = [notification(5)]
+        with mock.patch.object(ASYNC_BLUESKY, "call", FakeAppView(seen)):
+            await poll_account(self.account)
+
+        appview = FakeAppView([notification(1), *seen])
+        with mock.patch.object(ASYNC_BLUESKY, "call", appview):
+            new = await poll_account(self.account)
+
+        self.assertEqual(new, 1)
+        self.assertEqual(await Notification.objects.acount(), 2)
+
+    async def test_accounts_are_polled_concurrently_in_batches(self):
+        accounts = [self.account] + [
+            await Account.objects.acreate(
+                email=fake.email(), handle=fake.user_name(), access_token=self.token
+            )
+            for _ in range(4)
+        ]
+        appview = FakeAppView([])
+
+        with mock.patch.object(ASYNC_BLUESKY, "call", appview):
+            result = await poll_accounts(accounts, batch_size=2)
+
+        self.assertEqual((result.accounts, result.errors), (5, 0))
+        # Two accounts per batch, two calls per account.
+        self.assertEqual(appview.max_in_flight, 4)
+
+    async def test_failed_account_does_not_stop_the_batch(self):
+        appview = FakeAppView([])
+        other = await Account.objects.acreate(
+            email=fake.email(), handle=fake.user_name(), access_token=self.token
+        )
+
+        async def call(
+            method, *args, token=None, **kwargs
+        ) -> bsky.GetUnreadCountResponse | bsky.ListNotificationsResponse:
+            if token == self.token:
+                raise ConnectionError
+            return await appview(method, *args, token=token, **kwargs)
+
+        with mock.patch.object(ASYNC_BLUESKY, "call", call):
+            result = await poll_accounts([self.account, other])
+
+        self.assertEqual((result.accounts, result.errors), (2, 1))
+
+
+class UnreadCountTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.account = create_account()
+
+    def test_counts_stored_notifications_on_miss(self):
+        Notification.objects.create(
+            account=self.account, uri="at://n/1", indexed_at=NOW, reason="like"
+        )
+
+        self.assertEqual(get_unread_count(self.account), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.account), 1)
+
+    def test_context_processor_is_lazy_and_cached(self):
+        set_unread_count(self.account.pk, 3)
+        request = RequestFactory().get("/")
+        request.user = self.account
+
+        with self.assertNumQueries(0):
+            context = unread_notifications(request)
+            self.assertEqual(str(context["unread_notifications"]), "3")
+
+    def test_nav_badge(self):
+        set_unread_count(self.account.pk, 3)
+        self.client.force_login(self.account)
+
+        response = self.client.get(reverse_lazy("app"))
+
+        self.assertContains(response, ">3</span>")
+
+    def test_viewing_does_not_mark_seen(self):
+        Notification.objects.create(
+            account=self.account, uri="at://n/1", indexed_at=NOW, reason="like"
+        )
+        set_unread_count(self.account.pk, 1)
+        self.client.force_login(self.account)
+
+        with mock.patch.object(BLUESKY, "call") as call:
+            response = self.client.get(reverse_lazy("notifications"))
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, reverse_lazy("notifications_seen"))
+        call.assert_not_called()
+        self.assertEqual(get_unread_count(self.account), 1)
+
+    def test_mark_seen(self):
+        Notification.objects.create(
+            account=self.account, uri="at://n/1", indexed_at=NOW, reason="like"
+        )
+        set_unread_count(self.account.pk, 1)
+        self.client.force_login(self.account)
+
+        with mock.patch.object(BLUESKY, "call") as call:
+            response = self.client.post(
+                reverse_lazy("notifications_seen"), headers={"HX-Request": "true"}
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'hx-swap-oob="true"')
+        self.assertIs(call.call_args.args[0], bsky.UPDATE_SEEN)
+        self.assertEqual(get_unread_count(self.account), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
@@ -0,0 +1,10 @@
+"""Notifications URL Configuration."""
+
+from django.urls import path
+
+from apps.notifications.views import MarkSeenView, NotificationsView
+
+urlpatterns = [
+    path("", NotificationsView.as_view(), name="notifications"),
+    path("seen/", MarkSeenView.as_view(), name="notifications_seen"),
+]
@@ -1,3 +1,60 @@
-from django.shortcuts import render
+"""Notification views."""
 
-# Create your views here.
+from django import views
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+
+from apps.libs.authentication import get_account
+from apps.notifications.models import Notification
+from apps.notifications.services import get_unread_count, mark_seen
+
+
+class NotificationsView(views.View):
+    """Recent notifications, from the local store.
+
+    The page marks them as seen once loaded, with a POST to ``MarkSeenView``,
+    so prefetching or re-requesting it changes nothing.
+    """
+
+    template_name = "notifications.dj"
+    limit = 50
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Get request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        notifications = list(
+            Notification.objects.filter(account=account).order_by("-indexed_at")[
+                : self.limit
+            ]
+        )
+
+        return render(
+            request,
+            template_name=self.template_name,
+            context={
+                "notifications": notifications,
+                "unread": get_unread_count(account),
+            },
+        )
+
+
+class MarkSeenView(views.View):
+    """Mark every notification as seen, which also resets the nav badge."""
+
+    partial_template_name = "partials/notifications_seen.dj"
+
+    def post(self, request: HttpRequest) -> HttpResponse:
+        """Post request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        if get_unread_count(account):
+            mark_seen(account)
+
+        if not request.htmx:
+            return redirect(reverse("notifications"))
+
+        return render(request, template_name=self.partial_template_name)
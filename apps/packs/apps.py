@@ -3,4 +3,4 @@ from django.apps import AppConfig
 
 class PacksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "packs"
+    name = "apps.packs"
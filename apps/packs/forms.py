@@ -0,0 +1,22 @@
+"""Starter pack forms."""
+
+from django import forms
+
+from apps.libs.identity import ResolutionError
+from apps.packs.services import parse_pack_uri
+
+
+class PackForm(forms.Form):
+    """Starter pack to open, by bsky.app URL or AT URI."""
+
+    pack = forms.CharField(
+        max_length=512,
+        help_text="https://bsky.app/starter-pack/<handle>/<id> or an at:// URI.",
+    )
+
+    def clean_pack(self) -> str:
+        """AT URI of the pack."""
+        try:
+            return parse_pack_uri(self.cleaned_data["pack"])
+        except (ValueError, ResolutionError) as exc:
+            raise forms.ValidationError(str(exc)) from exc
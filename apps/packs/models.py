@@ -1,3 +1,52 @@
+"""Starter pack follow-all jobs."""
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class FollowAll(models.Model):
+    """Follows being created for every member of a starter pack."""
+
+    account = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="follow_alls"
+    )
+    pack_uri = models.CharField(max_length=512)
+    pack_name = models.CharField(max_length=255, blank=True)
+    # DIDs still to follow; members already followed are never queued.
+    pending = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    followed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # Set when the PDS rate limited us; the next step waits until then.
+    retry_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        """Progress of the job."""
+        return f"{self.pack_name or self.pack_uri}: {self.processed}/{self.total}"
+
+    @property
+    def processed(self) -> int:
+        """Members handled so far."""
+        return self.total - len(self.pending)
+
+    @property
+    def done(self) -> bool:
+        """Whether every member was handled."""
+        return not self.pending
+
+    @property
+    def percent(self) -> int:
+        """Progress, in percent."""
+        return 100 * self.processed // self.total if self.total else 100
+
+    @property
+    def retry_in(self) -> int:
+        """Seconds until the job may write again after being rate limited."""
+        if self.retry_at is None:
+            return 0
 
-# Create your models here.
+        return max(0, int((self.retry_at - timezone.now()).total_seconds()) + 1)
@@ -0,0 +1,261 @@
+"""Starter packs and "follow all".
+
+Following everyone in a pack resolves the pack's list, diffs it against the
+account's follows from ``FOLLOW_GRAPH``, and creates only the missing
+``app.bsky.graph.follow`` records. Those go out in ``applyWrites`` batches
+of 200, a few batches at a time on a thread pool, one step per request so
+the page can show progress. When the PDS still answers 429 after
+the scheduler's retries, the job records when to try again and keeps the
+rejected batches pending.
+"""
+
+import concurrent.futures
+import datetime
+import itertools
+import re
+import typing
+
+import httpx
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts.graph import FOLLOW_GRAPH
+from apps.libs import BLUESKY, get_logger
+from apps.libs import lexicons as bsky
+from apps.libs.identity import IDENTITY, is_did
+from apps.libs.scheduling import parse_reset, parse_retry_after
+from apps.packs.models import FollowAll
+
+if typing.TYPE_CHECKING:
+    from apps.accounts.models import Account
+
+logger = get_logger(__name__)
+
+OPTIONS = getattr(settings, "PACKS", {})
+
+FOLLOW = "app.bsky.graph.follow"
+STARTERPACK = "app.bsky.graph.starterpack"
+
+PAGE_SIZE = 100
+
+# Seconds to wait after a 429 that didn't say for how long.
+DEFAULT_RETRY = 60.0
+
+PACK_URL = re.compile(
+    r"^https://bsky\.app/starter-pack/(?P<actor>[^/]+)/(?P<rkey>[^/?#]+)"
+)
+
+
+def parse_pack_uri(value: str) -> str:
+    """AT URI of a starter pack, from its AT URI or its bsky.app URL.
+
+    Raises:
+        ValueError: If ``value`` is neither.
+    """
+    value = value.strip()
+    if value.startswith("at://") and f"/{STARTERPACK}/" in value:
+        return value
+
+    if match := PACK_URL.match(value):
+        actor = match["actor"]
+        did = actor if is_did(actor) else IDENTITY.resolve_handle(actor)
+        return f"at://{did}/{STARTERPACK}/{match['rkey']}"
+
+    raise ValueError(f"Not a starter pack: {value}")
+
+
+def get_pack(account: "Account", uri: str) -> bsky.StarterPackView:
+    """Starter pack at ``uri``."""
+    return BLUESKY.call(
+        bsky.GET_STARTER_PACK,
+        params=bsky.GetStarterPackParams(starterPack=uri),
+        token=account.fresh_access_token(),
+        base_url=account.pds_endpoint,
+    ).starterPack
+
+
+def get_packs(account: "Account") -> list[bsky.StarterPackViewBasic]:
+    """Starter packs created by the account."""
+    return BLUESKY.call(
+        bsky.GET_ACTOR_STARTER_PACKS,
+        params=bsky.GetActorStarterPacksParams(actor=account.did),
+        token=account.fresh_access_token(),
+        base_url=account.pds_endpoint,
+    ).starterPacks
+
+
+def pack_members(account: "Account", pack: bsky.StarterPackView) -> list[str]:
+    """DIDs of everyone in ``pack``'s list, in list order."""
+    if pack.list is None:
+        return []
+
+    dids: list[str] = []
+    cursor = None
+    while True:
+        response = BLUESKY.call(
+            bsky.GET_LIST,
+            params=bsky.GetListParams(
+                list=pack.list.uri, limit=PAGE_SIZE, cursor=cursor
+            ),
+            token=account.fresh_access_token(),
+            base_url=account.pds_endpoint,
+        )
+        dids.extend(item.subject.did for item in response.items)
+        cursor = response.cursor
+        if not cursor or not response.items:
+            return list(dict.fromkeys(dids))
+
+
+def start_follow_all(account: "Account", uri: str) -> FollowAll:
+    """Queue a follow of every member of the pack at ``uri`` not followed yet."""
+    pack = get_pack(account, uri)
+    members = pack_members(account, pack)
+    follows = FOLLOW_GRAPH.follows(account)
+    pending = [did for did in members if did not in follows and did != account.did]
+
+    return FollowAll.objects.create(
+        account=account,
+        pack_uri=pack.uri,
+        pack_name=pack.name,
+        pending=pending,
+        total=len(members),
+        skipped=len(members) - len(pending),
+    )
+
+
+def retry_delay(response: httpx.Response) -> float:
+    """Seconds to wait before writing again after ``response``, a 429."""
+    return (
+        parse_retry_after(response.headers.get("retry-after"))
+        or parse_reset(response.headers.get("ratelimit-reset"))
+        or DEFAULT_RETRY
+    )
+
+
+def follow(account: "Account", token: str, dids: tuple[str, ...]) -> None:
+    """Create follow records of ``dids`` in one ``applyWrites`` call."""
+    now = timezone.now().isoformat()
+    BLUESKY.call(
+        bsky.APPLY_WRITES,
+        body=bsky.ApplyWritesInput(
+            repo=account.did,
+            writes=[
+                bsky.Create(
+                    collection=FOLLOW,
+                    value={"$type": FOLLOW, "subject": did, "createdAt": now},
+                )
+                for did in dids
+            ],
+        ),
+        token=token,
+        base_url=account.pds_endpoint,
+    )
+
+
+def claim_batches(pk: int) -> tuple[FollowAll, list[str]]:
+    """Take the DIDs of the next step off the pending ones of a ``FollowAll``.
+
+    The row is only locked while claiming, so no transaction stays open
+    during the ``applyWrites`` calls. Nothing is claimed while the job waits
+    out a rate limit.
+    """
+    with transaction.atomic():
+        job = FollowAll.objects.select_for_update().select_related("account").get(pk=pk)
+        if job.done or (job.retry_at and job.retry_at > timezone.now()):
+            return job, []
+
+        count = OPTIONS.get("batch_size", bsky.MAX_WRITES) * OPTIONS.get(
+            "concurrency", 4
+        )
+        claimed = job.pending[:count]
+        job.pending = job.pending[count:]
+        job.save(update_fields=["pending", "updated_at"])
+
+    return job, claimed
+
+
+def follow_batches(
+    job: FollowAll, dids: list[str]
+) -> tuple[list[str], list[str], int, float]:
+    """Follow ``dids`` in concurrent batches.
+
+    Returns the DIDs followed, the ones rate limited, how many failed
+    otherwise, and the seconds to wait before retrying the rate limited ones.
+    """
+    account = job.account
+    batches = list(itertools.batched(dids, OPTIONS.get("batch_size", bsky.MAX_WRITES)))
+    # Worker threads cannot use this connection; refresh the token here.
+    token = account.fresh_access_token()
+
+    followed: list[str] = []
+    retry: list[str] = []
+    failed = 0
+    delay = 0.0
+    with concurrent.futures.ThreadPoolExecutor(len(batches)) as executor:
+        futures = {
+            executor.submit(follow, account, token, batch): batch for batch in batches
+        }
+        for future, batch in futures.items():
+            try:
+                future.result()
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code != httpx.codes.TOO_MANY_REQUESTS:
+                    logger.warning("Follow all %s: batch failed: %s", job.pk, exc)
+                    failed += len(batch)
+                    continue
+                retry.extend(batch)
+                delay = max(delay, retry_delay(exc.response))
+            except httpx.HTTPError as exc:
+                logger.warning("Follow all %s: batch failed: %s", job.pk, exc)
+                failed += len(batch)
+            else:
+                followed.extend(batch)
+
+    return followed, retry, failed, delay
+
+
+def step_follow_all(pk: int) -> FollowAll:
+    """Send the next batches of a ``FollowAll`` and return its progress.
+
+    Each step sends up to ``concurrency`` batches of ``batch_size`` follows
+    at once. Rate-limited batches stay pending until ``retry_at``; batches
+    failing otherwise are counted as failed and dropped. The batches are
+    claimed, sent and recorded in separate steps, so the row lock is never
+    held across calls; if sending fails outright, the claimed DIDs are put
+    back.
+    """
+    job, claimed = claim_batches(pk)
+    if not claimed:
+        return job
+
+    try:
+        followed, retry, failed, delay = follow_batches(job, claimed)
+    except Exception:
+        with transaction.atomic():
+            job = FollowAll.objects.select_for_update().get(pk=pk)
+            job.pending = claimed + job.pending
+            job.save(update_fields=["pending", "updated_at"])
+        raise
+
+    with transaction.atomic():
+        job = FollowAll.objects.select_for_update().select_related("account").get(pk=pk)
+        job.followed += len(followed)
+        job.failed += failed
+        job.pending = retry + job.pending
+        job.retry_at = (
+            timezone.now() + datetime.timedelta(seconds=delay) if retry else None
+        )
+        job.save(
+            update_fields=[
+                "pending",
+                "followed",
+                "failed",
+                "retry_at",
+                "updated_at",
+            ]
+        )
+
+    FOLLOW_GRAPH.add(job.account, followed)
+    logger.info("Follow all %s: %d followed", job, len(followed))
+    return job
@@ -1,3 +1,250 @@
+import datetime
+import logging
+import threading
+from http import HTTPStatus
+from unittest import mock
+
+import httpx
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse_lazy
+from django.utils import timezone
+from faker import Faker
+
+from apps.accounts.graph import FOLLOW_GRAPH
+from apps.accounts.models import Account
+from apps.libs import BLUESKY
+from apps.libs import lexicons as bsky
+from apps.libs.services import BlueSkyService
+from apps.packs import services
+from apps.packs.models import FollowAll
+from apps.packs.services import parse_pack_uri, start_follow_all, step_follow_all
+
+fake = Faker()
+
+logging.disable(logging.CRITICAL)
+
+PACK = "at://did:plc:creator/app.bsky.graph.starterpack/abc"
+LIST = "at://did:plc:creator/app.bsky.graph.list/abc"
+
+
+def profile(did: str) -> bsky.ProfileViewBasic:
+    """Profile of ``did``."""
+    return bsky.ProfileViewBasicFactory.build(did=did, handle=f"{did[8:]}.test")
+
+
+class FakeAppView:
+    """Stands in for ``BLUESKY.call``: a pack of ``members``, ``follows`` and writes."""
+
+    def __init__(self, members: list[str], follows: list[str]) -> None:
+        self.members = members
+        self.follows = follows
+        self.calls: dict[str, int] = {}
+        self.writes: list[list[bsky.Create]] = []
+        self.limited = 0
+        self.lock = threading.Lock()
+
+    def page[T](self, items: list[T], cursor: str | None) -> tuple[list[T], str | None]:
+        start = int(cursor or 0)
+        end = start + 100
+        return items[start:end], str(end) if end < len(items) else None
+
+    def __call__(
+        self, method, params=None, body=None, *, token=None, base_url=None
+    ) -> object:
+        with self.lock:
+            self.calls[method.nsid] = self.calls.get(method.nsid, 0) + 1
+
+        if method is bsky.GET_STARTER_PACK:
+            return bsky.GetStarterPackResponse(
+                starterPack=bsky.StarterPackView(
+                    uri=params.starterPack,
+                    cid=fake.sha256(),
+                    record={"name": "Birders", "list": LIST},
+                    creator=profile("did:plc:creator"),
+                    list=bsky.ListViewBasic(
+                        uri=LIST, cid=fake.sha256(), name="Birders", purpose="ref"
+                    ),
+                )
+            )
+
+        if method is bsky.GET_LIST:
+            items, cursor = self.page(self.members, params.cursor)
+            return bsky.GetListResponse(
+                cursor=cursor,
+                items=[bsky.ListItemView(uri=LIST, subject=profile(d)) for d in items],
+                list=bsky.ListViewBasic(
+                    uri=LIST, cid=fake.sha256(), name="Birders", purpose="ref"
+                ),
+            )
+
+        if method is bsky.GET_FOLLOWS:
+            follows, cursor = self.page(self.follows, params.cursor)
+            return bsky.GetFollowsResponse(
+                subject=profile(params.actor),
+                cursor=cursor,
+                follows=[profile(did) for did in follows],
+            )
+
+        with self.lock:
+            if self.limited:
+                self.limited -= 1
+                request = httpx.Request("POST", "https://pds.test")
+                response = httpx.Response(
+                    429, headers={"Retry-After": "30"}, request=request
+                )
+                raise httpx.HTTPStatusError(
+                    "Too Many Requests", request=request, response=response
+                )
+            self.writes.append(body.writes)
+
+        return bsky.ApplyWritesOutput()
+
+
+class PacksTestCase(TestCase):
+    def setUp(self):
+        FOLLOW_GRAPH.clear()
+        self.account = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(raw_output=False),
+            refresh=fake.sha256(raw_output=False),
+            did="did:plc:owner",
+        )
+        members = [f"did:plc:{i}" for i in range(1000)] + ["did:plc:owner"]
+        self.appview = FakeAppView(members, follows=members[:150])
+        patcher = mock.patch.object(BLUESKY, "call", self.appview)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.headers = {"Authorization": f"Bearer {self.account.access_token}"}
+
+    def test_parse_pack_uri(self):
+        self.assertEqual(parse_pack_uri(PACK), PACK)
+        self.assertEqual(
+            parse_pack_uri("https://bsky.app/starter-pack/did:plc:creator/abc"), PACK
+        )
+        with mock.patch(
+            "apps.packs.services.IDENTITY.resolve_handle",
+            return_value="did:plc:creator",
+        ):
+            self.assertEqual(
+                parse_pack_uri("https://bsky.app/starter-pack/creator.test/abc"), PACK
+            )
+        with self.assertRaises(ValueError):
+            parse_pack_uri("https://bsky.app/profile/creator.test")
+
+    def test_follow_all_skips_existing_follows(self):
+        job = start_follow_all(self.account, PACK)
+
+        self.assertEqual((job.total, job.skipped, len(job.pending)), (1001, 151, 850))
+        self.assertNotIn("did:plc:owner", job.pending)
+
+        job = step_follow_all(job.pk)
+        self.assertEqual((job.followed, len(self.appview.writes)), (800, 4))
+
+        job = step_follow_all(job.pk)
+        self.assertTrue(job.done)
+        self.assertEqual(job.followed, 850)
+        self.assertEqual(self.appview.writes[-1][0].value["subject"], "did:plc:950")
+        followed = {w.value["subject"] for ws in self.appview.writes for w in ws}
+        self.assertEqual(len(followed), 850)
+        self.assertNotIn("did:plc:0", followed)
+        self.assertTrue(
+            all(did in FOLLOW_GRAPH.follows(self.account) for did in followed)
+        )
+        self.assertEqual(self.appview.calls[bsky.GET_FOLLOWS.nsid], 2)
+
+    def test_follows_are_sent_outside_the_row_lock(self):
+        job = start_follow_all(self.account, PACK)
+        atomic_blocks = []
+
+        def follow_batches(*args) -> tuple:
+            atomic_blocks.append(len(connection.atomic_blocks))
+            return follow(*args)
+
+        follow = services.follow_batches
+        with mock.patch.object(services, "follow_batches", follow_batches):
+            expected = len(connection.atomic_blocks)
+            step_follow_all(job.pk)
+
+        self.assertEqual(atomic_blocks, [expected])
+
+    def test_failed_step_puts_batches_back(self):
+        job = start_follow_all(self.account, PACK)
+        pending = job.pending
+
+        with (
+            mock.patch.object(
+                Account, "fresh_access_token", side_effect=httpx.ConnectError("")
+            ),
+            self.assertRaises(httpx.ConnectError),
+        ):
+            step_follow_all(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.pending, pending)
+
+    def test_rate_limited_batches_wait(self):
+        job = start_follow_all(self.account, PACK)
+        self.appview.limited = 1
+
+        job = step_follow_all(job.pk)
+
+        self.assertEqual((job.followed, len(job.pending)), (600, 250))
+        self.assertGreater(
+            job.retry_at, timezone.now() + datetime.timedelta(seconds=25)
+        )
+        self.assertEqual(step_follow_all(job.pk).followed, 600)
+
+        FollowAll.objects.filter(pk=job.pk).update(retry_at=timezone.now())
+        job = step_follow_all(job.pk)
+        self.assertTrue(job.done)
+        self.assertEqual(job.followed, 850)
+
+    def test_htmx_follow_all_progress(self):
+        response = self.client.post(
+            reverse_lazy("follow_all"),
+            {"uri": PACK},
+            headers={**self.headers, "HX-Request": "true"},
+        )
+        self.assertContains(response, "151 of 1001")
+        self.assertContains(response, 'hx-trigger="load"')
+        job = FollowAll.objects.get()
+
+        progress = reverse_lazy("follow_all_progress", args=[job.pk])
+        response = self.client.post(progress, headers=self.headers)
+        self.assertContains(response, "951 of 1001")
+
+        response = self.client.post(progress, headers=self.headers)
+        self.assertContains(response, "Followed 850 of 1001, 151 already followed")
+
+    def test_rate_limited_follow_all(self):
+        service = BlueSkyService(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(429, headers={"Retry-After": "120"})
+            )
+        )
+
+        with mock.patch("apps.packs.services.BLUESKY", service):
+            response = self.client.post(
+                reverse_lazy("follow_all"), {"uri": PACK}, headers=self.headers
+            )
+            partial = self.client.post(
+                reverse_lazy("follow_all"),
+                {"uri": PACK},
+                headers={**self.headers, "HX-Request": "true"},
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "120")
+        self.assertTemplateUsed(response, "upstream_error.dj")
+        self.assertContains(partial, "Try again in 120 seconds")
+        self.assertFalse(FollowAll.objects.exists())
+
+    def test_pack_detail(self):
+        response = self.client.get(
+            reverse_lazy("pack_detail"), {"uri": PACK}, headers=self.headers
+        )
 
-# Create your tests here.
+        self.assertContains(response, "Birders")
+        self.assertContains(response, "1001 people")
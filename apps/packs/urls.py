@@ -0,0 +1,19 @@
+"""Starter packs URL Configuration."""
+
+from django.urls import path
+
+from apps.packs.views import (
+    FollowAllProgressView,
+    FollowAllView,
+    PackDetailView,
+    PacksView,
+)
+
+urlpatterns = [
+    path("", PacksView.as_view(), name="packs"),
+    path("pack/", PackDetailView.as_view(), name="pack_detail"),
+    path("follow/", FollowAllView.as_view(), name="follow_all"),
+    path(
+        "follow/<int:pk>/", FollowAllProgressView.as_view(), name="follow_all_progress"
+    ),
+]
@@ -1,3 +1,128 @@
-from django.shortcuts import render
+"""Starter pack views."""
 
-# Create your views here.
+import urllib.parse
+
+import httpx
+from django import views
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+
+from apps.libs.authentication import get_account
+from apps.libs.views import upstream_error
+from apps.packs.forms import PackForm
+from apps.packs.models import FollowAll
+from apps.packs.services import (
+    get_pack,
+    get_packs,
+    pack_members,
+    start_follow_all,
+    step_follow_all,
+)
+
+
+class PacksView(views.View):
+    """Starter packs of the account, and a form to open any pack."""
+
+    template_name = "packs.dj"
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Get request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        form = PackForm(request.GET) if "pack" in request.GET else PackForm()
+        if form.is_bound and form.is_valid():
+            query = urllib.parse.urlencode({"uri": form.cleaned_data["pack"]})
+            return redirect(f"{reverse('pack_detail')}?{query}")
+
+        try:
+            packs = get_packs(account)
+        except httpx.HTTPError as exc:
+            return upstream_error(request, exc)
+
+        return render(
+            request,
+            template_name=self.template_name,
+            context={"packs": packs, "form": form},
+        )
+
+
+class PackDetailView(views.View):
+    """A starter pack, its members and the "follow all" button."""
+
+    template_name = "pack_detail.dj"
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Get request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        try:
+            pack = get_pack(account, request.GET.get("uri", ""))
+            members = pack_members(account, pack)
+        except httpx.HTTPError as exc:
+            return upstream_error(request, exc)
+
+        return render(
+            request,
+            template_name=self.template_name,
+            context={"pack": pack, "members": members},
+        )
+
+
+class FollowAllView(views.View):
+    """Start following everyone in a starter pack.
+
+    Follows go out a few ``applyWrites`` batches per request: HTMX keeps
+    requesting the progress partial, which advances the job, until done.
+    """
+
+    partial_template_name = "partials/follow_all.dj"
+
+    def post(self, request: HttpRequest) -> HttpResponse:
+        """Queue the pack members not followed yet."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        try:
+            job = start_follow_all(account, request.POST.get("uri", ""))
+            if not request.htmx:
+                job = step_follow_all(job.pk)
+                return redirect(reverse("follow_all_progress", args=[job.pk]))
+        except httpx.HTTPError as exc:
+            return upstream_error(request, exc)
+
+        return render(
+            request, template_name=self.partial_template_name, context={"job": job}
+        )
+
+
+class FollowAllProgressView(views.View):
+    """Progress of a "follow all", advanced on every POST."""
+
+    template_name = "follow_all.dj"
+    partial_template_name = "partials/follow_all.dj"
+
+    def get(self, request: HttpRequest, pk: int) -> HttpResponse:
+        """Get request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        job = get_object_or_404(FollowAll, pk=pk, account=account)
+        return render(request, template_name=self.template_name, context={"job": job})
+
+    def post(self, request: HttpRequest, pk: int) -> HttpResponse:
+        """Post request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        job = get_object_or_404(FollowAll, pk=pk, account=account)
+        try:
+            job = step_follow_all(job.pk)
+        except httpx.HTTPError as exc:
+            return upstream_error(request, exc)
+
+        return render(
+            request, template_name=self.partial_template_name, context={"job": job}
+        )
@@ -1,19 +1,20 @@
 """App pages views."""
 
 from django import views
-from django.contrib.auth import authenticate
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
 
+from apps.libs.authentication import get_account
+
 
 class HomePageView(views.View):
     """Home page view."""
 
     def get(self, request: HttpRequest) -> HttpResponse:
         """Get request."""
-        if authenticate(request):
+        if get_account(request):
             return redirect(reverse("app"))
 
         return render(request, template_name="home.dj")
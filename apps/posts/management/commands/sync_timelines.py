@@ -0,0 +1,40 @@
+"""Sync account timelines into the local post store."""
+
+import httpx
+from django.core.management.base import BaseCommand, CommandParser
+
+from apps.accounts.models import Account
+from apps.posts.services import BATCH_SIZE, MAX_PAGES, sync_timeline
+
+
+class Command(BaseCommand):
+    """Fetch new timeline entries for every account, or the given handles."""
+
+    help = "Incrementally sync home timelines into the local post store."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Add command arguments."""
+        parser.add_argument("handles", nargs="*")
+        parser.add_argument("--pages", type=int, default=MAX_PAGES)
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options) -> None:
+        """Sync the selected accounts."""
+        accounts = Account.objects.exclude(access_token="")
+        if options["handles"]:
+            accounts = accounts.filter(handle__in=options["handles"])
+
+        for account in accounts.iterator():
+            try:
+                result = sync_timeline(
+                    account,
+                    max_pages=options["pages"],
+                    batch_size=options["batch_size"],
+                )
+            except httpx.HTTPError as exc:
+                self.stderr.write(f"{account.handle}: {exc}")
+                continue
+
+            self.stdout.write(
+                f"{account.handle}: {result.entries} entries in {result.pages} pages"
+            )
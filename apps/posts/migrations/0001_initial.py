@@ -0,0 +1,73 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Author',
+            fields=[
+                ('did', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('handle', models.CharField(max_length=255)),
+                ('display_name', models.CharField(blank=True, max_length=640)),
+                ('avatar', models.URLField(blank=True, max_length=1024)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Post',
+            fields=[
+                ('uri', models.CharField(max_length=512, primary_key=True, serialize=False)),
+                ('cid', models.CharField(max_length=255)),
+                ('text', models.TextField(blank=True)),
+                ('record', models.JSONField(default=dict)),
+                ('reply_count', models.PositiveIntegerField(default=0)),
+                ('repost_count', models.PositiveIntegerField(default=0)),
+                ('like_count', models.PositiveIntegerField(default=0)),
+                ('quote_count', models.PositiveIntegerField(default=0)),
+                ('indexed_at', models.DateTimeField()),
+                ('author', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to='posts.author')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indexed_at', models.DateTimeField()),
+                ('reason', models.JSONField(blank=True, null=True)),
+                ('account', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TimelineSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latest_indexed_at', models.DateTimeField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_sync', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-indexed_at'], name='post_author_indexed_at'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['account', '-indexed_at', '-id'], name='timeline_account_indexed_at'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('account', 'post'), name='timeline_entry_account_post'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelinesync',
+            name='gap_cursor',
+            field=models.CharField(blank=True, max_length=512),
+        ),
+        migrations.AddField(
+            model_name='timelinesync',
+            name='gap_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,105 @@
+"""Local store of posts seen in account timelines."""
+
+from django.conf import settings
 from django.db import models
+from django_stubs_ext.db.models import TypedModelMeta
+
+
+class Author(models.Model):
+    """Bluesky profile, keyed by DID."""
+
+    did = models.CharField(max_length=255, primary_key=True)
+    handle = models.CharField(max_length=255)
+    display_name = models.CharField(max_length=640, blank=True)
+    avatar = models.URLField(max_length=1024, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        """Handle of the author."""
+        return self.handle
+
+    @property
+    def name(self) -> str:
+        """Display name, falling back to the handle."""
+        return self.display_name or self.handle
+
+
+class Post(models.Model):
+    """Post record, keyed by AT URI, at the version identified by ``cid``."""
+
+    uri = models.CharField(max_length=512, primary_key=True)
+    cid = models.CharField(max_length=255)
+    # Covered by the (author, indexed_at) index below.
+    author = models.ForeignKey(
+        Author, on_delete=models.CASCADE, related_name="posts", db_index=False
+    )
+    text = models.TextField(blank=True)
+    record = models.JSONField(default=dict)
+    reply_count = models.PositiveIntegerField(default=0)
+    repost_count = models.PositiveIntegerField(default=0)
+    like_count = models.PositiveIntegerField(default=0)
+    quote_count = models.PositiveIntegerField(default=0)
+    indexed_at = models.DateTimeField()
+    # When the row was first stored here, whatever the AppView's indexedAt;
+    # the live pump follows it.
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta(TypedModelMeta):
+        """Meta class for Post."""
+
+        indexes = [
+            models.Index(
+                fields=["author", "-indexed_at"], name="post_author_indexed_at"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """AT URI of the post."""
+        return self.uri
+
+
+class TimelineEntry(models.Model):
+    """A post as it appears in an account's home timeline."""
+
+    account = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        db_index=False,
+    )
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    # Repost time for reposts, otherwise the post's indexed_at.
+    indexed_at = models.DateTimeField()
+    reason = models.JSONField(null=True, blank=True)
+
+    class Meta(TypedModelMeta):
+        """Meta class for TimelineEntry."""
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "post"], name="timeline_entry_account_post"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["account", "-indexed_at", "-id"],
+                name="timeline_account_indexed_at",
+            ),
+        ]
+
+
+class TimelineSync(models.Model):
+    """Incremental sync state of an account's timeline."""
 
-# Create your models here.
+    account = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline_sync",
+    )
+    # Newest entry stored so far; syncs stop paging once they reach it.
+    latest_indexed_at = models.DateTimeField(null=True, blank=True)
+    # Set when a sync ran out of pages before reaching the stored entries: the
+    # cursor to resume paging from, and the entry time to page down to.
+    gap_cursor = models.CharField(max_length=512, blank=True)
+    gap_until = models.DateTimeField(null=True, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
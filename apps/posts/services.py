@@ -0,0 +1,272 @@
+"""Timeline sync.
+
+``sync_timeline`` pages through ``app.bsky.feed.getTimeline`` from the top
+until it reaches entries that are already stored, then upserts the new
+authors, posts and timeline entries in batches. Timeline views can then be
+served from the database.
+
+A sync fetches at most ``max_pages`` pages. If it runs out before reaching the
+stored entries, the rest is recorded as a gap on ``TimelineSync``, and the
+next syncs page through it before fetching anything newer.
+"""
+
+import dataclasses
+import datetime
+import typing
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.libs import BLUESKY, get_logger
+from apps.libs.lexicons import GET_TIMELINE, FeedViewPost, GetTimelineParams
+from apps.libs.profiles import PROFILES
+from apps.posts.models import Author, Post, TimelineEntry, TimelineSync
+
+if typing.TYPE_CHECKING:
+    from apps.accounts.models import Account
+
+logger = get_logger(__name__)
+
+PAGE_SIZE = 100
+MAX_PAGES = 10
+BATCH_SIZE = 500
+
+
+@dataclasses.dataclass
+class SyncResult:
+    """Outcome of one ``sync_timeline`` run."""
+
+    pages: int = 0
+    entries: int = 0
+    # Where paging stopped when ``max_pages`` ran out first.
+    cursor: str | None = None
+
+
+def fetch_new_entries(
+    account: "Account",
+    since: datetime.datetime | None,
+    max_pages: int = MAX_PAGES,
+    result: SyncResult | None = None,
+    cursor: str | None = None,
+) -> list[FeedViewPost]:
+    """Timeline entries newer than ``since``, newest first.
+
+    Paging starts at ``cursor``, or at the top. ``result.cursor`` is left set
+    to the next page if ``max_pages`` runs out before ``since`` is reached.
+    """
+    result = result or SyncResult()
+    entries: list[FeedViewPost] = []
+
+    while result.pages < max_pages:
+        page = BLUESKY.call(
+            GET_TIMELINE,
+            params=GetTimelineParams(cursor=cursor, limit=PAGE_SIZE),
+            token=account.fresh_access_token(),
+            base_url=account.pds_endpoint,
+        )
+        result.pages += 1
+
+        fresh = [item for item in page.feed if since is None or item.sort_at > since]
+        entries.extend(fresh)
+
+        if len(fresh) < len(page.feed) or not page.cursor:
+            result.cursor = None
+            return entries
+        cursor = page.cursor
+
+    result.cursor = cursor
+    return entries
+
+
+def store_entries(
+    account: "Account", entries: list[FeedViewPost], batch_size: int = BATCH_SIZE
+) -> None:
+    """Upsert the authors, posts and timeline entries of ``entries``."""
+    authors = {
+        item.post.author.did: Author(
+            did=item.post.author.did,
+            handle=item.post.author.handle,
+            display_name=item.post.author.displayName or "",
+            avatar=item.post.author.avatar or "",
+        )
+        for item in entries
+    }
+    posts = {
+        item.post.uri: Post(
+            uri=item.post.uri,
+            cid=item.post.cid,
+            author_id=item.post.author.did,
+            text=item.post.text,
+            record=item.post.record,
+            reply_count=item.post.replyCount,
+            repost_count=item.post.repostCount,
+            like_count=item.post.likeCount,
+            quote_count=item.post.quoteCount,
+            indexed_at=item.post.indexedAt,
+        )
+        for item in entries
+    }
+    # Newest first, so a post reposted several times keeps its latest entry.
+    timeline = {}
+    for item in entries:
+        timeline.setdefault(
+            item.post.uri,
+            TimelineEntry(
+                account=account,
+                post_id=item.post.uri,
+                indexed_at=item.sort_at,
+                reason=item.reason,
+            ),
+        )
+
+    with transaction.atomic():
+        Author.objects.bulk_create(
+            authors.values(),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["did"],
+            update_fields=["handle", "display_name", "avatar", "updated_at"],
+        )
+        Post.objects.bulk_create(
+            posts.values(),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["uri"],
+            update_fields=[
+                "cid",
+                "text",
+                "record",
+                "reply_count",
+                "repost_count",
+                "like_count",
+                "quote_count",
+            ],
+        )
+        TimelineEntry.objects.bulk_create(
+            timeline.values(),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["account", "post"],
+            update_fields=["indexed_at", "reason"],
+        )
+
+
+def sync_timeline(
+    account: "Account", max_pages: int = MAX_PAGES, batch_size: int = BATCH_SIZE
+) -> SyncResult:
+    """Fetch and store everything new in ``account``'s home timeline.
+
+    A gap left by an earlier sync is filled first; newer entries are only
+    fetched once it is closed, so there is never more than one.
+    """
+    state, _ = TimelineSync.objects.get_or_create(account=account)
+    result = SyncResult()
+    older: list[FeedViewPost] = []
+    newest: list[FeedViewPost] = []
+
+    if state.gap_cursor:
+        older = fetch_new_entries(
+            account, state.gap_until, max_pages, result, cursor=state.gap_cursor
+        )
+        state.gap_cursor = result.cursor or ""
+        if not state.gap_cursor:
+            state.gap_until = None
+
+    if not state.gap_cursor and result.pages < max_pages:
+        since = state.latest_indexed_at
+        newest = fetch_new_entries(account, since, max_pages, result)
+
+        if newest:
+            latest = max(item.sort_at for item in newest)
+            state.latest_indexed_at = max(latest, since or latest)
+        # A first sync only takes the latest pages; later ones leave no hole.
+        if result.cursor and since is not None:
+            state.gap_cursor, state.gap_until = result.cursor, since
+
+    entries = newest + older
+    store_entries(account, entries, batch_size)
+    result.entries = len(entries)
+
+    state.synced_at = timezone.now()
+    state.save(
+        update_fields=["latest_indexed_at", "gap_cursor", "gap_until", "synced_at"]
+    )
+
+    logger.info(
+        "Synced %d timeline entries for %s in %d pages",
+        result.entries,
+        account.handle,
+        result.pages,
+    )
+    return result
+
+
+def encode_cursor(entry: TimelineEntry) -> str:
+    """Keyset cursor pointing past ``entry``."""
+    return f"{entry.indexed_at.isoformat()}_{entry.pk}"
+
+
+def local_timeline(
+    account: "Account", cursor: str | None = None, limit: int = 30
+) -> tuple[list[TimelineEntry], str | None]:
+    """Page of the stored timeline and the cursor of the next one.
+
+    Pages are keyset-paginated on (indexed_at, id), so each one is a single
+    query on the (account, indexed_at) index.
+    """
+    entries = (
+        TimelineEntry.objects.filter(account=account)
+        .select_related("post__author")
+        .order_by("-indexed_at", "-id")
+    )
+
+    if cursor:
+        try:
+            indexed_at, pk = cursor.rsplit("_", 1)
+            before = datetime.datetime.fromisoformat(indexed_at), int(pk)
+        except ValueError:
+            before = None
+
+        if before is not None:
+            entries = entries.filter(
+                Q(indexed_at__lt=before[0]) | Q(indexed_at=before[0], id__lt=before[1])
+            )
+
+    page = list(entries[: limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+
+    return page[:limit], next_cursor
+
+
+def hydrate_authors(account: "Account", entries: list[TimelineEntry]) -> None:
+    """Fill in the authors of ``entries`` that are DID placeholders.
+
+    Jetstream only gives DIDs; the missing handles, names and avatars are
+    hydrated in one batch and saved, so later pages render without calls.
+    """
+    placeholders = {
+        entry.post.author.did: entry.post.author
+        for entry in entries
+        if entry.post.author.handle == entry.post.author.did
+    }
+    if not placeholders:
+        return
+
+    profiles = PROFILES.hydrate(
+        placeholders,
+        token=account.fresh_access_token(),
+        base_url=account.pds_endpoint,
+    )
+    now = timezone.now()
+    for did, profile in profiles.items():
+        author = placeholders[did]
+        author.handle = profile.handle
+        author.display_name = profile.displayName or ""
+        author.avatar = profile.avatar or ""
+        author.updated_at = now
+
+    Author.objects.bulk_update(
+        [placeholders[did] for did in profiles],
+        ["handle", "display_name", "avatar", "updated_at"],
+    )
@@ -1,3 +1,198 @@
+import datetime
+import logging
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse_lazy
+from faker import Faker
+
+from apps.accounts.models import Account
+from apps.libs import BLUESKY
+from apps.libs.lexicons import (
+    FeedViewPostFactory,
+    GetProfilesResponse,
+    GetTimelineResponseFactory,
+    PostViewFactory,
+    ProfileViewDetailedFactory,
+)
+from apps.libs.profiles import PROFILES
+from apps.posts.models import Author, Post, TimelineEntry, TimelineSync
+from apps.posts.services import local_timeline, sync_timeline
+
+fake = Faker()
+
+logging.disable(logging.CRITICAL)
+
+NOW = datetime.datetime(2024, 11, 20, 12, tzinfo=datetime.UTC)
+
+
+def entry(minutes_ago: int, **kwargs):
+    return FeedViewPostFactory.build(
+        post=PostViewFactory.build(
+            indexedAt=NOW - datetime.timedelta(minutes=minutes_ago), **kwargs
+        )
+    )
+
+
+class TimelineSyncTestCase(TestCase):
+    def setUp(self):
+        PROFILES.cache.clear()
+        self.account = Account.auth.create_from_api(
+            email=fake.email(),
+            handle=fake.user_name(),
+            access=fake.sha256(raw_output=False),
+            refresh=fake.sha256(raw_output=False),
+        )
+        patcher = mock.patch.object(BLUESKY, "call")
+        self.call = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pages(self, *pages):
+        self.call.side_effect = [
+            GetTimelineResponseFactory.build(
+                feed=feed, cursor=f"page-{i + 1}" if i + 1 < len(pages) else None
+            )
+            for i, feed in enumerate(pages)
+        ]
+
+    def test_initial_sync(self):
+        self.pages([entry(1), entry(2)], [entry(3)])
+
+        result = sync_timeline(self.account)
+
+        self.assertEqual((result.pages, result.entries), (2, 3))
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(self.account.timeline.count(), 3)
+        self.assertEqual(
+            TimelineSync.objects.get(account=self.account).latest_indexed_at,
+            NOW - datetime.timedelta(minutes=1),
+        )
+
+    def test_incremental_sync_stops_at_stored_entries(self):
+        old = [entry(10), entry(11)]
+        self.pages(old)
+        sync_timeline(self.account)
+
+        self.pages([entry(1), *old], [entry(12)])
+        result = sync_timeline(self.account)
+
+        self.assertEqual((result.pages, result.entries), (1, 1))
+        self.assertEqual(self.call.call_count, 2)
+        self.assertEqual(self.account.timeline.count(), 3)
+
+    def test_capped_sync_records_the_gap(self):
+        stored = entry(30)
+        self.pages([stored])
+        sync_timeline(self.account)
+
+        self.pages([entry(1), entry(2)], [entry(3), stored])
+        result = sync_timeline(self.account, max_pages=1)
+
+        state = TimelineSync.objects.get(account=self.account)
+        self.assertEqual((result.pages, result.entries), (1, 2))
+        self.assertEqual(state.latest_indexed_at, NOW - datetime.timedelta(minutes=1))
+        self.assertEqual(state.gap_cursor, "page-1")
+        self.assertEqual(state.gap_until, NOW - datetime.timedelta(minutes=30))
+
+        result = sync_timeline(self.account, max_pages=1)
+
+        state.refresh_from_db()
+        self.assertEqual((result.pages, result.entries), (1, 1))
+        self.assertEqual(self.call.call_args.kwargs["params"].cursor, "page-1")
+        self.assertEqual((state.gap_cursor, state.gap_until), ("", None))
+        self.assertEqual(self.account.timeline.count(), 4)
+
+    def test_upserts_existing_posts(self):
+        item = entry(1)
+        self.pages([item])
+        sync_timeline(self.account)
+
+        item.post.likeCount = 42
+        item.post.author.handle = "renamed.test"
+        TimelineSync.objects.filter(account=self.account).update(latest_indexed_at=None)
+        self.pages([item])
+        sync_timeline(self.account)
+
+        post = Post.objects.select_related("author").get(uri=item.post.uri)
+        self.assertEqual(post.like_count, 42)
+        self.assertEqual(post.author.handle, "renamed.test")
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+
+    def test_local_timeline_pagination(self):
+        self.pages([entry(minutes) for minutes in range(5)])
+        sync_timeline(self.account)
+
+        first, cursor = local_timeline(self.account, limit=3)
+        second, last = local_timeline(self.account, cursor=cursor, limit=3)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(last)
+        self.assertEqual(
+            [e.indexed_at for e in first + second],
+            [NOW - datetime.timedelta(minutes=m) for m in range(5)],
+        )
+
+    def test_local_timeline_is_one_query(self):
+        self.pages([entry(minutes) for minutes in range(5)])
+        sync_timeline(self.account)
+
+        with CaptureQueriesContext(connection) as queries:
+            entries, _ = local_timeline(self.account)
+            [e.post.author.handle for e in entries]
+
+        self.assertEqual(len(queries), 1)
+
+    def test_local_timeline_view(self):
+        self.pages([entry(1, likeCount=7)])
+        sync_timeline(self.account)
+
+        response = self.client.get(
+            reverse_lazy("local_timeline"),
+            headers={"Authorization": f"Bearer {self.account.access_token}"},
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, "local_timeline.dj")
+        self.assertContains(response, Post.objects.get().author.handle)
+
+    def test_sync_command(self):
+        self.pages([entry(1)])
+        out = StringIO()
+
+        call_command("sync_timelines", self.account.handle, stdout=out)
+
+        self.assertIn(f"{self.account.handle}: 1 entries in 1 pages", out.getvalue())
+
+    def test_placeholder_authors_are_hydrated(self):
+        author = Author.objects.create(did="did:plc:bob", handle="did:plc:bob")
+        post = Post.objects.create(
+            uri="at://did:plc:bob/app.bsky.feed.post/1",
+            cid=fake.sha256(),
+            author=author,
+            indexed_at=NOW,
+        )
+        TimelineEntry.objects.create(account=self.account, post=post, indexed_at=NOW)
+        self.call.return_value = GetProfilesResponse(
+            profiles=[
+                ProfileViewDetailedFactory.build(
+                    did="did:plc:bob", handle="bob.test", displayName="Bob"
+                )
+            ]
+        )
+
+        for _ in range(2):
+            response = self.client.get(
+                reverse_lazy("local_timeline"),
+                headers={"Authorization": f"Bearer {self.account.access_token}"},
+            )
+            self.assertContains(response, "@bob.test")
 
-# Create your tests here.
+        self.call.assert_called_once()
+        self.assertEqual(Author.objects.get().name, "Bob")
@@ -0,0 +1,9 @@
+"""Posts URL Configuration."""
+
+from django.urls import path
+
+from apps.posts.views import LocalTimelineView
+
+urlpatterns = [
+    path("timeline/", LocalTimelineView.as_view(), name="local_timeline"),
+]
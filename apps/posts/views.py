@@ -1,3 +1,37 @@
-from django.shortcuts import render
+"""Post views."""
 
-# Create your views here.
+from django import views
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+
+from apps.libs.authentication import get_account
+from apps.posts.services import hydrate_authors, local_timeline
+
+
+class LocalTimelineView(views.View):
+    """Home timeline served from the local post store.
+
+    Run ``manage.py sync_timelines`` to fill the store. HTMX requests for the
+    next cursor only render the entries and the trigger for the page after.
+    """
+
+    template_name = "local_timeline.dj"
+    partial_template_name = "partials/local_timeline_page.dj"
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """Get request."""
+        if (account := get_account(request)) is None:
+            return redirect(reverse("login"))
+
+        entries, cursor = local_timeline(account, cursor=request.GET.get("cursor"))
+        hydrate_authors(account, entries)
+        template_name = (
+            self.partial_template_name if request.htmx else self.template_name
+        )
+
+        return render(
+            request,
+            template_name=template_name,
+            context={"entries": entries, "cursor": cursor},
+        )
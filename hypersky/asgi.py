@@ -2,6 +2,8 @@
 ASGI config for hypersky project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The live event stream (``/feeds/live/``) needs an ASGI server, under WSGI every
+open stream would hold a worker thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
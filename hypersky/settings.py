@@ -32,13 +32,20 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django_htmx",
+    "apps.libs",
     "apps.pages",
     "apps.accounts",
+    "apps.feeds",
+    "apps.posts",
+    "apps.notifications",
+    "apps.lists",
+    "apps.packs",
 ]
 
 AUTH_USER_MODEL = "accounts.Account"
 
 MIDDLEWARE = [
+    "apps.libs.middleware.QueryCountMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -47,15 +54,157 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django_htmx.middleware.HtmxMiddleware",
+    "apps.libs.middleware.RequestIdMiddleware",
+    "apps.libs.middleware.ProfilingMiddleware",
 ]
 
 AUTHENTICATION_BACKENDS = ["apps.libs.authentication.BlueSkyJWTBackend"]
 
+# Pooled HTTP client used by apps.libs.BLUESKY for every XRPC call. Throttled
+# and transiently failing calls are retried with jittered backoff.
+BLUESKY_CLIENT = {
+    "max_connections": int(os.getenv("BLUESKY_MAX_CONNECTIONS", 100)),
+    "max_keepalive_connections": int(os.getenv("BLUESKY_MAX_KEEPALIVE", 20)),
+    "keepalive_expiry": float(os.getenv("BLUESKY_KEEPALIVE_EXPIRY", 30)),
+    "timeout": float(os.getenv("BLUESKY_TIMEOUT", 10)),
+    "http2": os.getenv("BLUESKY_HTTP2", "true").lower() == "true",
+    "retries": int(os.getenv("BLUESKY_RETRIES", 2)),
+    "backoff": float(os.getenv("BLUESKY_BACKOFF", 0.5)),
+}
+
+# Bearer token -> account cache. Set an alias from CACHES to share it between
+# workers, in-process entries are always checked first.
+BLUESKY_TOKEN_CACHE = {
+    "maxsize": int(os.getenv("BLUESKY_TOKEN_CACHE_SIZE", 10_000)),
+    "ttl": float(os.getenv("BLUESKY_TOKEN_CACHE_TTL", 60)),
+    "alias": os.getenv("BLUESKY_TOKEN_CACHE_ALIAS") or None,
+}
+
+# Bearer token validation. "database" matches the token against the one stored
+# on the account; "local" validates the JWT in process, which needs the PDS
+# HS256 secret, and looks the account up by its DID.
+BLUESKY_JWT = {
+    "validation": os.getenv("BLUESKY_JWT_VALIDATION", "database"),
+    "secret": os.getenv("BLUESKY_JWT_SECRET", ""),
+    "audience": os.getenv("BLUESKY_JWT_AUDIENCE") or None,
+}
+
+# Timeline pages cached per account and cursor, bounded by their JSON size.
+TIMELINE_PAGE_CACHE = {
+    "maxsize": int(os.getenv("TIMELINE_PAGE_CACHE_SIZE", 1024)),
+    "maxbytes": int(os.getenv("TIMELINE_PAGE_CACHE_BYTES", 32 * 1024 * 1024)),
+    "ttl": float(os.getenv("TIMELINE_PAGE_CACHE_TTL", 30)),
+}
+
+# Handle -> DID -> DID document resolution, used to log in on the user's own PDS
+# when the entryway doesn't know the account.
+IDENTITY = {
+    "plc_directory": os.getenv("PLC_DIRECTORY", "https://plc.directory"),
+    "ttl": float(os.getenv("IDENTITY_CACHE_TTL", 3600)),
+    "negative_ttl": float(os.getenv("IDENTITY_NEGATIVE_TTL", 300)),
+    "timeout": float(os.getenv("IDENTITY_TIMEOUT", 3)),
+}
+
+# DID -> profile cache used to hydrate authors with app.bsky.actor.getProfiles.
+PROFILE_CACHE = {
+    "maxsize": int(os.getenv("PROFILE_CACHE_SIZE", 10_000)),
+    "ttl": float(os.getenv("PROFILE_CACHE_TTL", 300)),
+}
+
+# apps.libs.logger: level of the app's loggers, whether records are written by
+# a QueueListener thread rather than by the thread logging them, and their
+# format: colored "text" for development or "json" lines for log pipelines.
+LOGGER = {
+    "level": os.getenv("LOG_LEVEL", "INFO"),
+    "queue": os.getenv("LOG_QUEUE", "true").lower() == "true",
+    "format": os.getenv("LOG_FORMAT", "text"),
+}
+
+# /metrics, in the Prometheus text format. When a token is set, scrapers must
+# send it as "Authorization: Bearer <token>"; without one, only staff see it.
+METRICS = {
+    "token": os.getenv("METRICS_TOKEN", ""),
+}
+
+# apps.libs.profiling: opt-in profiles of a sample of requests, and of the ones
+# staff send with the header, split into DB, XRPC, template and Python time.
+# The latest are listed on /admin/profiles/.
+PROFILING = {
+    "enabled": os.getenv("PROFILING", "false").lower() == "true",
+    "sample_rate": float(os.getenv("PROFILING_SAMPLE_RATE", 0.01)),
+    "header": os.getenv("PROFILING_HEADER", "X-Profile"),
+    "size": int(os.getenv("PROFILING_SIZE", 50)),
+    "top": int(os.getenv("PROFILING_TOP", 30)),
+}
+
+# Loggers under "apps" (apps.libs.logger.get_logger) share one handler. Raise
+# the level to skip the formatting of lower records altogether.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "request_id": {"()": "apps.libs.logger.RequestIdFilter"},
+    },
+    "handlers": {
+        "apps": {
+            "()": "apps.libs.logger.build_handler",
+            "fmt": LOGGER["format"],
+            "queue": LOGGER["queue"],
+            "filters": ["request_id"],
+        },
+    },
+    "loggers": {
+        "apps": {"handlers": ["apps"], "level": LOGGER["level"], "propagate": False},
+    },
+}
+
+# Follow graph snapshots (apps.accounts.graph): refreshed incrementally after
+# refresh_after seconds, fetched again in full after full_refresh_after.
+FOLLOW_GRAPH = {
+    "maxsize": int(os.getenv("FOLLOW_GRAPH_SIZE", 1000)),
+    "refresh_after": float(os.getenv("FOLLOW_GRAPH_REFRESH_AFTER", 300)),
+    "full_refresh_after": float(os.getenv("FOLLOW_GRAPH_FULL_REFRESH_AFTER", 86400)),
+}
+
+# Starter pack "follow all": follows are created in applyWrites batches, up
+# to `concurrency` at a time per step.
+PACKS = {
+    "batch_size": int(os.getenv("PACKS_BATCH_SIZE", 200)),
+    "concurrency": int(os.getenv("PACKS_CONCURRENCY", 4)),
+}
+
+# Jetstream subscription consumed by manage.py ingest_jetstream.
+JETSTREAM = {
+    "url": os.getenv(
+        "JETSTREAM_URL", "wss://jetstream2.us-east.bsky.network/subscribe"
+    ),
+    "batch_size": int(os.getenv("JETSTREAM_BATCH_SIZE", 500)),
+    "queue_size": int(os.getenv("JETSTREAM_QUEUE_SIZE", 10_000)),
+}
+
+# Notification polling. Unread counts live in the cache under cache_alias so
+# the nav badge never waits on the network.
+NOTIFICATIONS = {
+    "cache_alias": os.getenv("NOTIFICATIONS_CACHE_ALIAS", "default"),
+    "unread_ttl": int(os.getenv("NOTIFICATIONS_UNREAD_TTL", 300)),
+    "poll_batch_size": int(os.getenv("NOTIFICATIONS_POLL_BATCH_SIZE", 25)),
+    "poll_interval": float(os.getenv("NOTIFICATIONS_POLL_INTERVAL", 30)),
+}
+
+# Server-Sent Events pushed by /feeds/live/ (served through hypersky.asgi).
+LIVE_UPDATES = {
+    "interval": float(os.getenv("LIVE_UPDATES_INTERVAL", 2)),
+    "heartbeat": float(os.getenv("LIVE_UPDATES_HEARTBEAT", 15)),
+    "buffer": int(os.getenv("LIVE_UPDATES_BUFFER", 100)),
+}
+
 ROOT_URLCONF = "hypersky.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates, timing renders for apps.libs.profiling.
+        "BACKEND": "apps.libs.profiling.DjangoTemplates",
+        "NAME": "django",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -64,6 +213,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "apps.notifications.context_processors.unread_notifications",
             ],
         },
     },
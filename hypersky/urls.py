@@ -18,8 +18,17 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from apps.libs.views import MetricsView, RequestProfilesView
+
 urlpatterns = [
+    path("admin/profiles/", RequestProfilesView.as_view(), name="request_profiles"),
     path("admin/", admin.site.urls),
+    path("metrics", MetricsView.as_view(), name="metrics"),
     path("accounts/", include("apps.accounts.urls")),
+    path("feeds/", include("apps.feeds.urls")),
+    path("posts/", include("apps.posts.urls")),
+    path("notifications/", include("apps.notifications.urls")),
+    path("lists/", include("apps.lists.urls")),
+    path("packs/", include("apps.packs.urls")),
     path("", include("apps.pages.urls")),
 ]
@@ -0,0 +1,20 @@
+// Live updates from /feeds/live/: new posts are prepended to #timeline and
+// the unread notifications count is written into #unread-badge.
+(() => {
+  const source = document.querySelector("[data-live-events]");
+  if (!source) return;
+
+  const events = new EventSource(source.dataset.liveEvents);
+
+  events.addEventListener("post", (event) => {
+    const timeline = document.getElementById("timeline");
+    if (timeline) timeline.insertAdjacentHTML("afterbegin", event.data);
+  });
+
+  events.addEventListener("notifications", (event) => {
+    const badge = document.getElementById("unread-badge");
+    if (!badge) return;
+    badge.textContent = event.data;
+    badge.hidden = event.data === "0";
+  });
+})();